@@ -5,6 +5,8 @@
 @date 2025/02/27
 """
 import os
+import socket
+import uuid
 from urllib.parse import quote_plus
 from dotenv import load_dotenv
 
@@ -33,8 +35,27 @@ class Config:
     
     # 爬虫配置
     USER_AGENT = os.getenv('USER_AGENT', 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36')
-    REQUEST_DELAY = float(os.getenv('REQUEST_DELAY', 1))
-    MAX_RETRIES = int(os.getenv('MAX_RETRIES', 3))
+    MAX_RETRIES = int(os.getenv('MAX_RETRIES', 3))  # 任务最大重试次数（超过后标记为失败）
+    
+    # 并发与限速配置
+    CRAWL_CONCURRENCY = int(os.getenv('CRAWL_CONCURRENCY', 4))  # 同时处理的任务数
+    RATE_LIMIT_DEFAULT = float(os.getenv('RATE_LIMIT_DEFAULT', 1))  # 未单独配置的站点每秒请求数（0 表示不限速）
+    RATE_LIMIT_BURST = int(os.getenv('RATE_LIMIT_BURST', 1))  # 每个站点允许连续发出的请求数
+    # 按站点（域名后缀）配置每秒请求数，格式：域名=速率,域名=速率
+    RATE_LIMIT_HOSTS = os.getenv(
+        'RATE_LIMIT_HOSTS',
+        'douban.com=0.5,doubanio.com=2,baidu.com=0.5,wikipedia.org=1,bilibili.com=1,youtube.com=0.5'
+    )
+    
+    # 任务领取配置（多个爬虫进程/机器共用一个数据库）
+    # 租约持有者标识：CRAWLER_ID（默认主机名）后总是附加进程号和随机后缀，
+    # 重启的进程或误配置相同 CRAWLER_ID 的进程不会续期别人遗留的租约
+    CRAWLER_ID = f"{os.getenv('CRAWLER_ID') or socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+    TASK_LEASE_SECONDS = int(os.getenv('TASK_LEASE_SECONDS', 300))  # 租约时长（秒），运行期间由心跳续期
+    TASK_HEARTBEAT_SECONDS = int(os.getenv('TASK_HEARTBEAT_SECONDS', 60))  # 心跳间隔（秒），需明显小于租约时长
+    TASK_RETRY_BACKOFF_SECONDS = int(os.getenv('TASK_RETRY_BACKOFF_SECONDS', 60))  # 重试等待基数：第 n 次重试等待 基数 * 2^(n-1)
+    TASK_RETRY_BACKOFF_MAX_SECONDS = int(os.getenv('TASK_RETRY_BACKOFF_MAX_SECONDS', 3600))  # 重试等待上限（秒）
+    TASK_BLOCKED_DELAY_SECONDS = int(os.getenv('TASK_BLOCKED_DELAY_SECONDS', 600))  # 触发反爬虫后延后领取的秒数（不计入重试次数）
     
     @classmethod
     def get_db_url(cls):
@@ -42,3 +63,14 @@ class Config:
         # 对密码进行 URL 编码，处理特殊字符（如 @）
         encoded_password = quote_plus(cls.DB_PASSWORD)
         return f"mysql+pymysql://{cls.DB_USER}:{encoded_password}@{cls.DB_HOST}:{cls.DB_PORT}/{cls.DB_NAME}?charset=utf8mb4"
+    
+    @classmethod
+    def get_rate_limits(cls):
+        """解析按站点限速配置，返回 {域名后缀: 每秒请求数}"""
+        limits = {}
+        for item in cls.RATE_LIMIT_HOSTS.split(','):
+            if '=' not in item:
+                continue
+            host, rate = item.split('=', 1)
+            limits[host.strip().lower()] = float(rate)
+        return limits
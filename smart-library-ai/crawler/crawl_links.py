@@ -7,23 +7,27 @@
     python crawl_links.py --type review                # 爬取所有书的解读页
     python crawl_links.py --type all --limit 10        # 逐本书爬取10本（限制数量）
     python crawl_links.py --type info --limit 50       # 爬取50本书的信息页
+    python crawl_links.py --type all --concurrency 8   # 8 个工作者并发爬取
 
 说明:
-    - --type all: 逐本书爬取，每本书完成信息页和解读页后再处理下一本
+    - --type all: 逐本书爬取，每个工作者完成一本书的信息页和解读页后再领取下一本
     - 不指定 --limit: 默认爬取所有待处理任务
     - --limit N: 限制爬取数量为 N 条
+    - --concurrency N: 工作者数量（默认使用配置 CRAWL_CONCURRENCY），每个工作者独立领取、爬取、保存任务
 
 @author JacoryCyJin
 @date 2026/03/08
 """
 import argparse
 import logging
-import time
+import os
 import signal
-import sys
-from typing import List, Dict
+import threading
+from typing import List, Dict, Optional, Tuple
 from utils.link_task_helper import LinkTaskHelper
 from utils.db_helper import DatabaseHelper
+from utils.crawl_engine import AsyncCrawlEngine, TaskClaimer
+from utils.task_lease import TaskLeaseKeeper
 from crawlers.douban_link_crawler import DoubanLinkCrawler
 from crawlers.download_crawler import DownloadCrawler
 from crawlers.review_crawler import ReviewCrawler
@@ -35,22 +39,46 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# 全局变量：当前正在处理的任务
-current_task_id = None
-current_resource_id = None
-current_link_type = None
+
+class WorkerContext:
+    """工作者上下文：记录工作者正在处理的任务（用于中断清理）"""
+    
+    def __init__(self, worker_id: int):
+        self.worker_id = worker_id
+        # (task_id, resource_id, link_type)，整体赋值，中断处理读取时不会读到一半
+        self.current: Optional[Tuple[int, str, int]] = None
+    
+    def start(self, task_id: int, resource_id: str, link_type: int):
+        """开始处理任务"""
+        self.current = (task_id, resource_id, link_type)
+    
+    def finish(self):
+        """任务处理结束"""
+        self.current = None
 
 
 class LinkCrawlExecutor:
-    """链接爬取执行器"""
+    """链接爬取执行器（多个工作者并发领取、爬取、保存任务）"""
     
-    def __init__(self):
+    def __init__(self, concurrency: Optional[int] = None):
+        """
+        Args:
+            concurrency: 工作者数量（默认使用配置 CRAWL_CONCURRENCY）
+        """
         self.crawlers = {
             LinkTaskHelper.LINK_TYPE_INFO: DoubanLinkCrawler(),      # 书籍页
             LinkTaskHelper.LINK_TYPE_DOWNLOAD: DownloadCrawler(),    # 下载页
             LinkTaskHelper.LINK_TYPE_REVIEW: ReviewCrawler() # 解读页
         }
         
+        self.engine = AsyncCrawlEngine(concurrency)
+        # 每个工作者一个上下文，中断时清理所有工作者正在处理的任务
+        self.contexts: Dict[int, WorkerContext] = {
+            worker_id: WorkerContext(worker_id)
+            for worker_id in range(1, self.engine.concurrency + 1)
+        }
+        self.stats_lock = threading.Lock()
+        
         # 注册信号处理器（Ctrl+C 中断）
         signal.signal(signal.SIGINT, self._handle_interrupt)
         signal.signal(signal.SIGTERM, self._handle_interrupt)
@@ -58,32 +86,38 @@ class LinkCrawlExecutor:
     def _handle_interrupt(self, signum, frame):
         """
         处理中断信号（Ctrl+C）
-        清理当前正在处理的任务数据
+        清理所有工作者正在处理的任务数据
         """
-        global current_task_id, current_resource_id, current_link_type
-        
-        logger.warning("\n\n收到中断信号，正在清理当前任务数据...")
+        logger.warning("\n\n收到中断信号，正在清理进行中的任务数据...")
         
-        if current_task_id and current_resource_id and current_link_type:
+        for context in self.contexts.values():
+            current = context.current
+            if not current:
+                continue
+            
+            task_id, resource_id, link_type = current
             try:
                 # 1. 重置任务状态为待处理
                 LinkTaskHelper.update_page_status(
-                    current_task_id, 
-                    current_link_type, 
+                    task_id, 
+                    link_type, 
                     LinkTaskHelper.STATUS_PENDING,
                     error_msg="任务被用户中断"
                 )
-                logger.info(f"✓ 已重置任务 {current_task_id} 状态为待处理")
+                logger.info(f"✓ 已重置任务 {task_id} 状态为待处理（工作者 {context.worker_id}）")
+                LinkTaskHelper.release_task(task_id)
                 
                 # 2. 删除已插入的 resource_link 记录
-                self._cleanup_resource_links(current_resource_id, current_link_type)
-                logger.info(f"✓ 已清理资源 {current_resource_id} 的链接数据")
+                self._cleanup_resource_links(resource_id, link_type)
+                logger.info(f"✓ 已清理资源 {resource_id} 的链接数据")
                 
             except Exception as e:
                 logger.error(f"清理任务数据失败: {e}")
         
         logger.info("清理完成，程序退出")
-        sys.exit(0)
+        # 工作线程仍在运行，sys.exit 会等待线程结束，这里直接退出进程
+        logging.shutdown()
+        os._exit(0)
     
     def _cleanup_resource_links(self, resource_id: str, link_type: int):
         """
@@ -110,224 +144,157 @@ class LinkCrawlExecutor:
         except Exception as e:
             logger.error(f"清理 resource_link 失败: {e}")
     
+    def _count_result(self, stats: Dict, result: Dict):
+        """累加任务结果统计（多个工作者同时更新）"""
+        with self.stats_lock:
+            if result['success']:
+                stats['success'] += 1
+            elif result['no_resource']:
+                stats['no_resource'] += 1
+            else:
+                stats['failed'] += 1
+    
     def execute_tasks(self, link_type: int, limit: int = 10):
         """
-        执行爬取任务（按链接类型）
+        执行爬取任务（按链接类型，多个工作者并发处理）
         
         Args:
             link_type: 链接类型（1-书籍页 / 2-下载页 / 3-解读页）
             limit: 最大任务数
         """
-        # 获取待处理任务
-        tasks = LinkTaskHelper.get_pending_tasks(link_type=link_type, limit=limit)
-        
-        if not tasks:
-            logger.info(f"没有待处理的{self._get_type_name(link_type)}任务")
+        if not self.crawlers.get(link_type):
+            logger.error(f"未找到对应的爬虫 (type={link_type})")
             return
         
-        logger.info(f"找到 {len(tasks)} 个待处理的{self._get_type_name(link_type)}任务")
+        logger.info(f"开始爬取{self._get_type_name(link_type)}，工作者 {self.engine.concurrency} 个")
         
-        success_count = 0
-        failed_count = 0
-        no_resource_count = 0
+        stats = {'success': 0, 'failed': 0, 'no_resource': 0}
         
-        crawler = self.crawlers.get(link_type)
-        if not crawler:
-            logger.error(f"未找到对应的爬虫 (type={link_type})")
-            return
-        
-        for task in tasks:
-            task_id = task['id']
-            resource_id = task['resource_id']
-            isbn = task['isbn']
-            title = task['title']
-            
-            # 设置全局变量（用于中断清理）
-            global current_task_id, current_resource_id, current_link_type
-            current_task_id = task_id
-            current_resource_id = resource_id
-            current_link_type = link_type
-            
-            logger.info(f"\n处理任务 {task_id}: {title}")
-            
+        def handle(worker_id, item):
+            idx, task = item
+            logger.info(f"\n[{idx}] 处理任务 {task['id']}: {task['title']}")
             try:
-                # 更新状态为处理中
-                LinkTaskHelper.update_page_status(task_id, link_type, LinkTaskHelper.STATUS_PROCESSING)
-                
-                # 执行爬取
-                links = crawler.search_links(
-                    resource_id=resource_id,
-                    isbn=isbn,
-                    title=title
-                )
-                
-                # 保存结果
-                if links:
-                    # 去重：检查是否已存在相同链接
-                    links = self._deduplicate_links(resource_id, links, link_type)
-                    
-                    if links:
-                        LinkTaskHelper.save_page_result(task_id, link_type, links)
-                        logger.info(f"  ✓ 成功爬取 {len(links)} 个链接")
-                        success_count += 1
-                        
-                        # 将链接插入到 resource_link 表
-                        self._save_links_to_db(resource_id, links, link_type)
-                    else:
-                        logger.warning(f"  ✗ 所有链接均已存在，跳过")
-                        LinkTaskHelper.update_page_status(
-                            task_id,
-                            link_type,
-                            LinkTaskHelper.STATUS_COMPLETED,
-                            error_msg="链接已存在"
-                        )
-                else:
-                    LinkTaskHelper.update_page_status(
-                        task_id,
-                        link_type,
-                        LinkTaskHelper.STATUS_NO_RESOURCE,
-                        error_msg="未找到相关链接"
-                    )
-                    logger.warning(f"  ✗ 未找到链接")
-                    no_resource_count += 1
-                
-                # 清除全局变量
-                current_task_id = None
-                current_resource_id = None
-                current_link_type = None
-                
-                # 延迟，避免请求过快
-                time.sleep(2)
-                
-            except Exception as e:
-                logger.error(f"  ✗ 任务失败: {e}")
-                LinkTaskHelper.update_page_status(
-                    task_id,
-                    link_type,
-                    LinkTaskHelper.STATUS_FAILED,
-                    error_msg=str(e)
+                result = self._crawl_single_task(
+                    context=self.contexts[worker_id],
+                    task_id=task['id'],
+                    resource_id=task['resource_id'],
+                    isbn=task['isbn'],
+                    title=task['title'],
+                    link_type=link_type
                 )
-                failed_count += 1
-                
-                # 清除全局变量
-                current_task_id = None
-                current_resource_id = None
-                current_link_type = None
+                self._count_result(stats, result)
+            finally:
+                LinkTaskHelper.release_task(task['id'])
+        
+        # 每个工作者从数据库领取自己的任务（多个进程同时运行也不会领取到同一任务）
+        claimer = TaskClaimer(lambda exclude_ids: LinkTaskHelper.claim_tasks(link_type), limit)
+        # 运行期间心跳续期租约，并回收其他进程遗留的过期任务
+        with TaskLeaseKeeper(DatabaseHelper(), LinkTaskHelper.TABLE_NAME):
+            self.engine.run_workers(claimer, handle)
+        
+        if not claimer.claimed:
+            logger.info(f"没有待处理的{self._get_type_name(link_type)}任务")
+            return
         
         # 输出统计
         logger.info("\n" + "="*50)
-        logger.info(f"{self._get_type_name(link_type)}爬取完成：成功 {success_count}，失败 {failed_count}，无资源 {no_resource_count}")
+        logger.info(f"{self._get_type_name(link_type)}爬取完成：成功 {stats['success']}，失败 {stats['failed']}，无资源 {stats['no_resource']}")
         logger.info("="*50)
     
     def execute_all_types(self, limit: int = 10):
         """
         逐本书爬取所有类型的链接（信息页 + 解读页）
-        每本书完成信息页和解读页后再处理下一本
+        每个工作者完成一本书的信息页和解读页后再领取下一本，多本书并发处理
         
         Args:
             limit: 最大任务数（书籍数量）
         """
-        logger.info("开始逐本书爬取链接（信息页 + 解读页）...")
+        logger.info(f"开始逐本书爬取链接（信息页 + 解读页），工作者 {self.engine.concurrency} 个...\n")
+        
+        stats = {'success': 0, 'failed': 0, 'no_resource': 0}
         
-        # 获取待处理的书籍任务（以信息页任务为基准）
-        info_tasks = LinkTaskHelper.get_pending_tasks(
-            link_type=LinkTaskHelper.LINK_TYPE_INFO, 
-            limit=limit
+        def handle(worker_id, item):
+            idx, task = item
+            try:
+                self._crawl_book(self.contexts[worker_id], task, idx, stats)
+            finally:
+                LinkTaskHelper.release_task(task['id'])
+        
+        # 按书籍领取（信息页或解读页待处理）：领取后整本书由同一个工作者处理，
+        # 领取结果已带各页面状态，不再额外查询解读页任务
+        claimer = TaskClaimer(
+            lambda exclude_ids: LinkTaskHelper.claim_books(
+                [LinkTaskHelper.LINK_TYPE_INFO, LinkTaskHelper.LINK_TYPE_REVIEW]
+            ),
+            limit
         )
+        with TaskLeaseKeeper(DatabaseHelper(), LinkTaskHelper.TABLE_NAME):
+            self.engine.run_workers(claimer, handle)
         
-        if not info_tasks:
+        if not claimer.claimed:
             logger.info("没有待处理的书籍任务")
             return
         
-        logger.info(f"找到 {len(info_tasks)} 本待处理的书籍\n")
+        # 输出总体统计
+        logger.info("\n" + "="*60)
+        logger.info(f"全部爬取完成：")
+        logger.info(f"  成功: {stats['success']} 个任务")
+        logger.info(f"  失败: {stats['failed']} 个任务")
+        logger.info(f"  无资源: {stats['no_resource']} 个任务")
+        logger.info(f"  处理书籍: {claimer.claimed} 本")
+        logger.info("="*60)
+    
+    def _crawl_book(self, context: WorkerContext, task: Dict, idx: int, stats: Dict):
+        """
+        爬取一本书的信息页和解读页（在工作者线程中执行）
+        
+        Args:
+            context: 工作者上下文
+            task: 书籍任务（含各页面状态 page_status）
+            idx: 序号
+            stats: 结果统计
+        """
+        task_id = task['id']
+        resource_id = task['resource_id']
+        isbn = task['isbn']
+        title = task['title']
+        
+        logger.info(f"{'='*60}")
+        logger.info(f"[{idx}] 处理书籍: {title}")
+        logger.info(f"{'='*60}")
         
-        total_success = 0
-        total_failed = 0
-        total_no_resource = 0
+        steps = [
+            (LinkTaskHelper.LINK_TYPE_INFO, "📖", "信息页"),
+            (LinkTaskHelper.LINK_TYPE_REVIEW, "🎬", "解读页"),
+        ]
         
-        for idx, task in enumerate(info_tasks, 1):
-            task_id = task['id']
-            resource_id = task['resource_id']
-            isbn = task['isbn']
-            title = task['title']
+        for step, (link_type, icon, name) in enumerate(steps, 1):
+            logger.info(f"\n{icon} [{title}] 步骤 {step}/{len(steps)}: 爬取{name}...")
             
-            logger.info(f"{'='*60}")
-            logger.info(f"[{idx}/{len(info_tasks)}] 处理书籍: {title}")
-            logger.info(f"{'='*60}")
+            # 信息页和解读页在同一行任务中，领取时已返回各页面状态
+            if task['page_status'].get(link_type) != LinkTaskHelper.STATUS_PENDING:
+                logger.info(f"  ⏭️  [{title}] {name}已处理，跳过")
+                continue
             
-            # 1. 爬取信息页
-            logger.info(f"\n📖 步骤 1/2: 爬取信息页...")
-            info_result = self._crawl_single_task(
+            result = self._crawl_single_task(
+                context=context,
                 task_id=task_id,
                 resource_id=resource_id,
                 isbn=isbn,
                 title=title,
-                link_type=LinkTaskHelper.LINK_TYPE_INFO
-            )
-            
-            if info_result['success']:
-                total_success += 1
-            elif info_result['no_resource']:
-                total_no_resource += 1
-            else:
-                total_failed += 1
-            
-            time.sleep(2)  # 信息页和解读页之间延迟
-            
-            # 2. 爬取解读页
-            logger.info(f"\n🎬 步骤 2/2: 爬取解读页...")
-            
-            # 查找对应的解读页任务
-            review_tasks = LinkTaskHelper.get_pending_tasks(
-                link_type=LinkTaskHelper.LINK_TYPE_REVIEW,
-                limit=1000  # 获取所有待处理任务
-            )
-            
-            # 找到与当前书籍匹配的解读页任务
-            review_task = next(
-                (t for t in review_tasks if t['resource_id'] == resource_id),
-                None
+                link_type=link_type
             )
-            
-            if review_task:
-                review_result = self._crawl_single_task(
-                    task_id=review_task['id'],
-                    resource_id=resource_id,
-                    isbn=isbn,
-                    title=title,
-                    link_type=LinkTaskHelper.LINK_TYPE_REVIEW
-                )
-                
-                if review_result['success']:
-                    total_success += 1
-                elif review_result['no_resource']:
-                    total_no_resource += 1
-                else:
-                    total_failed += 1
-            else:
-                logger.warning(f"  ⚠️  未找到对应的解读页任务")
-            
-            logger.info(f"\n✅ 书籍 [{title}] 处理完成\n")
-            
-            # 书籍之间延迟
-            if idx < len(info_tasks):
-                time.sleep(3)
+            self._count_result(stats, result)
         
-        # 输出总体统计
-        logger.info("\n" + "="*60)
-        logger.info(f"全部爬取完成：")
-        logger.info(f"  成功: {total_success} 个任务")
-        logger.info(f"  失败: {total_failed} 个任务")
-        logger.info(f"  无资源: {total_no_resource} 个任务")
-        logger.info(f"  处理书籍: {len(info_tasks)} 本")
-        logger.info("="*60)
+        logger.info(f"\n✅ 书籍 [{title}] 处理完成\n")
     
-    def _crawl_single_task(self, task_id: int, resource_id: str, isbn: str, 
+    def _crawl_single_task(self, context: WorkerContext, task_id: int, resource_id: str, isbn: str, 
                           title: str, link_type: int) -> dict:
         """
         爬取单个任务
         
         Args:
+            context: 工作者上下文
             task_id: 任务ID
             resource_id: 资源ID
             isbn: ISBN
@@ -337,11 +304,8 @@ class LinkCrawlExecutor:
         Returns:
             dict: {'success': bool, 'no_resource': bool, 'error': str}
         """
-        # 设置全局变量（用于中断清理）
-        global current_task_id, current_resource_id, current_link_type
-        current_task_id = task_id
-        current_resource_id = resource_id
-        current_link_type = link_type
+        # 记录工作者正在处理的任务（用于中断清理）
+        context.start(task_id, resource_id, link_type)
         
         result = {
             'success': False,
@@ -412,10 +376,7 @@ class LinkCrawlExecutor:
             result['error'] = str(e)
         
         finally:
-            # 清除全局变量
-            current_task_id = None
-            current_resource_id = None
-            current_link_type = None
+            context.finish()
         
         return result
     
@@ -539,6 +500,12 @@ def main():
         default=None,
         help='最大任务数（不指定则爬取所有待处理任务）'
     )
+    parser.add_argument(
+        '--concurrency',
+        type=int,
+        default=None,
+        help='工作者数量（默认使用配置 CRAWL_CONCURRENCY）'
+    )
     
     args = parser.parse_args()
     
@@ -554,7 +521,7 @@ def main():
         limit = args.limit
         logger.info(f"将爬取 {limit} 条任务")
     
-    executor = LinkCrawlExecutor()
+    executor = LinkCrawlExecutor(concurrency=args.concurrency)
     
     # 根据参数确定 link_type
     if args.type == 'all':
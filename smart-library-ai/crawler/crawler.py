@@ -7,19 +7,20 @@ Smart Library 爬虫系统 - 统一入口
 3. 进度追踪和错误处理
 4. 错误日志单独记录
 5. 中断时自动清理未完成数据
+6. 多任务并发爬取，按站点限速
 
 @author JacoryCyJin
 @date 2025/02/27
 """
 import sys
 import logging
+import threading
 import time
 import uuid
 import signal
-import random
 from config import Config
 from crawlers import DoubanBookCrawler, DoubanAuthorCrawler, ZLibraryCrawler, WikiAuthorCrawler
-from utils import DatabaseHelper, MinioHelper
+from utils import DatabaseHelper, MinioHelper, AsyncCrawlEngine, TaskClaimer, TaskLeaseKeeper
 
 # 配置日志
 # 1. 控制台显示所有日志（INFO 及以上）
@@ -44,21 +45,29 @@ logging.getLogger().addHandler(error_handler)
 
 logger = logging.getLogger(__name__)
 
-# 全局变量：当前正在处理的资源ID和任务ID（用于中断清理）
-current_resource_id = None
-current_task_id = None
-current_author_task_id = None  # 新增：作者任务ID
+# 全局变量：所有线程正在处理的资源ID和任务ID（用于中断清理）
+inflight_lock = threading.Lock()
+inflight_resource_ids = set()
+inflight_task_ids = set()
+inflight_author_task_ids = set()
 db_helper = None
 
 
 def cleanup_on_interrupt(signum, frame):
     """
-    中断信号处理：清理未完成的数据
+    中断信号处理：清理所有正在处理中的未完成数据
     """
     logger.warning("\n检测到中断信号，正在清理未完成的数据...")
     
+    with inflight_lock:
+        resource_ids = list(inflight_resource_ids)
+        task_ids = list(inflight_task_ids)
+        author_task_ids = list(inflight_author_task_ids)
+    
     # 清理图书资源
-    if current_resource_id and db_helper:
+    for resource_id in resource_ids:
+        if not db_helper:
+            break
         try:
             # 删除未完成的资源
             delete_query = """
@@ -66,15 +75,15 @@ def cleanup_on_interrupt(signum, frame):
             SET deleted = 1 
             WHERE resource_id = :resource_id
             """
-            db_helper.execute_query(delete_query, {'resource_id': current_resource_id})
-            logger.info(f"  已清理未完成的资源: {current_resource_id}")
+            db_helper.execute_query(delete_query, {'resource_id': resource_id})
+            logger.info(f"  已清理未完成的资源: {resource_id}")
             
             # 删除相关的作者关联
             delete_rel_query = """
             DELETE FROM resource_author_rel 
             WHERE resource_id = :resource_id
             """
-            db_helper.execute_query(delete_rel_query, {'resource_id': current_resource_id})
+            db_helper.execute_query(delete_rel_query, {'resource_id': resource_id})
             logger.info(f"  已清理相关的作者关联")
             
             # 删除相关的分类关联
@@ -82,30 +91,48 @@ def cleanup_on_interrupt(signum, frame):
             DELETE FROM resource_category_rel 
             WHERE resource_id = :resource_id
             """
-            db_helper.execute_query(delete_cat_query, {'resource_id': current_resource_id})
+            db_helper.execute_query(delete_cat_query, {'resource_id': resource_id})
             logger.info(f"  已清理相关的分类关联")
             
         except Exception as e:
             logger.error(f"清理资源失败: {e}")
     
     # 重置图书爬取任务状态
-    if current_task_id and db_helper:
+    for task_id in task_ids:
+        if not db_helper:
+            break
         try:
-            db_helper.update_douban_task_status(current_task_id, status=0)
-            logger.info(f"  已重置图书任务状态: {current_task_id}")
+            db_helper.update_douban_task_status(task_id, status=0)
+            logger.info(f"  已重置图书任务状态: {task_id}")
         except Exception as e:
             logger.error(f"重置图书任务状态失败: {e}")
     
     # 重置作者爬取任务状态
-    if current_author_task_id and db_helper:
+    for author_task_id in author_task_ids:
+        if not db_helper:
+            break
         try:
-            db_helper.update_author_task_status(current_author_task_id, status=0)
-            logger.info(f"  已重置作者任务状态: {current_author_task_id}")
+            db_helper.update_author_task_status(author_task_id, status=0)
+            logger.info(f"  已重置作者任务状态: {author_task_id}")
         except Exception as e:
             logger.error(f"重置作者任务状态失败: {e}")
     
     logger.info("清理完成，退出程序")
-    sys.exit(1)
+    # 工作线程仍在运行，sys.exit 会等待线程结束，这里直接退出进程
+    logging.shutdown()
+    os._exit(1)
+
+
+def _track(ids, value):
+    """登记正在处理的资源/任务"""
+    with inflight_lock:
+        ids.add(value)
+
+
+def _untrack(ids, value):
+    """处理结束，取消登记"""
+    with inflight_lock:
+        ids.discard(value)
 
 
 # 注册中断信号处理器
@@ -116,13 +143,18 @@ signal.signal(signal.SIGTERM, cleanup_on_interrupt)  # kill 命令
 class SmartLibraryCrawler:
     """智能图书馆爬虫（基于任务队列）"""
     
-    def __init__(self):
+    def __init__(self, concurrency=None):
+        """
+        Args:
+            concurrency: 同时处理的任务数（默认使用配置 CRAWL_CONCURRENCY）
+        """
         self.db = DatabaseHelper()
         self.minio = MinioHelper()
         self.book_crawler = DoubanBookCrawler()
         self.author_crawler = DoubanAuthorCrawler()
         self.wiki_author_crawler = WikiAuthorCrawler()
         self.zlib_crawler = ZLibraryCrawler()
+        self.engine = AsyncCrawlEngine(concurrency)
         
         self.stats = {
             'books_crawled': 0,
@@ -133,6 +165,12 @@ class SmartLibraryCrawler:
             'tasks_completed': 0,
             'tasks_failed': 0
         }
+        self.stats_lock = threading.Lock()
+    
+    def _incr(self, key, count=1):
+        """累加统计（多个线程同时更新）"""
+        with self.stats_lock:
+            self.stats[key] += count
     
     def init_douban_tasks(self, books_per_category=20):
         """
@@ -168,12 +206,12 @@ class SmartLibraryCrawler:
     
     def crawl_douban(self, limit=None):
         """
-        爬取豆瓣图书（基于任务队列）
+        爬取豆瓣图书（基于任务队列，多个分类并发处理）
         
         Args:
             limit: 限制处理的任务数量
         """
-        global db_helper, current_task_id, current_resource_id
+        global db_helper
         db_helper = self.db  # 设置全局 db_helper 供中断处理使用
         
         logger.info("\n" + "=" * 60)
@@ -182,122 +220,115 @@ class SmartLibraryCrawler:
         
         start_time = time.time()
         
-        # 获取待处理任务
-        tasks = self.db.get_pending_douban_tasks(limit)
+        logger.info(f"并发数 {self.engine.concurrency}")
+        
+        # 每个工作者从数据库领取自己的任务（多个进程/机器同时运行也不会领取到同一任务）
+        claimer = TaskClaimer(lambda exclude_ids: self.db.claim_douban_tasks(1, exclude_ids), limit)
+        # 运行期间心跳续期租约，并回收其他进程遗留的过期任务
+        with TaskLeaseKeeper(self.db, 'douban_crawl_task'):
+            self.engine.run_workers(claimer, lambda worker_id, item: self._process_douban_task(*item, claimer))
         
-        if not tasks:
+        if not claimer.claimed:
             logger.info("没有待处理的豆瓣任务")
             return
         
-        logger.info(f"共 {len(tasks)} 个待处理任务")
+        elapsed_time = time.time() - start_time
+        self._print_douban_stats(elapsed_time)
+    
+    def _process_douban_task(self, idx, task, claimer):
+        """处理一个已领取的豆瓣分类任务（在工作线程中执行）"""
+        task_id, category_id, category_name, progress, target = task
+        _track(inflight_task_ids, task_id)  # 记录正在处理的任务ID
         
-        for idx, (task_id, category_id, category_name, progress, target) in enumerate(tasks, 1):
-            current_task_id = task_id  # 记录当前任务ID
-            current_resource_id = None  # 重置资源ID
+        logger.info(f"\n[{idx}] 处理分类: {category_name}")
+        logger.info(f"  进度: {progress}/{target}")
+        
+        try:
+            # 计算还需要爬取的数量
+            remaining = target - progress
             
-            logger.info(f"\n[{idx}/{len(tasks)}] 处理分类: {category_name}")
-            logger.info(f"  进度: {progress}/{target}")
+            if remaining <= 0:
+                logger.info(f"  [{category_name}] 已完成目标，标记为完成")
+                self.db.update_douban_task_status(task_id, status=2, progress=target)
+                self._incr('tasks_completed')
+                return
             
-            try:
-                # 更新任务状态为处理中
-                self.db.update_douban_task_status(task_id, status=1)
-                
-                # 计算还需要爬取的数量
-                remaining = target - progress
-                
-                if remaining <= 0:
-                    logger.info("  已完成目标，标记为完成")
-                    self.db.update_douban_task_status(task_id, status=2, progress=target)
-                    self.stats['tasks_completed'] += 1
-                    current_task_id = None  # 清除任务ID
-                    continue
-                
-                # 爬取图书（传入 category_id 用于建立关联）
-                books = self.book_crawler.crawl_top_books_with_ids(
-                    tag=category_name,
-                    category_id=category_id,
-                    count=remaining
-                )
-                
-                success_count = 0
-                
-                # 处理每本图书
-                for book_id, success in books:
-                    current_resource_id = book_id  # 记录当前资源ID
+            # 爬取图书（传入 category_id 用于建立关联）
+            books = self.book_crawler.crawl_top_books_with_ids(
+                tag=category_name,
+                category_id=category_id,
+                count=remaining
+            )
+            
+            success_count = 0
+            
+            # 处理每本图书
+            for book_id, success in books:
+                if success and book_id:
+                    _track(inflight_resource_ids, book_id)  # 记录正在处理的资源ID
+                    success_count += 1
+                    self._incr('books_crawled')
                     
-                    if success and book_id:
-                        success_count += 1
-                        self.stats['books_crawled'] += 1
+                    # 自动创建链接爬取任务（书籍页、下载页、解读页）
+                    try:
+                        from utils.link_task_helper import LinkTaskHelper
                         
-                        # 自动创建链接爬取任务（书籍页、下载页、解读页）
-                        try:
-                            from utils.link_task_helper import LinkTaskHelper
-                            
-                            # 获取图书的 ISBN 和标题
-                            query = """
-                            SELECT isbn, title
-                            FROM resource
-                            WHERE resource_id = :resource_id
-                            """
-                            result = self.db.execute_query(query, {'resource_id': book_id})
-                            row = result.fetchone()
-                            
-                            if row:
-                                isbn, title = row[0], row[1]
-                                created = LinkTaskHelper.create_task(
-                                    resource_id=book_id,
-                                    isbn=isbn,
-                                    title=title
-                                )
-                                if created:
-                                    logger.info(f"  ✓ 已创建链接爬取任务: {book_id}")
-                                else:
-                                    logger.debug(f"  链接任务已存在: {book_id}")
-                        except Exception as e:
-                            logger.warning(f"  创建链接任务失败: {e}")
-                    else:
-                        self.stats['books_skipped'] += 1
-                    
-                    current_resource_id = None  # 清除资源ID
-                
-                # 更新进度
-                new_progress = progress + success_count
-                
-                if new_progress >= target:
-                    # 完成任务
-                    self.db.update_douban_task_status(task_id, status=2, progress=new_progress)
-                    self.stats['tasks_completed'] += 1
-                    logger.info(f"  ✓ 任务完成，共爬取 {new_progress} 本图书")
+                        # 获取图书的 ISBN 和标题
+                        query = """
+                        SELECT isbn, title
+                        FROM resource
+                        WHERE resource_id = :resource_id
+                        """
+                        result = self.db.execute_query(query, {'resource_id': book_id})
+                        row = result.fetchone()
+                        
+                        if row:
+                            isbn, title = row[0], row[1]
+                            created = LinkTaskHelper.create_task(
+                                resource_id=book_id,
+                                isbn=isbn,
+                                title=title
+                            )
+                            if created:
+                                logger.info(f"  ✓ 已创建链接爬取任务: {book_id}")
+                            else:
+                                logger.debug(f"  链接任务已存在: {book_id}")
+                    except Exception as e:
+                        logger.warning(f"  创建链接任务失败: {e}")
+                    finally:
+                        _untrack(inflight_resource_ids, book_id)
                 else:
-                    # 更新进度，保持处理中状态
-                    self.db.update_douban_task_status(task_id, status=1, progress=new_progress)
-                    logger.info(f"  进度更新: {new_progress}/{target}")
-                
-                current_task_id = None  # 清除任务ID
-                
-                # 延迟，避免被封
-                time.sleep(2)
-                
-            except Exception as e:
-                logger.error(f"处理任务失败: {e}")
-                self.db.update_douban_task_status(task_id, status=3, error_msg=str(e))
-                self.stats['tasks_failed'] += 1
-                current_task_id = None  # 清除任务ID
-                continue
-        
-        current_task_id = None  # 清除任务ID
-        current_resource_id = None  # 清除资源ID
-        elapsed_time = time.time() - start_time
-        self._print_douban_stats(elapsed_time)
+                    self._incr('books_skipped')
+            
+            # 更新进度
+            new_progress = progress + success_count
+            
+            if new_progress >= target:
+                # 完成任务
+                self.db.update_douban_task_status(task_id, status=2, progress=new_progress)
+                self._incr('tasks_completed')
+                logger.info(f"  ✓ [{category_name}] 任务完成，共爬取 {new_progress} 本图书")
+            else:
+                # 更新进度，重置为待处理（释放租约，下次运行继续爬取）
+                self.db.update_douban_task_status(task_id, status=0, progress=new_progress)
+                claimer.defer(task_id)
+                logger.info(f"  [{category_name}] 进度更新: {new_progress}/{target}")
+            
+        except Exception as e:
+            logger.error(f"处理任务失败: {e}")
+            self.db.update_douban_task_status(task_id, status=3, error_msg=str(e))
+            self._incr('tasks_failed')
+        finally:
+            _untrack(inflight_task_ids, task_id)  # 清除任务ID
     
     def crawl_author(self, limit=None):
         """
-        爬取作者详细信息（基于任务队列）
+        爬取作者详细信息（基于任务队列，并发处理）
         
         Args:
             limit: 限制处理的任务数量
         """
-        global db_helper, current_author_task_id
+        global db_helper
         db_helper = self.db  # 设置全局 db_helper 供中断处理使用
         
         logger.info("\n" + "=" * 60)
@@ -306,76 +337,70 @@ class SmartLibraryCrawler:
         
         start_time = time.time()
         
-        # 获取待处理任务
-        tasks = self.db.get_pending_author_tasks(limit)
+        logger.info(f"并发数 {self.engine.concurrency}")
         
-        if not tasks:
+        # 每个工作者从数据库领取自己的任务
+        claimer = TaskClaimer(lambda exclude_ids: self.db.claim_author_tasks(1, exclude_ids), limit)
+        with TaskLeaseKeeper(self.db, 'author_crawl_task'):
+            self.engine.run_workers(claimer, lambda worker_id, item: self._process_author_task(*item))
+        
+        if not claimer.claimed:
             logger.info("没有待处理的作者任务")
             return
         
-        logger.info(f"共 {len(tasks)} 个待处理任务")
+        elapsed_time = time.time() - start_time
+        self._print_author_stats(elapsed_time)
+    
+    def _process_author_task(self, idx, task):
+        """处理一个已领取的豆瓣作者任务（在工作线程中执行）"""
+        task_id, author_id, author_name, author_url = task
+        _track(inflight_author_task_ids, task_id)  # 记录正在处理的作者任务ID
+        
+        logger.info(f"\n[{idx}] 处理作者: {author_name}")
         
-        for idx, (task_id, author_id, author_name, author_url) in enumerate(tasks, 1):
-            current_author_task_id = task_id  # 记录当前作者任务ID
+        try:
+            # 爬取作者详情（请求频率由按站点限速控制）
+            result = self.author_crawler.crawl_author_detail(
+                author_id, 
+                author_name, 
+                author_url
+            )
             
-            logger.info(f"\n[{idx}/{len(tasks)}] 处理作者: {author_name}")
+            if result == 'success':
+                # 标记任务完成
+                self.db.update_author_task_status(task_id, status=2)
+                self._incr('tasks_completed')
+                self._incr('authors_crawled')
+            elif result == 'no_url':
+                # 标记为无资源（没有 URL）
+                self.db.update_author_task_status(task_id, status=4, error_msg="没有作者 URL")
+                self._incr('authors_skipped')
+            elif result == 'blocked':
+                # 触发反爬虫：重置为待处理，延后再领取（限流不计入失败次数）
+                self.db.defer_task('author_crawl_task', task_id, Config.TASK_BLOCKED_DELAY_SECONDS,
+                                   error_msg="触发反爬虫验证")
+                self._incr('authors_skipped')
+                logger.warning(f"  ⚠ 触发反爬虫，任务将延迟重试，频繁出现时建议调低 douban.com 的限速")
+            else:
+                # 标记为失败
+                self.db.update_author_task_status(task_id, status=3, error_msg="爬取失败")
+                self._incr('tasks_failed')
             
-            try:
-                # 更新任务状态为处理中
-                self.db.update_author_task_status(task_id, status=1)
-                
-                # 爬取作者详情
-                result = self.author_crawler.crawl_author_detail(
-                    author_id, 
-                    author_name, 
-                    author_url
-                )
-                
-                if result == 'success':
-                    # 标记任务完成
-                    self.db.update_author_task_status(task_id, status=2)
-                    self.stats['tasks_completed'] += 1
-                    self.stats['authors_crawled'] += 1
-                elif result == 'no_url':
-                    # 标记为无资源（没有 URL）
-                    self.db.update_author_task_status(task_id, status=4, error_msg="没有作者 URL")
-                    self.stats['authors_skipped'] += 1
-                elif result == 'blocked':
-                    # 标记为待处理（触发反爬虫，稍后重试）
-                    self.db.update_author_task_status(task_id, status=0, error_msg="触发反爬虫验证")
-                    self.stats['authors_skipped'] += 1
-                    logger.warning(f"  ⚠ 触发反爬虫，任务重置为待处理，建议稍后重试")
-                else:
-                    # 标记为失败
-                    self.db.update_author_task_status(task_id, status=3, error_msg="爬取失败")
-                    self.stats['tasks_failed'] += 1
-                
-                current_author_task_id = None  # 清除任务ID
-                
-                # 延迟，避免被封（作者爬取延迟更长，增加随机性）
-                delay = random.randint(8, 15)  # 8-15秒随机延迟
-                logger.debug(f"  等待 {delay} 秒...")
-                time.sleep(delay)
-                
-            except Exception as e:
-                logger.error(f"处理任务失败: {e}")
-                self.db.update_author_task_status(task_id, status=3, error_msg=str(e))
-                self.stats['tasks_failed'] += 1
-                current_author_task_id = None  # 清除任务ID
-                continue
-        
-        current_author_task_id = None  # 清除任务ID
-        elapsed_time = time.time() - start_time
-        self._print_author_stats(elapsed_time)
+        except Exception as e:
+            logger.error(f"处理任务失败: {e}")
+            self.db.update_author_task_status(task_id, status=3, error_msg=str(e))
+            self._incr('tasks_failed')
+        finally:
+            _untrack(inflight_author_task_ids, task_id)  # 清除任务ID
     
     def crawl_wiki_author(self, limit=None):
         """
-        从百度百科/维基百科爬取作者详细信息（基于任务队列）
+        从百度百科/维基百科爬取作者详细信息（基于任务队列，并发处理）
         
         Args:
             limit: 限制处理的任务数量
         """
-        global db_helper, current_author_task_id
+        global db_helper
         db_helper = self.db  # 设置全局 db_helper 供中断处理使用
         
         logger.info("\n" + "=" * 60)
@@ -384,65 +409,58 @@ class SmartLibraryCrawler:
         
         start_time = time.time()
         
-        # 获取待处理任务
-        tasks = self.db.get_pending_author_tasks(limit)
+        logger.info(f"并发数 {self.engine.concurrency}")
+        
+        # 每个工作者从数据库领取自己的任务
+        claimer = TaskClaimer(lambda exclude_ids: self.db.claim_author_tasks(1, exclude_ids), limit)
+        with TaskLeaseKeeper(self.db, 'author_crawl_task'):
+            self.engine.run_workers(claimer, lambda worker_id, item: self._process_wiki_author_task(*item))
         
-        if not tasks:
+        if not claimer.claimed:
             logger.info("没有待处理的作者任务")
             return
         
-        logger.info(f"共 {len(tasks)} 个待处理任务")
+        elapsed_time = time.time() - start_time
+        self._print_author_stats(elapsed_time)
+    
+    def _process_wiki_author_task(self, idx, task):
+        """处理一个已领取的百科作者任务（在工作线程中执行）"""
+        task_id, author_id, author_name, author_url = task
+        _track(inflight_author_task_ids, task_id)  # 记录正在处理的作者任务ID
+        
+        logger.info(f"\n[{idx}] 处理作者: {author_name}")
         
-        for idx, (task_id, author_id, author_name, author_url) in enumerate(tasks, 1):
-            current_author_task_id = task_id  # 记录当前作者任务ID
+        try:
+            # 爬取作者详情（不需要 author_url，自动搜索）
+            result = self.wiki_author_crawler.crawl_author_detail(
+                author_id, 
+                author_name
+            )
             
-            logger.info(f"\n[{idx}/{len(tasks)}] 处理作者: {author_name}")
+            if result == 'success':
+                # 标记任务完成
+                self.db.update_author_task_status(task_id, status=2)
+                self._incr('tasks_completed')
+                self._incr('authors_crawled')
+            elif result == 'no_result':
+                # 标记为无资源（未找到结果）
+                self.db.update_author_task_status(task_id, status=4, error_msg="百度百科和维基百科均未找到")
+                self._incr('authors_skipped')
+            else:
+                # 标记为失败
+                self.db.update_author_task_status(task_id, status=3, error_msg="爬取失败")
+                self._incr('tasks_failed')
             
-            try:
-                # 更新任务状态为处理中
-                self.db.update_author_task_status(task_id, status=1)
-                
-                # 爬取作者详情（不需要 author_url，自动搜索）
-                result = self.wiki_author_crawler.crawl_author_detail(
-                    author_id, 
-                    author_name
-                )
-                
-                if result == 'success':
-                    # 标记任务完成
-                    self.db.update_author_task_status(task_id, status=2)
-                    self.stats['tasks_completed'] += 1
-                    self.stats['authors_crawled'] += 1
-                elif result == 'no_result':
-                    # 标记为无资源（未找到结果）
-                    self.db.update_author_task_status(task_id, status=4, error_msg="百度百科和维基百科均未找到")
-                    self.stats['authors_skipped'] += 1
-                else:
-                    # 标记为失败
-                    self.db.update_author_task_status(task_id, status=3, error_msg="爬取失败")
-                    self.stats['tasks_failed'] += 1
-                
-                current_author_task_id = None  # 清除任务ID
-                
-                # 延迟，避免被封（随机延迟）
-                delay = random.randint(3, 6)  # 3-6秒随机延迟
-                logger.debug(f"  等待 {delay} 秒...")
-                time.sleep(delay)
-                
-            except Exception as e:
-                logger.error(f"处理任务失败: {e}")
-                self.db.update_author_task_status(task_id, status=3, error_msg=str(e))
-                self.stats['tasks_failed'] += 1
-                current_author_task_id = None  # 清除任务ID
-                continue
-        
-        current_author_task_id = None  # 清除任务ID
-        elapsed_time = time.time() - start_time
-        self._print_author_stats(elapsed_time)
+        except Exception as e:
+            logger.error(f"处理任务失败: {e}")
+            self.db.update_author_task_status(task_id, status=3, error_msg=str(e))
+            self._incr('tasks_failed')
+        finally:
+            _untrack(inflight_author_task_ids, task_id)  # 清除任务ID
     
     def crawl_zlibrary(self, limit=None):
         """
-        下载 ZLibrary 电子书文件（基于任务队列）
+        下载 ZLibrary 电子书文件（基于任务队列，并发处理）
         
         Args:
             limit: 限制处理的任务数量
@@ -453,114 +471,112 @@ class SmartLibraryCrawler:
         
         start_time = time.time()
         
-        # 获取待处理任务
-        tasks = self.db.get_pending_zlibrary_tasks(limit)
+        logger.info(f"并发数 {self.engine.concurrency}")
         
-        if not tasks:
+        # 每个工作者从数据库领取自己的任务
+        claimer = TaskClaimer(lambda exclude_ids: self.db.claim_zlibrary_tasks(1, exclude_ids), limit)
+        with TaskLeaseKeeper(self.db, 'zlibrary_download_task'):
+            self.engine.run_workers(claimer, lambda worker_id, item: self._process_zlibrary_task(*item))
+        
+        if not claimer.claimed:
             logger.info("没有待处理的 ZLibrary 任务")
             return
         
-        logger.info(f"共 {len(tasks)} 个待处理任务")
+        elapsed_time = time.time() - start_time
+        self._print_zlibrary_stats(elapsed_time)
+    
+    def _process_zlibrary_task(self, idx, task):
+        """处理一个已领取的 ZLibrary 下载任务（在工作线程中执行）"""
+        task_id, resource_id, isbn, title = task
+        logger.info(f"\n[{idx}] 处理图书: {title} (ISBN: {isbn})")
         
-        for idx, (task_id, resource_id, isbn, title) in enumerate(tasks, 1):
-            logger.info(f"\n[{idx}/{len(tasks)}] 处理图书: {title} (ISBN: {isbn})")
+        try:
+            # 下载电子书文件
+            files = self.zlib_crawler.download_and_get_content(isbn)
+            
+            if not files:
+                logger.info(f"  [{title}] 未找到可下载的电子书")
+                self.db.update_zlibrary_task_status(task_id, status=4, error_msg="未找到电子书")
+                return
             
-            try:
-                # 更新任务状态为处理中
-                self.db.update_zlibrary_task_status(task_id, status=1)
+            file_count = 0
+            pdf_ok = epub_ok = mobi_ok = 0
+            
+            # 上传每个文件到 MinIO
+            for file_type, file_content in files.items():
+                # 检查是否已存在
+                if self.db.file_exists(resource_id, file_type):
+                    logger.info(f"  {self._get_format_name(file_type)} 已存在，跳过")
+                    # 标记为已下载
+                    if file_type == 1:
+                        pdf_ok = 1
+                    elif file_type == 2:
+                        epub_ok = 1
+                    elif file_type == 3:
+                        mobi_ok = 1
+                    continue
                 
-                # 下载电子书文件
-                files = self.zlib_crawler.download_and_get_content(isbn)
+                # 生成文件名
+                ext_map = {1: '.pdf', 2: '.epub', 3: '.mobi'}
+                file_name = f"{uuid.uuid4().hex}{ext_map.get(file_type, '.bin')}"
                 
-                if not files:
-                    logger.info("  未找到可下载的电子书")
-                    self.db.update_zlibrary_task_status(task_id, status=4, error_msg="未找到电子书")
-                    continue
+                # 上传到 MinIO
+                content_type_map = {
+                    1: 'application/pdf',
+                    2: 'application/epub+zip',
+                    3: 'application/x-mobipocket-ebook'
+                }
                 
-                file_count = 0
-                pdf_ok = epub_ok = mobi_ok = 0
+                uploaded_file = self.minio.upload_file(
+                    file_content,
+                    file_name,
+                    bucket_name=Config.MINIO_BUCKET_ATTACHMENTS,
+                    content_type=content_type_map.get(file_type, 'application/octet-stream')
+                )
                 
-                # 上传每个文件到 MinIO
-                for file_type, file_content in files.items():
-                    # 检查是否已存在
-                    if self.db.file_exists(resource_id, file_type):
-                        logger.info(f"  {self._get_format_name(file_type)} 已存在，跳过")
-                        # 标记为已下载
-                        if file_type == 1:
-                            pdf_ok = 1
-                        elif file_type == 2:
-                            epub_ok = 1
-                        elif file_type == 3:
-                            mobi_ok = 1
-                        continue
+                if uploaded_file:
+                    # 获取文件 URL
+                    file_url = self.minio.get_file_url(
+                        uploaded_file,
+                        bucket_name=Config.MINIO_BUCKET_ATTACHMENTS
+                    )
                     
-                    # 生成文件名
-                    ext_map = {1: '.pdf', 2: '.epub', 3: '.mobi'}
-                    file_name = f"{uuid.uuid4().hex}{ext_map.get(file_type, '.bin')}"
+                    # 保存到数据库
+                    self.db.insert_resource_file({
+                        'resource_id': resource_id,
+                        'file_type': file_type,
+                        'file_url': file_url,
+                        'file_size': len(file_content)
+                    })
                     
-                    # 上传到 MinIO
-                    content_type_map = {
-                        1: 'application/pdf',
-                        2: 'application/epub+zip',
-                        3: 'application/x-mobipocket-ebook'
-                    }
+                    file_count += 1
+                    self._incr('files_downloaded')
                     
-                    uploaded_file = self.minio.upload_file(
-                        file_content,
-                        file_name,
-                        bucket_name=Config.MINIO_BUCKET_ATTACHMENTS,
-                        content_type=content_type_map.get(file_type, 'application/octet-stream')
-                    )
+                    # 标记为已下载
+                    if file_type == 1:
+                        pdf_ok = 1
+                    elif file_type == 2:
+                        epub_ok = 1
+                    elif file_type == 3:
+                        mobi_ok = 1
                     
-                    if uploaded_file:
-                        # 获取文件 URL
-                        file_url = self.minio.get_file_url(
-                            uploaded_file,
-                            bucket_name=Config.MINIO_BUCKET_ATTACHMENTS
-                        )
-                        
-                        # 保存到数据库
-                        self.db.insert_resource_file({
-                            'resource_id': resource_id,
-                            'file_type': file_type,
-                            'file_url': file_url,
-                            'file_size': len(file_content)
-                        })
-                        
-                        file_count += 1
-                        self.stats['files_downloaded'] += 1
-                        
-                        # 标记为已下载
-                        if file_type == 1:
-                            pdf_ok = 1
-                        elif file_type == 2:
-                            epub_ok = 1
-                        elif file_type == 3:
-                            mobi_ok = 1
-                        
-                        logger.info(f"  ✓ {self._get_format_name(file_type)} 上传成功")
-                
-                # 标记任务完成
-                self.db.update_zlibrary_task_status(
-                    task_id, 
-                    status=2,
-                    pdf_downloaded=pdf_ok,
-                    epub_downloaded=epub_ok,
-                    mobi_downloaded=mobi_ok
-                )
-                self.stats['tasks_completed'] += 1
-                logger.info(f"  ✓ 任务完成，共上传 {file_count} 个文件")
-                
-                time.sleep(2)
-                
-            except Exception as e:
-                logger.error(f"处理任务失败: {e}")
-                self.db.update_zlibrary_task_status(task_id, status=3, error_msg=str(e))
-                self.stats['tasks_failed'] += 1
-                continue
-        
-        elapsed_time = time.time() - start_time
-        self._print_zlibrary_stats(elapsed_time)
+                    logger.info(f"  ✓ {self._get_format_name(file_type)} 上传成功")
+            
+            # 标记任务完成
+            self.db.update_zlibrary_task_status(
+                task_id, 
+                status=2,
+                pdf_downloaded=pdf_ok,
+                epub_downloaded=epub_ok,
+                mobi_downloaded=mobi_ok
+            )
+            self._incr('tasks_completed')
+            logger.info(f"  ✓ [{title}] 任务完成，共上传 {file_count} 个文件")
+            
+        except Exception as e:
+            logger.error(f"处理任务失败: {e}")
+            self.db.update_zlibrary_task_status(task_id, status=3, error_msg=str(e))
+            self._incr('tasks_failed')
     
     def _get_format_name(self, file_type):
         """获取文件格式名称"""
@@ -623,21 +639,29 @@ def main():
     douban_parser = subparsers.add_parser('douban', help='爬取豆瓣图书')
     douban_parser.add_argument('--limit', type=int, default=None,
                               help='限制处理的任务数量')
+    douban_parser.add_argument('--concurrency', type=int, default=None,
+                              help='同时处理的任务数（默认: 配置 CRAWL_CONCURRENCY）')
     
     # author 命令：爬取作者详情（豆瓣）
     author_parser = subparsers.add_parser('author', help='爬取作者详细信息（豆瓣）')
     author_parser.add_argument('--limit', type=int, default=None,
                               help='限制处理的任务数量')
+    author_parser.add_argument('--concurrency', type=int, default=None,
+                              help='同时处理的任务数（默认: 配置 CRAWL_CONCURRENCY）')
     
     # wiki-author 命令：爬取作者详情（百度百科/维基百科）
     wiki_author_parser = subparsers.add_parser('wiki-author', help='爬取作者详细信息（百度百科/维基百科）')
     wiki_author_parser.add_argument('--limit', type=int, default=None,
                                     help='限制处理的任务数量')
+    wiki_author_parser.add_argument('--concurrency', type=int, default=None,
+                                    help='同时处理的任务数（默认: 配置 CRAWL_CONCURRENCY）')
     
     # zlibrary 命令：下载电子书文件
     zlib_parser = subparsers.add_parser('zlibrary', help='下载 ZLibrary 电子书')
     zlib_parser.add_argument('--limit', type=int, default=None,
                             help='限制处理的任务数量')
+    zlib_parser.add_argument('--concurrency', type=int, default=None,
+                            help='同时处理的任务数（默认: 配置 CRAWL_CONCURRENCY）')
     
     args = parser.parse_args()
     
@@ -646,7 +670,7 @@ def main():
         return 1
     
     try:
-        crawler = SmartLibraryCrawler()
+        crawler = SmartLibraryCrawler(concurrency=getattr(args, 'concurrency', None))
         
         if args.command == 'init-douban':
             crawler.init_douban_tasks(args.books_per_category)
@@ -6,12 +6,11 @@
 """
 import requests
 from bs4 import BeautifulSoup
-import time
 import logging
 import random
 from urllib.parse import unquote, parse_qs, urlparse, quote
 from config import Config
-from utils import DatabaseHelper, MinioHelper
+from utils import DatabaseHelper, MinioHelper, RateLimitedSession
 
 logger = logging.getLogger(__name__)
 
@@ -22,7 +21,7 @@ class DoubanAuthorCrawler:
     def __init__(self):
         self.db = DatabaseHelper()
         self.minio = MinioHelper()
-        self.session = requests.Session()
+        self.session = RateLimitedSession()
         
         # 随机 User-Agent 列表
         self.user_agents = [
@@ -174,7 +173,6 @@ class DoubanAuthorCrawler:
             self.db.update_author_detail(author_id, author_data)
             
             logger.info(f"  ✓ 作者信息爬取成功: {author_name}")
-            time.sleep(Config.REQUEST_DELAY + 2)  # 额外增加 2 秒延迟
             return 'success'
             
         except Exception as e:
@@ -4,13 +4,11 @@
 @author JacoryCyJin
 @date 2025/02/27
 """
-import requests
 from bs4 import BeautifulSoup
-import time
 import logging
 import uuid
 from config import Config
-from utils import DatabaseHelper, MinioHelper
+from utils import DatabaseHelper, MinioHelper, RateLimitedSession
 
 logger = logging.getLogger(__name__)
 
@@ -21,7 +19,7 @@ class DoubanBookCrawler:
     def __init__(self):
         self.db = DatabaseHelper()
         self.minio = MinioHelper()
-        self.session = requests.Session()
+        self.session = RateLimitedSession()
         self.session.headers.update({'User-Agent': Config.USER_AGENT})
     
 
@@ -300,8 +298,6 @@ class DoubanBookCrawler:
                             yield (book_id, True)  # 边爬边返回
                         else:
                             yield (None, False)
-                    
-                    time.sleep(Config.REQUEST_DELAY)
                 except Exception as e:
                     logger.error(f"获取图书详情失败 {book_url}: {e}")
                     yield (None, False)
@@ -469,7 +465,6 @@ class DoubanBookCrawler:
                     logger.warning(f"  分类关联失败: {e}")
             
             logger.info(f"图书爬取成功: {book_data['title']}")
-            time.sleep(Config.REQUEST_DELAY)
             return resource_id
             
         except Exception as e:
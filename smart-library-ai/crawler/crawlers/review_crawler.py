@@ -4,14 +4,13 @@
 @author JacoryCyJin
 @date 2026/03/08
 """
-import requests
-import time
 import logging
 import re
 import json
 import urllib.parse
 from typing import List, Dict, Optional
 from bs4 import BeautifulSoup
+from utils import RateLimitedSession
 from .base_link_crawler import BaseLinkCrawler
 
 logger = logging.getLogger(__name__)
@@ -35,6 +34,8 @@ class ReviewCrawler(BaseLinkCrawler):
     def __init__(self):
         # 初始化基类：link_type=3(解读页), platform=3(B站)
         super().__init__(link_type=self.LINK_TYPE_REVIEW, platform=self.PLATFORM_BILIBILI)
+        # 请求按站点限速（B站、YouTube 各自一个令牌桶）
+        self.session = RateLimitedSession()
     
     def search_links(self, resource_id: str, isbn: Optional[str] = None, 
                     title: Optional[str] = None) -> List[Dict]:
@@ -67,8 +68,6 @@ class ReviewCrawler(BaseLinkCrawler):
             bilibili_links = self._search_bilibili_videos(search_keyword)
             all_links.extend(bilibili_links)
             
-            time.sleep(2)
-            
             # 2. 搜索 YouTube 视频（网页爬取）
             youtube_links = self._search_youtube_videos(search_keyword)
             all_links.extend(youtube_links)
@@ -98,7 +97,6 @@ class ReviewCrawler(BaseLinkCrawler):
                         cover_url = self._fetch_bilibili_cover(bvid)
                         if cover_url:
                             link['cover_url'] = cover_url
-                        time.sleep(0.5)  # API 限流
             
             # 6. 移除内部字段并设置 sort_order
             for idx, link in enumerate(final_links):
@@ -138,12 +136,11 @@ class ReviewCrawler(BaseLinkCrawler):
                         'Accept-Language': 'zh-CN,zh;q=0.9'
                     }
                     
-                    response = requests.get(search_url, headers=headers, timeout=15)
+                    response = self.session.get(search_url, headers=headers, timeout=15)
                     response.raise_for_status()
                     
                     videos = self._parse_bilibili_search_page(response.text)
                     all_videos.extend(videos)
-                    time.sleep(2)
                     
                 except Exception as e:
                     logger.warning(f"搜索 B站关键词 '{search_keyword}' 失败: {e}")
@@ -264,12 +261,11 @@ class ReviewCrawler(BaseLinkCrawler):
                         'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8'
                     }
                     
-                    response = requests.get(search_url, headers=headers, timeout=15)
+                    response = self.session.get(search_url, headers=headers, timeout=15)
                     response.raise_for_status()
                     
                     videos = self._parse_youtube_search_page(response.text, keyword)
                     all_videos.extend(videos)
-                    time.sleep(2)
                     
                 except Exception as e:
                     logger.warning(f"搜索 YouTube 关键词 '{search_keyword}' 失败: {e}")
@@ -448,7 +444,7 @@ class ReviewCrawler(BaseLinkCrawler):
                 'Referer': 'https://www.bilibili.com'
             }
             
-            response = requests.get(api_url, headers=headers, timeout=10)
+            response = self.session.get(api_url, headers=headers, timeout=10)
             response.raise_for_status()
             
             data = response.json()
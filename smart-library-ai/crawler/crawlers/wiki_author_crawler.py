@@ -6,15 +6,13 @@
 @author JacoryCyJin
 @date 2025/03/02
 """
-import requests
 from bs4 import BeautifulSoup
-import time
 import logging
 import random
 import re
 from urllib.parse import quote
 from config import Config
-from utils import DatabaseHelper, MinioHelper
+from utils import DatabaseHelper, MinioHelper, RateLimitedSession
 
 logger = logging.getLogger(__name__)
 
@@ -25,7 +23,7 @@ class WikiAuthorCrawler:
     def __init__(self):
         self.db = DatabaseHelper()
         self.minio = MinioHelper()
-        self.session = requests.Session()
+        self.session = RateLimitedSession()
         
         # 随机 User-Agent 列表
         self.user_agents = [
@@ -155,7 +153,6 @@ class WikiAuthorCrawler:
             self.db.update_author_detail(author_id, author_data)
             
             logger.info(f"  ✓ 从维基百科获取成功: {author_name}")
-            time.sleep(random.randint(2, 5))  # 随机延迟
             return 'success'
             
         except Exception as e:
@@ -227,7 +224,6 @@ class WikiAuthorCrawler:
             self.db.update_author_detail(author_id, author_data)
             
             logger.info(f"  ✓ 从百度百科获取成功: {author_name}")
-            time.sleep(random.randint(2, 5))  # 随机延迟
             return 'success'
             
         except Exception as e:
@@ -18,11 +18,17 @@ CREATE TABLE IF NOT EXISTS douban_crawl_task (
     error_msg TEXT COMMENT '错误信息',
     retry_count INT DEFAULT 0 COMMENT '重试次数',
     
+    -- 任务租约（多个爬虫进程领取任务）
+    lease_owner VARCHAR(100) DEFAULT NULL COMMENT '租约持有者（前缀:进程号:随机后缀）',
+    lease_expire_at DATETIME DEFAULT NULL COMMENT '租约到期时间',
+    next_retry_at DATETIME DEFAULT NULL COMMENT '下次重试时间（按重试次数指数退避）',
+    
     ctime DATETIME DEFAULT CURRENT_TIMESTAMP COMMENT '创建时间',
     mtime DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间',
     
     UNIQUE KEY uk_category (category_id),
-    INDEX idx_status (status)
+    INDEX idx_status (status),
+    INDEX idx_lease_expire (lease_expire_at)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='豆瓣图书爬取任务表';
 
 -- ==========================================
@@ -44,11 +50,17 @@ CREATE TABLE IF NOT EXISTS author_crawl_task (
     error_msg TEXT COMMENT '错误信息',
     retry_count INT DEFAULT 0 COMMENT '重试次数',
     
+    -- 任务租约（多个爬虫进程领取任务）
+    lease_owner VARCHAR(100) DEFAULT NULL COMMENT '租约持有者（前缀:进程号:随机后缀）',
+    lease_expire_at DATETIME DEFAULT NULL COMMENT '租约到期时间',
+    next_retry_at DATETIME DEFAULT NULL COMMENT '下次重试时间（按重试次数指数退避）',
+    
     ctime DATETIME DEFAULT CURRENT_TIMESTAMP COMMENT '创建时间',
     mtime DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间',
     
     UNIQUE KEY uk_author (author_id),
-    INDEX idx_status (status)
+    INDEX idx_status (status),
+    INDEX idx_lease_expire (lease_expire_at)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='作者信息爬取任务表';
 
 -- ==========================================
@@ -86,6 +98,11 @@ CREATE TABLE IF NOT EXISTS resource_link_crawl_task (
     error_msg TEXT COMMENT '错误信息',
     retry_count INT DEFAULT 0 COMMENT '重试次数',
     
+    -- 任务租约（多个爬虫进程领取任务）
+    lease_owner VARCHAR(100) DEFAULT NULL COMMENT '租约持有者（前缀:进程号:随机后缀）',
+    lease_expire_at DATETIME DEFAULT NULL COMMENT '租约到期时间',
+    next_retry_at DATETIME DEFAULT NULL COMMENT '下次重试时间（按重试次数指数退避）',
+    
     ctime DATETIME DEFAULT CURRENT_TIMESTAMP COMMENT '创建时间',
     mtime DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间',
     
@@ -93,7 +110,8 @@ CREATE TABLE IF NOT EXISTS resource_link_crawl_task (
     INDEX idx_isbn (isbn),
     INDEX idx_info_status (info_page_status),
     INDEX idx_download_status (download_page_status),
-    INDEX idx_review_status (review_page_status)
+    INDEX idx_review_status (review_page_status),
+    INDEX idx_lease_expire (lease_expire_at)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='资源链接爬取任务表（一本书一条记录）';
 
 -- ==========================================
@@ -105,6 +123,10 @@ CREATE TABLE IF NOT EXISTS resource_link_crawl_task (
 -- 2. 如果已有旧表 zlibrary_download_task：
 --    先运行 safe_migration_steps.sql 进行安全迁移
 --
+-- 2.1 已有任务表（升级前创建）需要补充租约字段：
+--    mysql -u root -p smart_library < migrations/add_task_lease.sql
+--    mysql -u root -p smart_library < migrations/add_task_retry_backoff.sql
+--
 -- 3. 初始化任务：
 --    python init_link_tasks.py
 --
@@ -0,0 +1,30 @@
+-- ==========================================
+-- 任务表增加租约字段：支持多个爬虫进程/机器同时领取任务
+-- 说明：
+--   1. 领取任务时 SELECT ... FOR UPDATE SKIP LOCKED 并写入租约（需要 MySQL 8.0+）
+--   2. 租约未到期的任务不会被其他进程领取，任务结束后释放
+--   3. 只需执行一次（重复执行会提示字段已存在）
+-- ==========================================
+
+USE smart_library;
+
+ALTER TABLE douban_crawl_task
+    ADD COLUMN lease_owner VARCHAR(100) DEFAULT NULL COMMENT '租约持有者（前缀:进程号:随机后缀）' AFTER retry_count,
+    ADD COLUMN lease_expire_at DATETIME DEFAULT NULL COMMENT '租约到期时间' AFTER lease_owner,
+    ADD INDEX idx_lease_expire (lease_expire_at);
+
+ALTER TABLE author_crawl_task
+    ADD COLUMN lease_owner VARCHAR(100) DEFAULT NULL COMMENT '租约持有者（前缀:进程号:随机后缀）' AFTER retry_count,
+    ADD COLUMN lease_expire_at DATETIME DEFAULT NULL COMMENT '租约到期时间' AFTER lease_owner,
+    ADD INDEX idx_lease_expire (lease_expire_at);
+
+ALTER TABLE resource_link_crawl_task
+    ADD COLUMN lease_owner VARCHAR(100) DEFAULT NULL COMMENT '租约持有者（前缀:进程号:随机后缀）' AFTER retry_count,
+    ADD COLUMN lease_expire_at DATETIME DEFAULT NULL COMMENT '租约到期时间' AFTER lease_owner,
+    ADD INDEX idx_lease_expire (lease_expire_at);
+
+-- 旧表 zlibrary_download_task（如果仍在使用 crawler.py zlibrary）
+ALTER TABLE zlibrary_download_task
+    ADD COLUMN lease_owner VARCHAR(100) DEFAULT NULL COMMENT '租约持有者（前缀:进程号:随机后缀）' AFTER retry_count,
+    ADD COLUMN lease_expire_at DATETIME DEFAULT NULL COMMENT '租约到期时间' AFTER lease_owner,
+    ADD INDEX idx_lease_expire (lease_expire_at);
@@ -0,0 +1,22 @@
+-- ==========================================
+-- 任务表增加下次重试时间：回收的过期任务、触发反爬虫的任务按重试次数指数退避
+-- 说明：
+--   1. 需先执行 add_task_lease.sql
+--   2. next_retry_at 未到的任务不会被领取；retry_count 超过 MAX_RETRIES 的任务标记为失败
+--   3. 只需执行一次（重复执行会提示字段已存在）
+-- ==========================================
+
+USE smart_library;
+
+ALTER TABLE douban_crawl_task
+    ADD COLUMN next_retry_at DATETIME DEFAULT NULL COMMENT '下次重试时间（按重试次数指数退避）' AFTER lease_expire_at;
+
+ALTER TABLE author_crawl_task
+    ADD COLUMN next_retry_at DATETIME DEFAULT NULL COMMENT '下次重试时间（按重试次数指数退避）' AFTER lease_expire_at;
+
+ALTER TABLE resource_link_crawl_task
+    ADD COLUMN next_retry_at DATETIME DEFAULT NULL COMMENT '下次重试时间（按重试次数指数退避）' AFTER lease_expire_at;
+
+-- 旧表 zlibrary_download_task（如果仍在使用 crawler.py zlibrary）
+ALTER TABLE zlibrary_download_task
+    ADD COLUMN next_retry_at DATETIME DEFAULT NULL COMMENT '下次重试时间（按重试次数指数退避）' AFTER lease_expire_at;
@@ -4,9 +4,15 @@
 @author JacoryCyJin
 @date 2025/02/27
 @update 2026/03/08 - 新增链接任务辅助类
+@update 2026/10/18 - 新增按站点限速、并发爬取引擎和任务租约维护
 """
 from .db_helper import DatabaseHelper
 from .minio_helper import MinioHelper
 from .link_task_helper import LinkTaskHelper
+from .rate_limiter import HostRateLimiter, RateLimitedSession, get_rate_limiter
+from .crawl_engine import AsyncCrawlEngine, TaskClaimer
+from .task_lease import TaskLeaseKeeper
 
-__all__ = ['DatabaseHelper', 'MinioHelper', 'LinkTaskHelper']
+__all__ = ['DatabaseHelper', 'MinioHelper', 'LinkTaskHelper',
+           'HostRateLimiter', 'RateLimitedSession', 'get_rate_limiter', 'AsyncCrawlEngine', 'TaskClaimer',
+           'TaskLeaseKeeper']
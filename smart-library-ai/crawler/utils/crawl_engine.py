@@ -0,0 +1,100 @@
+"""
+并发爬取引擎 - asyncio 调度 + 线程执行
+
+爬虫本身是同步的 requests + BeautifulSoup 代码，引擎用 asyncio 启动固定数量的工作者，
+每个工作者在线程池里循环领取并执行任务，多个任务的网络等待互相重叠。
+请求频率由 RateLimitedSession 按站点控制，任务之间不再需要固定 sleep
+
+@author JacoryCyJin
+@date 2025/02/27
+"""
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncCrawlEngine:
+    """并发执行爬取任务"""
+
+    def __init__(self, concurrency=None):
+        """
+        Args:
+            concurrency: 同时处理的任务数（默认使用配置 CRAWL_CONCURRENCY）
+        """
+        self.concurrency = max(1, concurrency or Config.CRAWL_CONCURRENCY)
+
+    def run_workers(self, claim_next: Callable, handler: Callable):
+        """
+        启动 concurrency 个工作者，每个工作者循环领取并处理任务，直到没有任务
+
+        Args:
+            claim_next: 领取下一个任务的函数 claim_next(worker_id)，没有任务时返回 None；
+                        多个工作者会同时调用，需保证同一任务只被领取一次
+            handler: 处理任务的函数 handler(worker_id, task)；同一工作者的任务依次执行，
+                     抛出的异常只记录日志，工作者继续领取下一个任务
+        """
+        asyncio.run(self._run_workers(claim_next, handler))
+
+    async def _run_workers(self, claim_next, handler):
+        loop = asyncio.get_running_loop()
+
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='crawl-worker') as executor:
+            async def worker(worker_id):
+                while True:
+                    task = await loop.run_in_executor(executor, claim_next, worker_id)
+                    if task is None:
+                        return
+                    try:
+                        await loop.run_in_executor(executor, handler, worker_id, task)
+                    except Exception as e:
+                        logger.error(f"工作者 {worker_id} 处理任务异常: {e}")
+
+            await asyncio.gather(*(worker(worker_id) for worker_id in range(1, self.concurrency + 1)))
+
+
+class TaskClaimer:
+    """
+    工作者的领取函数：每次从数据库原子领取一个任务，最多领取 limit 个
+
+    作为 run_workers 的 claim_next 使用，返回 (序号, 任务)
+    """
+
+    def __init__(self, claim: Callable, limit: Optional[int] = None):
+        """
+        Args:
+            claim: 领取函数 claim(exclude_ids)，返回领取到的任务列表（最多一个）
+            limit: 最多领取的任务数（None 表示不限制）
+        """
+        self.claim = claim
+        self.limit = limit
+        self.reserved = 0  # 已占用的领取名额
+        self.claimed = 0  # 实际领取到的任务数
+        self.deferred_ids = set()
+        self.lock = threading.Lock()
+
+    def defer(self, task_id):
+        """任务处理后重置为待处理（未完成、触发反爬虫等），本次运行不再领取，留给下次运行"""
+        with self.lock:
+            self.deferred_ids.add(task_id)
+
+    def __call__(self, worker_id):
+        with self.lock:
+            if self.limit and self.reserved >= self.limit:
+                return None
+            # 先占用名额，避免多个工作者同时领取超过 limit
+            self.reserved += 1
+            exclude_ids = list(self.deferred_ids)
+
+        tasks = self.claim(exclude_ids)
+        if not tasks:
+            return None
+
+        with self.lock:
+            self.claimed += 1
+            idx = self.claimed
+        return idx, tasks[0]
@@ -4,7 +4,7 @@
 @author JacoryCyJin
 @date 2025/02/27
 """
-from sqlalchemy import create_engine, text
+from sqlalchemy import create_engine, text, bindparam
 from sqlalchemy.orm import sessionmaker
 from config import Config
 import logging
@@ -15,6 +15,14 @@ logger = logging.getLogger(__name__)
 class DatabaseHelper:
     """数据库操作助手"""
     
+    # 任务表 -> 状态字段（链接任务表一行有三个页面状态）
+    TASK_STATUS_FIELDS = {
+        'douban_crawl_task': ['status'],
+        'author_crawl_task': ['status'],
+        'zlibrary_download_task': ['status'],
+        'resource_link_crawl_task': ['info_page_status', 'download_page_status', 'review_page_status']
+    }
+    
     def __init__(self):
         self.engine = create_engine(
             Config.get_db_url(),
@@ -303,6 +311,188 @@ class DatabaseHelper:
         result = self.execute_query(query)
         return [(row[0], row[1], row[2]) for row in result.fetchall()]
     
+    # ==========================================
+    # 任务领取（多个进程/机器共用任务表）
+    # ==========================================
+    
+    def claim_tasks(self, table, columns, where, limit=1, status_field='status', exclude_ids=None):
+        """
+        原子领取任务：同一事务内 SELECT ... FOR UPDATE SKIP LOCKED 锁定行，
+        再写入处理中状态和租约（持有者 + 到期时间），其他进程会跳过已锁定或租约未到期的行；
+        重试等待时间（next_retry_at）未到的任务也不会被领取
+        
+        Args:
+            table: 任务表名
+            columns: 返回的字段列表（第一个必须是 id）
+            where: 可领取条件（不含租约条件）
+            limit: 领取数量
+            status_field: 领取后置为处理中的状态字段（None 表示只写入租约，由调用方逐个更新状态）
+            exclude_ids: 不领取的任务ID（本次运行已处理过的任务）
+        
+        Returns:
+            list: 领取到的行 [(columns...), ...]
+        """
+        conditions = [
+            f"({where})",
+            "(lease_expire_at IS NULL OR lease_expire_at < NOW())",
+            "(next_retry_at IS NULL OR next_retry_at <= NOW())"
+        ]
+        params = {'limit': limit}
+        if exclude_ids:
+            conditions.append("id NOT IN :exclude_ids")
+            params['exclude_ids'] = list(exclude_ids)
+        
+        select_query = text(f"""
+        SELECT {', '.join(columns)}
+        FROM {table}
+        WHERE {' AND '.join(conditions)}
+        ORDER BY id
+        LIMIT :limit
+        FOR UPDATE SKIP LOCKED
+        """)
+        if exclude_ids:
+            select_query = select_query.bindparams(bindparam('exclude_ids', expanding=True))
+        
+        assignments = ["lease_owner = :owner", "lease_expire_at = NOW() + INTERVAL :lease_seconds SECOND"]
+        if status_field:
+            assignments.insert(0, f"{status_field} = 1")
+        
+        update_query = text(f"""
+        UPDATE {table}
+        SET {', '.join(assignments)}
+        WHERE id IN :ids
+        """).bindparams(bindparam('ids', expanding=True))
+        
+        session = self.get_session()
+        try:
+            rows = session.execute(select_query, params).fetchall()
+            if rows:
+                session.execute(update_query, {
+                    'owner': Config.CRAWLER_ID,
+                    'lease_seconds': Config.TASK_LEASE_SECONDS,
+                    'ids': [row[0] for row in rows]
+                })
+            session.commit()
+            return rows
+        except Exception as e:
+            session.rollback()
+            logger.error(f"领取任务失败 ({table}): {e}")
+            raise
+        finally:
+            session.close()
+    
+    def release_task_lease(self, table, task_id):
+        """
+        释放本进程持有的任务租约（任务处理结束后其他进程可以立即领取）
+        
+        Args:
+            table: 任务表名
+            task_id: 任务ID
+        """
+        query = f"""
+        UPDATE {table}
+        SET lease_owner = NULL, lease_expire_at = NULL
+        WHERE id = :task_id AND lease_owner = :owner
+        """
+        self.execute_query(query, {'task_id': task_id, 'owner': Config.CRAWLER_ID})
+    
+    def renew_task_leases(self, table):
+        """
+        心跳：延长本进程持有的所有租约
+        
+        Args:
+            table: 任务表名
+        
+        Returns:
+            int: 续期的任务数
+        """
+        query = f"""
+        UPDATE {table}
+        SET lease_expire_at = NOW() + INTERVAL :lease_seconds SECOND
+        WHERE lease_owner = :owner
+        """
+        result = self.execute_query(query, {
+            'owner': Config.CRAWLER_ID,
+            'lease_seconds': Config.TASK_LEASE_SECONDS
+        })
+        return result.rowcount
+    
+    @staticmethod
+    def _retry_assignments(status_fields):
+        """
+        重新排队的 SET 子句：重试次数 +1，按失败次数指数退避，超过 MAX_RETRIES 标记为失败
+        
+        MySQL 按顺序执行 SET 赋值，next_retry_at 和状态要在 retry_count 自增之前计算
+        """
+        status_updates = [
+            f"{field} = IF({field} = 1, IF(retry_count + 1 >= :max_retries, 3, 0), {field})"
+            for field in status_fields
+        ]
+        return [
+            "next_retry_at = NOW() + INTERVAL LEAST(:backoff_seconds * POW(2, retry_count), :backoff_max_seconds) SECOND",
+            *status_updates,
+            "retry_count = retry_count + 1",
+            "error_msg = :error_msg",
+            "lease_owner = NULL",
+            "lease_expire_at = NULL"
+        ]
+    
+    @staticmethod
+    def _retry_params(error_msg):
+        return {
+            'max_retries': Config.MAX_RETRIES,
+            'backoff_seconds': Config.TASK_RETRY_BACKOFF_SECONDS,
+            'backoff_max_seconds': Config.TASK_RETRY_BACKOFF_MAX_SECONDS,
+            'error_msg': error_msg
+        }
+    
+    def reap_expired_tasks(self, table):
+        """
+        回收租约过期的任务：处理中（状态 1）但租约已过期或没有租约的任务（进程被 kill、OOM 等），
+        重置为待处理并按失败次数指数退避，重试超过 MAX_RETRIES 次标记为失败
+        
+        Args:
+            table: 任务表名
+        
+        Returns:
+            int: 回收的任务数
+        """
+        status_fields = self.TASK_STATUS_FIELDS[table]
+        processing = ' OR '.join(f"{field} = 1" for field in status_fields)
+        
+        query = f"""
+        UPDATE {table}
+        SET {', '.join(self._retry_assignments(status_fields))}
+        WHERE ({processing})
+        AND (lease_expire_at IS NULL OR lease_expire_at < NOW())
+        """
+        result = self.execute_query(query, self._retry_params("租约过期，任务已回收"))
+        return result.rowcount
+    
+    def defer_task(self, table, task_id, delay_seconds, error_msg):
+        """
+        任务延后处理（如触发反爬虫限流）：重置为待处理，delay_seconds 秒后才能再次领取
+        
+        限流不是任务本身失败，不增加 retry_count，不消耗 MAX_RETRIES 的失败次数
+        
+        Args:
+            table: 任务表名
+            task_id: 任务ID
+            delay_seconds: 延后秒数
+            error_msg: 错误信息
+        """
+        status_updates = [f"{field} = IF({field} = 1, 0, {field})" for field in self.TASK_STATUS_FIELDS[table]]
+        query = f"""
+        UPDATE {table}
+        SET next_retry_at = NOW() + INTERVAL :delay_seconds SECOND,
+            {', '.join(status_updates)},
+            error_msg = :error_msg,
+            lease_owner = NULL,
+            lease_expire_at = NULL
+        WHERE id = :task_id
+        """
+        self.execute_query(query, {'task_id': task_id, 'delay_seconds': delay_seconds, 'error_msg': error_msg})
+    
     # ==========================================
     # 豆瓣爬虫任务管理
     # ==========================================
@@ -368,6 +558,26 @@ class DatabaseHelper:
         result = self.execute_query(query)
         return [(row[0], row[1], row[2], row[3], row[4]) for row in result.fetchall()]
     
+    def claim_douban_tasks(self, limit=1, exclude_ids=None):
+        """
+        原子领取豆瓣任务（待处理的任务，包括未达到目标数量的任务）
+        
+        Args:
+            limit: 领取数量
+            exclude_ids: 不领取的任务ID
+        
+        Returns:
+            list: [(id, category_id, category_name, progress, target), ...]
+        """
+        rows = self.claim_tasks(
+            'douban_crawl_task',
+            ['id', 'category_id', 'category_name', 'progress', 'target'],
+            'status = 0',
+            limit=limit,
+            exclude_ids=exclude_ids
+        )
+        return [(row[0], row[1], row[2], row[3], row[4]) for row in rows]
+    
     def update_douban_task_status(self, task_id, status, progress=None, error_msg=None):
         """
         更新豆瓣任务状态
@@ -389,6 +599,11 @@ class DatabaseHelper:
             updates.append('error_msg = :error_msg')
             params['error_msg'] = error_msg
         
+        if status != 1:
+            # 任务不再处理中，释放租约
+            updates.append('lease_owner = NULL')
+            updates.append('lease_expire_at = NULL')
+        
         query = f"""
         UPDATE douban_crawl_task 
         SET {', '.join(updates)}
@@ -459,6 +674,26 @@ class DatabaseHelper:
         result = self.execute_query(query)
         return [(row[0], row[1], row[2], row[3]) for row in result.fetchall()]
     
+    def claim_author_tasks(self, limit=1, exclude_ids=None):
+        """
+        原子领取作者爬取任务
+        
+        Args:
+            limit: 领取数量
+            exclude_ids: 不领取的任务ID
+        
+        Returns:
+            list: [(id, author_id, author_name, douban_author_url), ...]
+        """
+        rows = self.claim_tasks(
+            'author_crawl_task',
+            ['id', 'author_id', 'author_name', 'douban_author_url'],
+            'status = 0',
+            limit=limit,
+            exclude_ids=exclude_ids
+        )
+        return [(row[0], row[1], row[2], row[3]) for row in rows]
+    
     def update_author_task_status(self, task_id, status, error_msg=None):
         """
         更新作者爬取任务状态
@@ -475,6 +710,11 @@ class DatabaseHelper:
             updates.append('error_msg = :error_msg')
             params['error_msg'] = error_msg
         
+        if status != 1:
+            # 任务不再处理中，释放租约
+            updates.append('lease_owner = NULL')
+            updates.append('lease_expire_at = NULL')
+        
         query = f"""
         UPDATE author_crawl_task 
         SET {', '.join(updates)}
@@ -646,6 +886,26 @@ class DatabaseHelper:
         result = self.execute_query(query)
         return [(row[0], row[1], row[2], row[3]) for row in result.fetchall()]
     
+    def claim_zlibrary_tasks(self, limit=1, exclude_ids=None):
+        """
+        原子领取 ZLibrary 下载任务
+        
+        Args:
+            limit: 领取数量
+            exclude_ids: 不领取的任务ID
+        
+        Returns:
+            list: [(id, resource_id, isbn, title), ...]
+        """
+        rows = self.claim_tasks(
+            'zlibrary_download_task',
+            ['id', 'resource_id', 'isbn', 'title'],
+            'status = 0',
+            limit=limit,
+            exclude_ids=exclude_ids
+        )
+        return [(row[0], row[1], row[2], row[3]) for row in rows]
+    
     def update_zlibrary_task_status(self, task_id, status, error_msg=None, 
                                    pdf_downloaded=None, epub_downloaded=None, mobi_downloaded=None):
         """
@@ -678,6 +938,11 @@ class DatabaseHelper:
             updates.append('mobi_downloaded = :mobi_downloaded')
             params['mobi_downloaded'] = mobi_downloaded
         
+        if status != 1:
+            # 任务不再处理中，释放租约
+            updates.append('lease_owner = NULL')
+            updates.append('lease_expire_at = NULL')
+        
         query = f"""
         UPDATE zlibrary_download_task 
         SET {', '.join(updates)}
@@ -15,6 +15,8 @@ logger = logging.getLogger(__name__)
 class LinkTaskHelper:
     """资源链接爬取任务辅助类"""
     
+    TABLE_NAME = 'resource_link_crawl_task'
+    
     # 任务状态常量
     STATUS_PENDING = 0      # 待处理
     STATUS_PROCESSING = 1   # 处理中
@@ -116,6 +118,128 @@ class LinkTaskHelper:
             logger.error(f"获取待处理任务失败: {e}")
             return []
     
+    @staticmethod
+    def claim_tasks(link_type: int, limit: int = 1, exclude_ids: Optional[List[int]] = None) -> List[Dict]:
+        """
+        原子领取待处理任务（按链接类型）
+        
+        领取后该页面状态置为处理中，并对整行写入租约：租约期间其他进程不会领取这本书的任何页面，
+        处理完成后需调用 release_task 释放
+        
+        Args:
+            link_type: 链接类型（1-书籍页 / 2-下载页 / 3-解读页）
+            limit: 领取数量
+            exclude_ids: 不领取的任务ID（本次运行已处理过的任务）
+        
+        Returns:
+            List[Dict]: 领取到的任务列表
+        """
+        status_field_map = {
+            1: 'info_page_status',
+            2: 'download_page_status',
+            3: 'review_page_status'
+        }
+        
+        status_field = status_field_map.get(link_type)
+        if not status_field:
+            logger.error(f"无效的链接类型: {link_type}")
+            return []
+        
+        try:
+            db = DatabaseHelper()
+            
+            rows = db.claim_tasks(
+                LinkTaskHelper.TABLE_NAME,
+                ['id', 'resource_id', 'isbn', 'title'],
+                f'{status_field} = 0',
+                limit=limit,
+                status_field=status_field,
+                exclude_ids=exclude_ids
+            )
+            
+            return [
+                {'id': row[0], 'resource_id': row[1], 'isbn': row[2], 'title': row[3]}
+                for row in rows
+            ]
+            
+        except Exception as e:
+            logger.error(f"领取任务失败: {e}")
+            return []
+    
+    @staticmethod
+    def claim_books(link_types: List[int], limit: int = 1) -> List[Dict]:
+        """
+        原子领取书籍（整行）：至少有一个指定页面待处理的任务
+        
+        一次领取同时返回各页面的状态，逐本书爬取时不需要再按资源查找其他页面的任务。
+        领取时只写入租约，各页面开始爬取时再分别置为处理中
+        
+        Args:
+            link_types: 链接类型列表（如 [1, 3] 表示书籍页 + 解读页）
+            limit: 领取数量
+        
+        Returns:
+            List[Dict]: 任务列表，page_status 为 {链接类型: 页面状态}
+        """
+        status_field_map = {
+            1: 'info_page_status',
+            2: 'download_page_status',
+            3: 'review_page_status'
+        }
+        
+        # 无效的类型直接忽略，SELECT 的状态列和返回的 page_status 使用同一组 (类型, 字段)
+        pages = [(link_type, status_field_map[link_type]) for link_type in link_types if link_type in status_field_map]
+        status_fields = [field for _, field in pages]
+        if not status_fields:
+            logger.error(f"无效的链接类型: {link_types}")
+            return []
+        
+        try:
+            db = DatabaseHelper()
+            
+            rows = db.claim_tasks(
+                LinkTaskHelper.TABLE_NAME,
+                ['id', 'resource_id', 'isbn', 'title'] + status_fields,
+                ' OR '.join(f'{field} = 0' for field in status_fields),
+                limit=limit,
+                status_field=None
+            )
+            
+            return [
+                {
+                    'id': row[0],
+                    'resource_id': row[1],
+                    'isbn': row[2],
+                    'title': row[3],
+                    'page_status': {link_type: status for (link_type, _), status in zip(pages, row[4:])}
+                }
+                for row in rows
+            ]
+            
+        except Exception as e:
+            logger.error(f"领取任务失败: {e}")
+            return []
+    
+    @staticmethod
+    def release_task(task_id: int) -> bool:
+        """
+        释放本进程持有的任务租约
+        
+        Args:
+            task_id: 任务ID
+        
+        Returns:
+            bool: 是否释放成功
+        """
+        try:
+            db = DatabaseHelper()
+            db.release_task_lease(LinkTaskHelper.TABLE_NAME, task_id)
+            return True
+            
+        except Exception as e:
+            logger.error(f"释放任务租约失败: {e}")
+            return False
+    
     @staticmethod
     def update_page_status(task_id: int, link_type: int, status: int, 
                           error_msg: Optional[str] = None) -> bool:
@@ -7,10 +7,10 @@ MinIO 文件上传工具类
 from minio import Minio
 from minio.error import S3Error
 from config import Config
-import requests
 import io
 import logging
 import uuid
+from .rate_limiter import RateLimitedSession
 
 logger = logging.getLogger(__name__)
 
@@ -25,6 +25,8 @@ class MinioHelper:
             secret_key=Config.MINIO_SECRET_KEY,
             secure=False
         )
+        # 下载图片也按站点限速（与爬虫共用令牌桶）
+        self.session = RateLimitedSession()
         self._ensure_buckets()
     
     def _ensure_buckets(self):
@@ -79,7 +81,7 @@ class MinioHelper:
             }
             
             # 下载图片
-            response = requests.get(
+            response = self.session.get(
                 image_url,
                 headers=headers,
                 timeout=10
@@ -0,0 +1,130 @@
+"""
+按站点限速工具类 - 令牌桶
+
+每个站点（按域名后缀匹配，如 douban.com 覆盖 book.douban.com / www.douban.com）一个令牌桶，
+所有请求发出前先取令牌：同一站点的请求间隔不低于配置的速率，不同站点互不影响。
+并发爬取时总吞吐量随站点数增加，而不是被一个全局的固定 sleep 限制
+
+@author JacoryCyJin
+@date 2025/02/27
+"""
+import threading
+import time
+from typing import Dict, Optional
+from urllib.parse import urlparse
+import requests
+from requests.adapters import HTTPAdapter
+from config import Config
+
+
+class TokenBucket:
+    """线程安全的令牌桶"""
+
+    def __init__(self, rate, burst=1):
+        """
+        Args:
+            rate: 每秒补充的令牌数（即每秒请求数）
+            burst: 桶容量（允许连续发出的请求数）
+        """
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self):
+        """
+        预订一个令牌
+
+        Returns:
+            需要等待的秒数（令牌可以预支为负数，等待的请求按预订顺序依次放行）
+        """
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+            self.updated_at = now
+            self.tokens -= 1
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def acquire(self):
+        """取一个令牌（不够时阻塞等待）"""
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+
+class HostRateLimiter:
+    """按站点限速"""
+
+    def __init__(self, host_rates: Optional[Dict[str, float]] = None, default_rate=None, burst=None):
+        """
+        Args:
+            host_rates: 域名后缀 -> 每秒请求数（默认使用配置 RATE_LIMIT_HOSTS）
+            default_rate: 未配置站点的每秒请求数（默认使用配置 RATE_LIMIT_DEFAULT，0 表示不限速）
+            burst: 令牌桶容量（默认使用配置 RATE_LIMIT_BURST）
+        """
+        self.host_rates = Config.get_rate_limits() if host_rates is None else host_rates
+        self.default_rate = Config.RATE_LIMIT_DEFAULT if default_rate is None else default_rate
+        self.burst = burst or Config.RATE_LIMIT_BURST
+        self.buckets: Dict[str, TokenBucket] = {}
+        self.lock = threading.Lock()
+
+    def _bucket_key(self, host):
+        """站点对应的令牌桶：匹配最长的已配置域名后缀，否则每个域名单独一个桶"""
+        matched = None
+        for suffix in self.host_rates:
+            if (host == suffix or host.endswith('.' + suffix)) and (matched is None or len(suffix) > len(matched)):
+                matched = suffix
+        return matched or host
+
+    def bucket_for(self, url) -> Optional[TokenBucket]:
+        """
+        URL 所属站点的令牌桶
+
+        Returns:
+            TokenBucket，不限速的站点返回 None
+        """
+        host = (urlparse(url).hostname or '').lower()
+        key = self._bucket_key(host)
+
+        with self.lock:
+            if key not in self.buckets:
+                rate = self.host_rates.get(key, self.default_rate)
+                self.buckets[key] = TokenBucket(rate, self.burst) if rate > 0 else None
+            return self.buckets[key]
+
+    def acquire(self, url):
+        """请求 url 之前调用，按所属站点的速率等待"""
+        bucket = self.bucket_for(url)
+        if bucket:
+            bucket.acquire()
+
+
+_default_limiter = None
+_default_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter() -> HostRateLimiter:
+    """进程内共享的限速器（所有爬虫共用同一组令牌桶）"""
+    global _default_limiter
+    with _default_limiter_lock:
+        if _default_limiter is None:
+            _default_limiter = HostRateLimiter()
+        return _default_limiter
+
+
+class RateLimitedSession(requests.Session):
+    """每个请求发出前按站点限速的 requests.Session"""
+
+    def __init__(self, rate_limiter: Optional[HostRateLimiter] = None):
+        super().__init__()
+        self.rate_limiter = rate_limiter or get_rate_limiter()
+
+        # 并发爬取时多个线程共用一个 Session，连接池大小与并发数一致
+        adapter = HTTPAdapter(pool_maxsize=max(Config.CRAWL_CONCURRENCY, 10))
+        self.mount('http://', adapter)
+        self.mount('https://', adapter)
+
+    def request(self, method, url, *args, **kwargs):
+        self.rate_limiter.acquire(url)
+        return super().request(method, url, *args, **kwargs)
@@ -0,0 +1,73 @@
+"""
+任务租约维护 - 心跳续期 + 过期任务回收
+
+领取任务时写入的租约只有 TASK_LEASE_SECONDS 有效期，运行期间后台线程定时：
+1. 续期本进程持有的所有租约（进程存活就不会过期）
+2. 回收其他进程遗留的过期任务（进程被 kill、OOM 时来不及重置状态），重置为待处理并指数退避
+
+@author JacoryCyJin
+@date 2025/02/27
+"""
+import logging
+import threading
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+
+class TaskLeaseKeeper:
+    """任务租约维护（后台线程）"""
+
+    def __init__(self, db, table, interval=None):
+        """
+        Args:
+            db: DatabaseHelper
+            table: 任务表名
+            interval: 心跳间隔（秒，默认使用配置 TASK_HEARTBEAT_SECONDS）
+        """
+        self.db = db
+        self.table = table
+        self.interval = interval or Config.TASK_HEARTBEAT_SECONDS
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    def start(self):
+        """先回收一次过期任务，再启动心跳线程"""
+        self.reap()
+        self.thread = threading.Thread(target=self._run, name=f'lease-{self.table}', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """停止心跳线程"""
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join()
+
+    def _run(self):
+        while not self.stop_event.wait(self.interval):
+            self.heartbeat()
+            self.reap()
+
+    def heartbeat(self):
+        """续期本进程持有的租约"""
+        try:
+            renewed = self.db.renew_task_leases(self.table)
+            logger.debug(f"租约续期 {self.table}: {renewed} 个任务")
+        except Exception as e:
+            logger.warning(f"租约续期失败 ({self.table}): {e}")
+
+    def reap(self):
+        """回收过期任务"""
+        try:
+            reaped = self.db.reap_expired_tasks(self.table)
+            if reaped:
+                logger.warning(f"已回收 {reaped} 个租约过期的任务 ({self.table})，重置为待处理并延迟重试")
+        except Exception as e:
+            logger.warning(f"回收过期任务失败 ({self.table}): {e}")
@@ -0,0 +1,292 @@
+"""
+推荐流水线基准测试 - 离线运行，不需要 MySQL
+
+生成幂律分布的合成行为数据写入 SQLite（代替 MySQL），按阶段测量
+评分聚合、矩阵构建、相似度计算、用户打分、结果写入的耗时、峰值内存和吞吐量，
+并可与上一次的结果对比，在夜间任务超时之前发现性能回退
+
+用法：
+    python benchmark.py --users 50000 --resources 20000 --events 1000000
+    python benchmark.py --output baseline.json
+    python benchmark.py --baseline baseline.json --tolerance 0.2   # 任一阶段比基线慢 20% 以上时退出码为 1
+
+@author JacoryCyJin
+@date 2025/04/11
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Dict
+import numpy as np
+import pandas as pd
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import Engine
+from config import RecommendConfig
+from item_cf import ItemCFRecommender
+from metrics import peak_rss_mb
+from result_writer import RecommendResultWriter
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# 与生产表结构对应的最小 SQLite 表结构（只包含推荐系统读写的字段）
+SQLITE_SCHEMA = [
+    """CREATE TABLE user_browse_history (
+        id INTEGER PRIMARY KEY, user_id TEXT, resource_id TEXT, view_count INTEGER,
+        ctime DATETIME, mtime DATETIME, UNIQUE (user_id, resource_id))""",
+    """CREATE TABLE user_favorite (
+        id INTEGER PRIMARY KEY, user_id TEXT, resource_id TEXT, ctime DATETIME,
+        UNIQUE (user_id, resource_id))""",
+    """CREATE TABLE comment (
+        id INTEGER PRIMARY KEY, user_id TEXT, resource_id TEXT, score REAL,
+        audit_status INTEGER, deleted INTEGER, ctime DATETIME, mtime DATETIME)""",
+    """CREATE TABLE recommend_result (
+        id INTEGER PRIMARY KEY, user_id TEXT, resource_id TEXT, score REAL, reason TEXT, ctime DATETIME)""",
+    "CREATE INDEX idx_recommend_user ON recommend_result (user_id)",
+]
+
+# 行为类型占比：浏览 / 收藏 / 评分
+EVENT_MIX = (0.7, 0.15, 0.15)
+
+
+def generate_synthetic_data(engine: Engine, n_users: int, n_resources: int, n_events: int,
+                            user_exponent: float = 1.1, resource_exponent: float = 1.0,
+                            seed: int = 42) -> Dict[str, int]:
+    """
+    生成幂律分布的合成行为数据（少数活跃用户、少数热门资源贡献大部分行为）
+
+    Args:
+        engine: SQLite 引擎（会重建表）
+        n_users: 用户数
+        n_resources: 资源数
+        n_events: 行为事件数（重复的浏览会合并为 view_count）
+        user_exponent: 用户活跃度的幂律指数（第 k 活跃的用户概率 ∝ 1 / k^exponent）
+        resource_exponent: 资源热度的幂律指数
+        seed: 随机种子
+
+    Returns:
+        各表写入的行数
+    """
+    rng = np.random.default_rng(seed)
+
+    def power_law(n: int, exponent: float, size: int) -> np.ndarray:
+        weights = 1.0 / np.power(np.arange(1, n + 1, dtype=np.float64), exponent)
+        # 打乱排名与编号的对应关系，避免热门资源都集中在 ID 靠前的位置
+        return rng.permutation(n)[rng.choice(n, size=size, p=weights / weights.sum())]
+
+    users = power_law(n_users, user_exponent, n_events)
+    resources = power_law(n_resources, resource_exponent, n_events)
+    kinds = rng.choice(3, size=n_events, p=EVENT_MIX)
+    now = datetime.now().replace(microsecond=0)
+    ctimes = pd.to_datetime(now - timedelta(days=90)) + \
+        pd.to_timedelta(rng.integers(0, 90 * 86400, n_events), unit='s')
+
+    events = pd.DataFrame({
+        'user_id': pd.Series(users).map('u{:031d}'.format),
+        'resource_id': pd.Series(resources).map('r{:031d}'.format),
+        'kind': kinds,
+        'ctime': ctimes
+    })
+
+    browse = events[events['kind'] == 0].groupby(['user_id', 'resource_id'], as_index=False) \
+        .agg(view_count=('ctime', 'size'), ctime=('ctime', 'min'), mtime=('ctime', 'max'))
+    favorite = events[events['kind'] == 1].drop_duplicates(['user_id', 'resource_id'])[['user_id', 'resource_id', 'ctime']]
+    comment = events[events['kind'] == 2].drop_duplicates(['user_id', 'resource_id'])[['user_id', 'resource_id', 'ctime']]
+    comment = comment.assign(
+        score=rng.integers(1, 11, len(comment)).astype(np.float64),
+        audit_status=1,
+        deleted=0,
+        mtime=comment['ctime']
+    )
+
+    with engine.begin() as conn:
+        for table in ('user_browse_history', 'user_favorite', 'comment', 'recommend_result'):
+            conn.execute(text(f"DROP TABLE IF EXISTS {table}"))
+        for statement in SQLITE_SCHEMA:
+            conn.execute(text(statement))
+
+    browse.to_sql('user_browse_history', engine, if_exists='append', index=False, chunksize=50000)
+    favorite.to_sql('user_favorite', engine, if_exists='append', index=False, chunksize=50000)
+    comment.to_sql('comment', engine, if_exists='append', index=False, chunksize=50000)
+
+    return {'user_browse_history': len(browse), 'user_favorite': len(favorite), 'comment': len(comment)}
+
+
+class PipelineBenchmark:
+    """推荐流水线分阶段基准测试"""
+
+    def __init__(self, engine: Engine):
+        """
+        Args:
+            engine: 已写入行为数据的数据库引擎
+        """
+        self.engine = engine
+        self.stages = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        """记录一个阶段的耗时和结束时的峰值内存"""
+        started = time.perf_counter()
+        yield self.stages.setdefault(name, {})
+        self.stages[name]['seconds'] = time.perf_counter() - started
+        self.stages[name]['peak_rss_mb'] = peak_rss_mb()
+        logger.info(f"[{name}] {self.stages[name]['seconds']:.3f} 秒")
+
+    def run(self) -> Dict:
+        """依次执行各阶段，返回测量结果"""
+        started = time.perf_counter()
+        recommender = ItemCFRecommender(engine=self.engine)
+        recommender.cache = None  # 基准测试只测数据库写入路径
+
+        with self.stage('aggregate'):
+            rating_df = recommender.aggregator.aggregate_ratings()
+
+        with self.stage('matrix') as stage:
+            recommender.rating_matrix, recommender.users, recommender.resources = \
+                recommender.aggregator.build_sparse_matrix(rating_df)
+            stage['nnz'] = int(recommender.rating_matrix.nnz)
+        del rating_df
+
+        with self.stage('similarity') as stage:
+            recommender.calculate_similarity()
+            stage['neighbor_edges'] = int(recommender.neighbor_index.nnz)
+
+        n_users = len(recommender.users)
+        block_size = recommender.config.SCORING_BLOCK_SIZE
+        results = {}
+        with self.stage('scoring') as stage:
+            for start in range(0, n_users, block_size):
+                results.update(recommender.recommend_for_users(recommender.users[start:start + block_size]))
+        stage['users_per_second'] = n_users / stage['seconds'] if stage['seconds'] > 0 else 0.0
+
+        with self.stage('write') as stage:
+            with RecommendResultWriter(self.engine) as writer:
+                for user_id, recommendations in results.items():
+                    writer.add(user_id, recommendations)
+            stage['rows'] = writer.written_rows
+        stage['users_per_second'] = writer.written_users / stage['seconds'] if stage['seconds'] > 0 else 0.0
+
+        wall_seconds = time.perf_counter() - started
+        return {
+            'users': n_users,
+            'resources': len(recommender.resources),
+            'wall_seconds': wall_seconds,
+            'peak_rss_mb': peak_rss_mb(),
+            'users_per_second': n_users / wall_seconds,
+            'stages': self.stages
+        }
+
+
+def compare_with_baseline(report: Dict, baseline: Dict, tolerance: float) -> bool:
+    """
+    与基线结果对比各阶段耗时
+
+    Args:
+        report: 本次结果
+        baseline: 基线结果（同样参数下之前的输出）
+        tolerance: 允许变慢的比例（0.2 表示 20%）
+
+    Returns:
+        是否没有超过容忍度的回退
+    """
+    passed = True
+    for name, stage in report['stages'].items():
+        base = baseline.get('stages', {}).get(name)
+        if not base or base['seconds'] <= 0:
+            continue
+
+        ratio = stage['seconds'] / base['seconds']
+        flag = '回退' if ratio > 1 + tolerance else 'ok'
+        logger.info(f"  {name:<12} {base['seconds']:>9.3f}s -> {stage['seconds']:>9.3f}s ({ratio:>5.2f}x) {flag}")
+        if ratio > 1 + tolerance:
+            passed = False
+
+    return passed
+
+
+def print_report(report: Dict):
+    """输出测量结果"""
+    logger.info("=" * 60)
+    logger.info(f"用户数: {report['users']} | 资源数: {report['resources']}")
+    logger.info(f"{'阶段':<12} {'耗时(秒)':>10} {'峰值内存(MB)':>14} {'用户/秒':>12}")
+    for name, stage in report['stages'].items():
+        throughput = f"{stage['users_per_second']:.0f}" if 'users_per_second' in stage else '-'
+        logger.info(f"{name:<12} {stage['seconds']:>10.3f} {stage['peak_rss_mb']:>14.1f} {throughput:>12}")
+    logger.info(f"总耗时: {report['wall_seconds']:.3f} 秒 | 峰值内存: {report['peak_rss_mb']:.1f} MB | "
+                f"整体吞吐: {report['users_per_second']:.0f} 用户/秒")
+    logger.info("=" * 60)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Smart Library 推荐流水线基准测试（SQLite 合成数据）')
+    parser.add_argument('--users', type=int, default=20000, help='合成用户数')
+    parser.add_argument('--resources', type=int, default=5000, help='合成资源数')
+    parser.add_argument('--events', type=int, default=500000, help='合成行为事件数')
+    parser.add_argument('--seed', type=int, default=42, help='随机种子')
+    parser.add_argument('--db-path', type=str, default=None,
+                        help='SQLite 文件路径（默认使用临时文件，结束后删除）')
+    parser.add_argument('--reuse', action='store_true', help='--db-path 已存在时直接复用其中的数据，不重新生成')
+    parser.add_argument('--output', type=str, default=None, help='把结果写入 JSON 文件（可作为之后的基线）')
+    parser.add_argument('--baseline', type=str, default=None, help='与基线 JSON 对比各阶段耗时')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='允许比基线变慢的比例（默认 0.2）')
+
+    args = parser.parse_args()
+
+    temp_dir = None
+    db_path = args.db_path
+    if db_path is None:
+        temp_dir = tempfile.TemporaryDirectory(prefix='recommend_bench_')
+        db_path = os.path.join(temp_dir.name, 'bench.sqlite')
+
+    engine = create_engine(f"sqlite:///{db_path}")
+
+    try:
+        if args.reuse and args.db_path and os.path.exists(args.db_path):
+            logger.info(f"复用已有数据: {db_path}")
+        else:
+            logger.info(f"生成合成数据: {args.users} 用户, {args.resources} 资源, {args.events} 事件...")
+            started = time.perf_counter()
+            counts = generate_synthetic_data(engine, args.users, args.resources, args.events, seed=args.seed)
+            logger.info(f"合成数据生成完成 ({time.perf_counter() - started:.1f} 秒): {counts}")
+
+        report = PipelineBenchmark(engine).run()
+        report['params'] = {
+            'users': args.users,
+            'resources': args.resources,
+            'events': args.events,
+            'seed': args.seed,
+            'similarity_engine': RecommendConfig.SIMILARITY_ENGINE
+        }
+        print_report(report)
+
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+            logger.info(f"结果已写入 {args.output}")
+
+        if args.baseline:
+            with open(args.baseline, encoding='utf-8') as f:
+                baseline = json.load(f)
+            if baseline.get('params') != report['params']:
+                logger.warning(f"基线参数与本次不同，对比结果仅供参考: {baseline.get('params')}")
+            logger.info(f"与基线对比（容忍 {args.tolerance:.0%}）:")
+            if not compare_with_baseline(report, baseline, args.tolerance):
+                logger.error("存在超过容忍度的性能回退！")
+                sys.exit(1)
+    finally:
+        engine.dispose()
+        if temp_dir:
+            temp_dir.cleanup()
+
+
+if __name__ == '__main__':
+    main()
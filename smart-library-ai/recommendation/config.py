@@ -26,22 +26,70 @@ class RecommendConfig:
     SIMILARITY_THRESHOLD = float(os.getenv('SIMILARITY_THRESHOLD', 0.1))  # 相似度阈值
     TOP_N_SIMILAR = int(os.getenv('TOP_N_SIMILAR', 20))  # 计算相似度时考虑的Top-N物品
     TOP_N_RECOMMEND = int(os.getenv('TOP_N_RECOMMEND', 10))  # 推荐结果数量
+    SESSION_DECAY = float(os.getenv('SESSION_DECAY', 0.8))  # 会话推荐中每往前一个浏览记录的权重衰减
+    SESSION_MAX_ITEMS = int(os.getenv('SESSION_MAX_ITEMS', 20))  # 会话推荐最多使用的最近浏览记录数
+    SIMILARITY_BLOCK_SIZE = int(os.getenv('SIMILARITY_BLOCK_SIZE', 1024))  # 分块计算相似度时每块的物品数
+    SIMILARITY_ENGINE = os.getenv('SIMILARITY_ENGINE', 'exact')  # 近邻计算方式: exact-精确余弦 / lsh-随机投影近似
+    ANN_TABLES = int(os.getenv('ANN_TABLES', 16))  # LSH 哈希表数量
+    ANN_BITS = int(os.getenv('ANN_BITS', 16))  # LSH 每张表签名位数
+    ANN_WINDOW = int(os.getenv('ANN_WINDOW', 32))  # LSH 按签名排序后比较的相邻物品数
+    ANN_REFINE_ITERATIONS = int(os.getenv('ANN_REFINE_ITERATIONS', 2))  # 近邻图细化轮数（近邻的近邻作为候选）
+    ANN_SEED = int(os.getenv('ANN_SEED', 42))  # LSH 随机超平面种子
+    FALLBACK_ENABLED = os.getenv('FALLBACK_ENABLED', 'true').lower() == 'true'  # 协同过滤没有结果时使用热门/分类热门兜底
+    FALLBACK_POOL_SIZE = int(os.getenv('FALLBACK_POOL_SIZE', 100))  # 全局/每个分类保留的热门资源数
+    FALLBACK_MAX_CATEGORIES = int(os.getenv('FALLBACK_MAX_CATEGORIES', 3))  # 兜底时参考用户最常交互的分类数
+    SCORING_BLOCK_SIZE = int(os.getenv('SCORING_BLOCK_SIZE', 4096))  # 整块打分时每块的用户数（越大越快，内存越高）
+    WORKER_SHARD_SIZE = int(os.getenv('WORKER_SHARD_SIZE', 1000))  # 多进程生成时每个分片的用户数
+    
+    # 推荐结果写入配置
+    WRITE_BATCH_SIZE = int(os.getenv('WRITE_BATCH_SIZE', 5000))  # 批量写入 recommend_result 的行数
+    WRITE_STAGING_SWAP = os.getenv('WRITE_STAGING_SWAP', 'true').lower() == 'true'  # 全量生成时写影子表后原子替换
     
     # 行为权重配置
     WEIGHT_BROWSE = float(os.getenv('WEIGHT_BROWSE', 1.0))  # 浏览权重
     WEIGHT_FAVORITE = float(os.getenv('WEIGHT_FAVORITE', 3.0))  # 收藏权重
     WEIGHT_COMMENT = float(os.getenv('WEIGHT_COMMENT', 5.0))  # 评分权重
     
+    # 行为时间衰减（半衰期，天）：N 天前的行为权重减半，0 表示不衰减
+    DECAY_HALF_LIFE_DAYS = float(os.getenv('DECAY_HALF_LIFE_DAYS', 0))
+    
     # 评分归一化参数
     MAX_BROWSE_COUNT = int(os.getenv('MAX_BROWSE_COUNT', 10))  # 浏览次数上限
     COMMENT_SCORE_SCALE = float(os.getenv('COMMENT_SCORE_SCALE', 10.0))  # 评分满分（0-10）
+    BROWSE_NORMALIZER = os.getenv('BROWSE_NORMALIZER', 'log')  # 浏览次数归一化曲线（见 normalizers.py）
+    COMMENT_NORMALIZER = os.getenv('COMMENT_NORMALIZER', 'linear')  # 评分归一化曲线
+    
+    # 数据读取配置
+    STREAMING_INGEST = os.getenv('STREAMING_INGEST', 'false').lower() == 'true'  # 是否分块流式读取行为表
+    INGEST_CHUNK_SIZE = int(os.getenv('INGEST_CHUNK_SIZE', 100000))  # 流式读取时每块行数
+    
+    # 模型文件目录（build-model 输出，generate/test 可通过 --model 直接加载）
+    MODEL_PATH = os.getenv('MODEL_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'model'))
+    
+    # 在线推荐服务（recommend.py serve）
+    SERVICE_HOST = os.getenv('SERVICE_HOST', '0.0.0.0')
+    SERVICE_PORT = int(os.getenv('SERVICE_PORT', 8090))
+    MODEL_RELOAD_INTERVAL = int(os.getenv('MODEL_RELOAD_INTERVAL', 60))  # 检查模型目录是否更新的间隔（秒），0 表示不自动重新加载
+    
+    # 增量状态目录（模型 + 共现矩阵 + 水位线，incremental 使用）
+    INCREMENTAL_STATE_PATH = os.getenv('INCREMENTAL_STATE_PATH', MODEL_PATH)
+    
+    # 运行指标输出（generate / incremental / build-model 结束后写入，留空表示不写）
+    METRICS_REPORT_PATH = os.getenv('METRICS_REPORT_PATH', '')  # JSON 报告文件
+    METRICS_TEXTFILE_PATH = os.getenv('METRICS_TEXTFILE_PATH', '')  # Prometheus textfile（.prom，放在 node_exporter 的 textfile 目录）
     
-    # Redis 缓存配置
+    # Redis 缓存配置（生成推荐时写入每个用户的 Top-N，后端优先从缓存读取）
+    CACHE_ENABLED = os.getenv('CACHE_ENABLED', 'true').lower() == 'true'
+    CACHE_KEY_PREFIX = os.getenv('CACHE_KEY_PREFIX', 'recommend:user:')  # 有序集合 key 前缀，需与后端一致
     REDIS_HOST = os.getenv('REDIS_HOST', '127.0.0.1')
     REDIS_PORT = int(os.getenv('REDIS_PORT', 6379))
     REDIS_DB = int(os.getenv('REDIS_DB', 1))  # 使用 DB1 避免与后端冲突
     REDIS_PASSWORD = os.getenv('REDIS_PASSWORD', None)
     CACHE_EXPIRE_SECONDS = int(os.getenv('CACHE_EXPIRE_SECONDS', 86400))  # 缓存过期时间（24小时）
+    CACHE_SOCKET_TIMEOUT = float(os.getenv('CACHE_SOCKET_TIMEOUT', 5.0))  # Redis 读写超时（秒）
+    CACHE_RETRY_SECONDS = float(os.getenv('CACHE_RETRY_SECONDS', 30))  # 写入失败后再次尝试的间隔（秒）
+    # 写入失败、缓存可能过期的用户（Redis 恢复后删除其 key；跨运行保留，留空表示只记在内存）
+    CACHE_STALE_FILE = os.getenv('CACHE_STALE_FILE', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache_stale_users.txt'))
     
     @classmethod
     def get_db_url(cls):
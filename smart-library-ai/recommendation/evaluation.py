@@ -0,0 +1,367 @@
+"""
+推荐离线评估 - 按时间切分训练/测试集，对比不同配置（变体）的推荐质量和耗时
+
+把聚合后的 (用户, 资源) 评分按最近一次行为时间切分：截止时间之前的作为训练集，
+之后的作为测试集（用户之后真正交互的资源）。每个变体在训练集上重新构建近邻索引，
+为测试用户整块打分，统计：
+- precision@K / recall@K：推荐列表命中测试资源的比例
+- NDCG@K：考虑命中位置的排序质量（二值相关性）
+- 覆盖率：被推荐过的资源占训练集资源的比例
+- 近邻计算、打分的耗时和峰值内存
+
+测试集只保留训练集中出现过的资源和用户（协同过滤无法推荐新资源，也无法为新用户打分），
+各变体使用同一份切分，只是配置不同。每个变体在单独的进程中运行，配置互不影响，
+LSH 近似近邻、Top-K 裁剪、时间衰减等加速手段可以先在这里用数据确认对质量的影响
+
+用法：
+    python evaluation.py                                # 默认变体：当前配置 / LSH / Top-K=10 / 衰减 30 天
+    python evaluation.py --variant lsh8:SIMILARITY_ENGINE=lsh,ANN_TABLES=8 --variant k50:TOP_N_SIMILAR=50
+    python evaluation.py --holdout-days 14 --k 20 --workers 4 --output eval.json
+    python evaluation.py --db-path bench.sqlite         # 使用 benchmark.py --db-path 生成的 SQLite 数据
+
+@author JacoryCyJin
+@date 2025/04/11
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+from scipy.sparse import csr_matrix, load_npz, save_npz
+from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine
+from config import RecommendConfig
+from id_encoder import IdEncoder
+from item_cf import ItemCFRecommender
+from metrics import peak_rss_mb
+from rating_aggregator import RatingAggregator
+from sparse_ops import csr_row_ids
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# 未指定 --variant 时对比的变体（名称 -> 配置覆盖）
+DEFAULT_VARIANTS = {
+    'baseline': {},
+    'lsh': {'SIMILARITY_ENGINE': 'lsh'},
+    'top_k_10': {'TOP_N_SIMILAR': 10},
+    'decay_30d': {'DECAY_HALF_LIFE_DAYS': 30.0},
+}
+
+
+def parse_variant(spec: str) -> Tuple[str, Dict]:
+    """
+    解析变体描述 名称:配置项=值,配置项=值
+
+    值按 RecommendConfig 中该配置项原有的类型转换
+    """
+    name, _, assignments = spec.partition(':')
+    overrides = {}
+    for assignment in filter(None, assignments.split(',')):
+        key, sep, value = assignment.partition('=')
+        key, value = key.strip(), value.strip()
+        if not sep or not key.isupper() or not hasattr(RecommendConfig, key):
+            raise ValueError(f"无效的变体配置: {assignment}（格式为 配置项=值，配置项需在 RecommendConfig 中存在）")
+
+        current = getattr(RecommendConfig, key)
+        if isinstance(current, bool):
+            overrides[key] = value.lower() == 'true'
+        else:
+            overrides[key] = type(current)(value)
+
+    if not name.strip():
+        raise ValueError(f"变体缺少名称: {spec}")
+    return name.strip(), overrides
+
+
+class HoldoutSplit:
+    """按最近一次行为时间切分的训练/测试集"""
+
+    def __init__(self, engine: Engine, holdout_ratio: float = 0.2, holdout_days: Optional[float] = None,
+                 cutoff: Optional[str] = None):
+        """
+        Args:
+            engine: 数据库引擎
+            holdout_ratio: 最近的多少比例 (用户, 资源) 作为测试集（未指定 holdout_days / cutoff 时使用）
+            holdout_days: 最近多少天的 (用户, 资源) 作为测试集
+            cutoff: 直接指定截止时间（如 2025-04-01）
+        """
+        self.engine = engine
+        self.holdout_ratio = holdout_ratio
+        self.holdout_days = holdout_days
+        self.cutoff = pd.Timestamp(cutoff) if cutoff else None
+
+        self.users = None  # 用户ID 编码器（训练集与测试集共用）
+        self.resources = None  # 资源ID 编码器
+        self.train = {}  # 衰减半衰期 -> 训练评分矩阵
+        self.test = None  # 测试集 用户 × 资源 0/1 矩阵
+        self.summary = {}
+
+    def build(self, half_lives: List[float]):
+        """
+        聚合评分并切分，每个不同的衰减半衰期各聚合一份训练集（测试集相同）
+
+        Args:
+            half_lives: 各变体使用的衰减半衰期
+        """
+        for half_life in sorted(set(half_lives)):
+            aggregator = RatingAggregator(engine=self.engine, half_life_days=half_life, keep_event_time=True)
+            rating_df = aggregator.aggregate_ratings()
+            if rating_df.empty:
+                raise ValueError("没有任何评分数据，无法评估")
+
+            if self.users is None:
+                self.users, user_codes = IdEncoder.fit(rating_df['user_id'])
+                self.resources, resource_codes = IdEncoder.fit(rating_df['resource_id'])
+                if self.cutoff is None:
+                    self.cutoff = self._resolve_cutoff(rating_df['event_time'])
+            else:
+                user_codes = self.users.encode(rating_df['user_id'])
+                resource_codes = self.resources.encode(rating_df['resource_id'])
+
+            # 没有行为时间的记录视为很早以前的行为，放入训练集
+            is_test = (rating_df['event_time'] >= self.cutoff).to_numpy()
+            shape = (len(self.users), len(self.resources))
+            train = csr_matrix(
+                (rating_df['rating'].to_numpy(dtype=np.float64)[~is_test],
+                 (user_codes[~is_test], resource_codes[~is_test])),
+                shape=shape
+            )
+            train.eliminate_zeros()
+            self.train[half_life] = train
+
+            if self.test is None:
+                self.test = self._build_test(train, user_codes[is_test], resource_codes[is_test])
+
+        train = next(iter(self.train.values()))
+        self.summary = {
+            'cutoff': str(self.cutoff),
+            'users': len(self.users),
+            'resources': len(self.resources),
+            'train_ratings': int(train.nnz),
+            'test_users': int((np.diff(self.test.indptr) > 0).sum()),
+            'test_ratings': int(self.test.nnz)
+        }
+        logger.info(f"切分完成: 截止时间 {self.cutoff} | 训练评分 {train.nnz} | "
+                    f"测试用户 {self.summary['test_users']} | 测试评分 {self.test.nnz}")
+
+    def _resolve_cutoff(self, event_time: pd.Series) -> pd.Timestamp:
+        """确定截止时间"""
+        if self.holdout_days:
+            return event_time.max() - pd.Timedelta(days=self.holdout_days)
+        return event_time.quantile(1 - self.holdout_ratio)
+
+    @staticmethod
+    def _build_test(train: csr_matrix, user_codes: np.ndarray, resource_codes: np.ndarray) -> csr_matrix:
+        """测试集只保留训练集中有评分的用户和资源"""
+        known_users = np.diff(train.indptr) > 0
+        known_resources = np.bincount(train.indices, minlength=train.shape[1]) > 0
+        keep = known_users[user_codes] & known_resources[resource_codes]
+
+        test = csr_matrix(
+            (np.ones(int(keep.sum())), (user_codes[keep], resource_codes[keep])),
+            shape=train.shape
+        )
+        test.sum_duplicates()
+        test.data[:] = 1.0
+        return test
+
+    def save(self, path: str):
+        """保存到目录（供评估进程加载）"""
+        os.makedirs(path, exist_ok=True)
+        self.users.save(path, 'user')
+        self.resources.save(path, 'resource')
+        save_npz(os.path.join(path, 'test.npz'), self.test)
+        for half_life, train in self.train.items():
+            save_npz(os.path.join(path, train_file(half_life)), train)
+
+
+def train_file(half_life: float) -> str:
+    """某个衰减半衰期的训练集文件名"""
+    return f"train_{float(half_life):g}.npz"
+
+
+def evaluate_recommender(recommender: ItemCFRecommender, test: csr_matrix, k: int) -> Dict:
+    """
+    为测试集中的用户整块打分，计算 precision@K、recall@K、NDCG@K 和覆盖率
+
+    Args:
+        recommender: 已构建近邻索引的推荐器（评分矩阵为训练集）
+        test: 测试集 用户 × 资源 0/1 矩阵（行列与评分矩阵一致）
+        k: 推荐列表长度
+
+    Returns:
+        各项指标（对测试用户取平均）
+    """
+    test_users = np.flatnonzero(np.diff(test.indptr))
+    n_items = test.shape[1]
+    block_size = recommender.config.SCORING_BLOCK_SIZE
+
+    # discounts[r] 为第 r 位（从 0 开始）的折扣；ideal[m] 为 m 个相关资源时 K 位内的最大 DCG
+    discounts = 1.0 / np.log2(np.arange(k) + 2)
+    ideal = np.concatenate([[0.0], np.cumsum(discounts)])
+
+    totals = {'precision': 0.0, 'recall': 0.0, 'ndcg': 0.0, 'hits': 0, 'users_with_recs': 0}
+    recommended = np.zeros(n_items, dtype=bool)
+
+    for start in range(0, len(test_users), block_size):
+        rows = test_users[start:start + block_size]
+        with recommender.metrics.span('score', rows=len(rows)):
+            indptr, cols, _ = recommender._top_n_rows(recommender.rating_matrix[rows], k)
+        recommended[cols] = True
+
+        # 推荐的 (行, 列) 是否出现在测试集中，以及在推荐列表中的名次
+        test_block = test[rows]
+        rec_rows = np.repeat(np.arange(len(rows), dtype=np.int64), np.diff(indptr))
+        hits = np.isin(rec_rows * n_items + cols, csr_row_ids(test_block) * n_items + test_block.indices)
+        ranks = np.arange(len(cols)) - indptr[rec_rows]
+
+        n_hits = np.bincount(rec_rows, weights=hits, minlength=len(rows))
+        dcg = np.bincount(rec_rows, weights=hits * discounts[ranks], minlength=len(rows))
+        n_relevant = np.diff(test_block.indptr)
+
+        totals['precision'] += (n_hits / k).sum()
+        totals['recall'] += (n_hits / n_relevant).sum()
+        totals['ndcg'] += (dcg / ideal[np.minimum(n_relevant, k)]).sum()
+        totals['hits'] += int(n_hits.sum())
+        totals['users_with_recs'] += int((np.diff(indptr) > 0).sum())
+
+    n_users = max(len(test_users), 1)
+    catalog = np.diff(recommender.rating_matrix.tocsc().indptr) > 0
+    return {
+        'precision': float(totals['precision'] / n_users),
+        'recall': float(totals['recall'] / n_users),
+        'ndcg': float(totals['ndcg'] / n_users),
+        'coverage': float(recommended[catalog].sum() / max(catalog.sum(), 1)),
+        'hits': totals['hits'],
+        'users': len(test_users),
+        'users_with_recs': totals['users_with_recs']
+    }
+
+
+def _evaluate_variant(task: Tuple[str, Dict, str, int]) -> Dict:
+    """
+    在评估进程中运行一个变体（每个进程只运行一个变体，配置覆盖不会影响其他变体）
+
+    Args:
+        task: (变体名, 配置覆盖, 切分数据目录, K)
+    """
+    name, overrides, data_dir, k = task
+    for key, value in overrides.items():
+        setattr(RecommendConfig, key, value)
+    RecommendConfig.CACHE_ENABLED = False
+
+    started = time.perf_counter()
+    # 评估只使用切分好的矩阵，不访问数据库
+    recommender = ItemCFRecommender(engine=create_engine('sqlite://'))
+    recommender.users = IdEncoder.load(data_dir, 'user')
+    recommender.resources = IdEncoder.load(data_dir, 'resource')
+    recommender.rating_matrix = load_npz(os.path.join(data_dir, train_file(RecommendConfig.DECAY_HALF_LIFE_DAYS))).tocsr()
+    test = load_npz(os.path.join(data_dir, 'test.npz')).tocsr()
+
+    recommender.calculate_similarity()
+    result = evaluate_recommender(recommender, test, k)
+
+    result.update({
+        'variant': name,
+        'overrides': overrides,
+        'neighbor_edges': int(recommender.neighbor_index.nnz),
+        'stages': {stage: {'seconds': value['seconds'], 'peak_rss_mb': value['peak_rss_mb']}
+                   for stage, value in recommender.metrics.stages.items()},
+        'wall_seconds': time.perf_counter() - started,
+        'peak_rss_mb': peak_rss_mb()
+    })
+    return result
+
+
+def run_variants(data_dir: str, variants: Dict[str, Dict], k: int, workers: int) -> List[Dict]:
+    """
+    多进程并行评估各变体
+
+    Returns:
+        与 variants 顺序一致的结果列表
+    """
+    tasks = [(name, overrides, data_dir, k) for name, overrides in variants.items()]
+    workers = max(1, min(workers, len(tasks)))
+    logger.info(f"启动 {workers} 个进程评估 {len(tasks)} 个变体...")
+
+    context = multiprocessing.get_context('spawn')
+    results = []
+    # maxtasksperchild=1：每个变体使用新进程，峰值内存和配置都互不影响
+    with context.Pool(workers, maxtasksperchild=1) as pool:
+        for result in pool.imap(_evaluate_variant, tasks):
+            logger.info(f"[{result['variant']}] 完成 ({result['wall_seconds']:.2f} 秒)")
+            results.append(result)
+    return results
+
+
+def print_report(results: List[Dict], k: int):
+    """输出各变体的指标，质量指标同时给出相对第一个变体的变化"""
+    base = results[0]
+    logger.info("=" * 100)
+    logger.info(f"{'变体':<14} {f'P@{k}':>8} {f'R@{k}':>8} {f'NDCG@{k}':>9} {'覆盖率':>8} "
+                f"{'近邻(秒)':>10} {'打分(秒)':>10} {'峰值内存(MB)':>14} {'NDCG 变化':>10}")
+    for result in results:
+        similarity = result['stages'].get('similarity', {}).get('seconds', 0.0)
+        score = result['stages'].get('score', {}).get('seconds', 0.0)
+        change = (result['ndcg'] / base['ndcg'] - 1) if base['ndcg'] > 0 else 0.0
+        logger.info(f"{result['variant']:<14} {result['precision']:>8.4f} {result['recall']:>8.4f} "
+                    f"{result['ndcg']:>9.4f} {result['coverage']:>8.2%} {similarity:>10.3f} {score:>10.3f} "
+                    f"{result['peak_rss_mb']:>14.1f} {change:>+10.1%}")
+    logger.info("=" * 100)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Smart Library 推荐离线评估（时间切分）')
+    parser.add_argument('--variant', action='append', default=None,
+                        help='评估的变体，格式 名称:配置项=值,配置项=值（可多次指定，当前配置 baseline 总会评估）')
+    parser.add_argument('--k', type=int, default=RecommendConfig.TOP_N_RECOMMEND, help='推荐列表长度 K')
+    parser.add_argument('--holdout-ratio', type=float, default=0.2, help='最近多少比例的评分作为测试集（默认 0.2）')
+    parser.add_argument('--holdout-days', type=float, default=None, help='最近多少天的评分作为测试集')
+    parser.add_argument('--cutoff', type=str, default=None, help='直接指定截止时间（如 2025-04-01）')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='并行进程数')
+    parser.add_argument('--db-path', type=str, default=None, help='使用 SQLite 文件中的数据（默认按配置连接 MySQL）')
+    parser.add_argument('--output', type=str, default=None, help='把结果写入 JSON 文件')
+
+    args = parser.parse_args()
+
+    if args.variant:
+        variants = {'baseline': {}}
+        variants.update(parse_variant(spec) for spec in args.variant)
+    else:
+        variants = dict(DEFAULT_VARIANTS)
+
+    engine = create_engine(f"sqlite:///{args.db_path}" if args.db_path else RecommendConfig.get_db_url())
+    temp_dir = tempfile.mkdtemp(prefix='recommend-eval-')
+
+    try:
+        split = HoldoutSplit(engine, holdout_ratio=args.holdout_ratio, holdout_days=args.holdout_days,
+                             cutoff=args.cutoff)
+        split.build([overrides.get('DECAY_HALF_LIFE_DAYS', RecommendConfig.DECAY_HALF_LIFE_DAYS)
+                     for overrides in variants.values()])
+        split.save(temp_dir)
+
+        results = run_variants(temp_dir, variants, args.k, args.workers)
+        print_report(results, args.k)
+
+        if args.output:
+            report = {'k': args.k, 'split': split.summary, 'variants': results}
+            with open(args.output, 'w', encoding='utf-8') as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+            logger.info(f"结果已写入 {args.output}")
+    finally:
+        engine.dispose()
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+"""
+兜底推荐 - 协同过滤没有结果的用户（交互资源没有相似物品、或相似物品都已交互）
+改为推荐热门资源，并优先推荐用户常看分类中的热门资源
+
+每次运行只构建一次：
+- 资源热度 = 交互过该资源的用户数，全局热门列表取前 FALLBACK_POOL_SIZE 个（按热度降序的数组）
+- 分类热门列表：resource_category_rel 中每个分类各取前 FALLBACK_POOL_SIZE 个（CSR 风格 indptr / items）
+
+为单个用户推荐时只在用户最常交互的 FALLBACK_MAX_CATEGORIES 个分类列表和全局列表中选取，
+分数 = 归一化热度 × (1 + 用户在该资源分类上的交互占比)，开销与候选池大小有关，与资源总数无关
+
+@author JacoryCyJin
+@date 2025/04/11
+"""
+import logging
+from typing import List, Optional, Tuple
+import numpy as np
+import pandas as pd
+from scipy.sparse import csr_matrix
+from sqlalchemy.engine import Engine
+from config import RecommendConfig
+from id_encoder import IdEncoder
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class PopularityFallback:
+    """热门 + 分类热门兜底推荐"""
+
+    REASON_POPULAR = '热门推荐'
+    REASON_CATEGORY = '同类热门推荐'
+
+    def __init__(self, popularity: np.ndarray, item_categories: csr_matrix,
+                 pool_size: Optional[int] = None, max_categories: Optional[int] = None):
+        """
+        Args:
+            popularity: 每个资源（列号）的热度
+            item_categories: 资源 × 分类 的 0/1 稀疏矩阵（CSR）
+            pool_size: 全局/每个分类保留的热门资源数（默认使用配置 FALLBACK_POOL_SIZE）
+            max_categories: 每个用户最多参考的分类数（默认使用配置 FALLBACK_MAX_CATEGORIES）
+        """
+        self.pool_size = pool_size or RecommendConfig.FALLBACK_POOL_SIZE
+        self.max_categories = max_categories or RecommendConfig.FALLBACK_MAX_CATEGORIES
+
+        peak = popularity.max() if len(popularity) else 0
+        self.popularity = popularity / peak if peak > 0 else np.zeros(len(popularity))
+        self.item_categories = item_categories
+
+        # 全局热门：热度降序，同热度按列号升序
+        order = np.lexsort((np.arange(len(popularity)), -self.popularity))
+        self.global_items = order[self.popularity[order] > 0][:self.pool_size]
+
+        # 分类热门：每个分类内按热度降序
+        self.category_indptr, self.category_items = self._category_lists(item_categories.T.tocsr())
+
+    @classmethod
+    def build(cls, rating_matrix: csr_matrix, resources: IdEncoder, engine: Engine) -> 'PopularityFallback':
+        """
+        由评分矩阵和 resource_category_rel 构建
+
+        Args:
+            rating_matrix: 用户 × 资源 稀疏评分矩阵
+            resources: 资源ID 编码器（与评分矩阵的列对应）
+            engine: 数据库引擎
+        """
+        popularity = np.diff(rating_matrix.tocsc().indptr).astype(np.float64)
+
+        relations = pd.read_sql(
+            "SELECT resource_id, category_id FROM resource_category_rel", engine
+        )
+        items = resources.encode(relations['resource_id'])
+        known = items >= 0
+        categories, category_codes = IdEncoder.fit(relations['category_id'][known])
+        item_categories = csr_matrix(
+            (np.ones(int(known.sum()), dtype=np.float32), (items[known], category_codes)),
+            shape=(len(resources), len(categories))
+        )
+        item_categories.sum_duplicates()
+        item_categories.data[:] = 1.0
+
+        fallback = cls(popularity, item_categories)
+        logger.info(f"兜底推荐已构建: {len(fallback.global_items)} 个全局热门资源, {len(categories)} 个分类")
+        return fallback
+
+    def _category_lists(self, category_items: csr_matrix) -> Tuple[np.ndarray, np.ndarray]:
+        """每个分类的热门资源列表（CSR 风格，分类内按热度降序，最多 pool_size 个）"""
+        n_categories = category_items.shape[0]
+        rows = np.repeat(np.arange(n_categories, dtype=np.int64), np.diff(category_items.indptr))
+        cols = category_items.indices.astype(np.int64)
+        scores = self.popularity[cols]
+
+        order = np.lexsort((cols, -scores, rows))
+        rows, cols, scores = rows[order], cols[order], scores[order]
+        rank = np.arange(len(rows)) - np.searchsorted(rows, rows, side='left')
+        keep = (rank < self.pool_size) & (scores > 0)
+
+        indptr = np.zeros(n_categories + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows[keep], minlength=n_categories), out=indptr[1:])
+        return indptr, cols[keep]
+
+    def recommend(self, interacted: np.ndarray, top_n: int) -> Tuple[List[Tuple[int, float]], str]:
+        """
+        为一个用户选取兜底推荐
+
+        Args:
+            interacted: 用户已交互资源的列号
+            top_n: 推荐数量
+
+        Returns:
+            ([(列号, 分数), ...], 推荐理由)
+        """
+        candidates = [self.global_items]
+        share = None
+
+        user_categories = self.item_categories[interacted].indices
+        if len(user_categories):
+            counts = np.bincount(user_categories, minlength=self.item_categories.shape[1])
+            top_categories = np.argsort(-counts, kind='stable')[:self.max_categories]
+            top_categories = top_categories[counts[top_categories] > 0]
+            share = counts / counts.sum()
+            candidates += [self.category_items[self.category_indptr[c]:self.category_indptr[c + 1]]
+                           for c in top_categories]
+
+        items = np.unique(np.concatenate(candidates))
+        items = items[~np.isin(items, interacted)]
+        if len(items) == 0:
+            return [], self.REASON_POPULAR
+
+        scores = self.popularity[items].copy()
+        if share is not None:
+            # 资源所属分类中用户交互占比最高的一个作为加成
+            block = self.item_categories[items]
+            boost = np.zeros(len(items))
+            if block.nnz:
+                np.maximum.at(boost, np.repeat(np.arange(len(items)), np.diff(block.indptr)), share[block.indices])
+            scores *= 1 + boost
+
+        order = np.lexsort((items, -scores))[:top_n]
+        reason = self.REASON_CATEGORY if share is not None and (boost[order] > 0).any() else self.REASON_POPULAR
+        return [(int(item), float(score)) for item, score in zip(items[order], scores[order])], reason
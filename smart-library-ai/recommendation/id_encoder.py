@@ -0,0 +1,121 @@
+"""
+ID 编码器 - 字符串 ID（32 位十六进制）与连续整数编码之间的双向映射
+
+评分聚合、评分矩阵、近邻索引、打分都只使用整数编码（int32），
+只有读取行为表和输出推荐结果时才与字符串 ID 互相转换：
+- 编码：字典查找 O(1)，批量编码时先对本批去重，只查一次字典
+- 解码：按编码直接索引 ID 数组，批量解码为一次数组索引
+
+编码器随模型一起保存为 .npy（{name}_ids.npy），加载后编码不变
+
+@author JacoryCyJin
+@date 2025/04/11
+"""
+import os
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+import numpy as np
+import pandas as pd
+
+
+class IdEncoder:
+    """字符串 ID <-> 连续整数编码"""
+
+    def __init__(self, ids: Iterable[str] = ()):
+        """
+        Args:
+            ids: 按编码顺序排列的 ID（第 i 个 ID 的编码为 i，不能重复）
+        """
+        self._ids = np.asarray(list(ids), dtype=str)
+        self._index: Dict[str, int] = {value: code for code, value in enumerate(self._ids.tolist())}
+
+        if len(self._index) != len(self._ids):
+            raise ValueError("ID 列表中存在重复值")
+
+    @classmethod
+    def fit(cls, values: Union[pd.Series, np.ndarray]) -> Tuple['IdEncoder', np.ndarray]:
+        """
+        按 ID 升序编码一列 ID（保证行列顺序稳定）
+
+        Returns:
+            (编码器, 与 values 对齐的 int32 编码)
+        """
+        codes, uniques = pd.factorize(values, sort=True)
+        return cls(uniques), codes.astype(np.int32)
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __contains__(self, value: str) -> bool:
+        return value in self._index
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._ids.tolist())
+
+    def __getitem__(self, code: Union[int, slice]) -> Union[str, List[str]]:
+        """按编码取 ID（切片时返回 ID 列表）"""
+        if isinstance(code, slice):
+            return self._ids[code].tolist()
+        return str(self._ids[code])
+
+    @property
+    def ids(self) -> np.ndarray:
+        """按编码顺序排列的 ID 数组（只读使用）"""
+        return self._ids
+
+    def get(self, value: str, default: Optional[int] = None) -> Optional[int]:
+        """单个 ID 的编码，不存在时返回 default"""
+        return self._index.get(value, default)
+
+    def encode(self, values: Union[pd.Series, np.ndarray, List[str]]) -> np.ndarray:
+        """
+        批量编码
+
+        Returns:
+            int32 编码数组，未知 ID 为 -1
+        """
+        codes, uniques = pd.factorize(np.asarray(values, dtype=object))
+        mapping = np.fromiter(
+            (self._index.get(value, -1) for value in uniques),
+            dtype=np.int32, count=len(uniques)
+        )
+        return mapping[codes]
+
+    def encode_or_add(self, values: Union[pd.Series, np.ndarray, List[str]]) -> np.ndarray:
+        """批量编码，未知 ID 追加到末尾（编码递增）"""
+        codes, uniques = pd.factorize(np.asarray(values, dtype=object))
+        added = [value for value in uniques if value not in self._index]
+        if added:
+            for value in added:
+                self._index[value] = len(self._index)
+            self._ids = np.concatenate([self._ids, np.asarray(added, dtype=str)])
+
+        mapping = np.fromiter(
+            (self._index[value] for value in uniques),
+            dtype=np.int32, count=len(uniques)
+        )
+        return mapping[codes]
+
+    def decode(self, codes: np.ndarray) -> List[str]:
+        """批量解码"""
+        return self._ids[np.asarray(codes, dtype=np.int64)].tolist()
+
+    def sorted(self) -> Tuple['IdEncoder', np.ndarray]:
+        """
+        按 ID 升序重新编号
+
+        Returns:
+            (新编码器, 旧编码 -> 新编码 的 int32 数组)
+        """
+        order = np.argsort(self._ids, kind='stable')
+        remap = np.empty(len(order), dtype=np.int32)
+        remap[order] = np.arange(len(order), dtype=np.int32)
+        return IdEncoder(self._ids[order]), remap
+
+    def save(self, path: str, name: str):
+        """保存到 {path}/{name}_ids.npy"""
+        np.save(os.path.join(path, f'{name}_ids.npy'), self._ids)
+
+    @classmethod
+    def load(cls, path: str, name: str) -> 'IdEncoder':
+        """从 {path}/{name}_ids.npy 加载"""
+        return cls(np.load(os.path.join(path, f'{name}_ids.npy')))
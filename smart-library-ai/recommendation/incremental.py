@@ -0,0 +1,320 @@
+"""
+增量推荐引擎 - 只处理水位线之后有新行为的用户
+
+持久化状态（保存在模型目录中）：
+- 评分矩阵、近邻索引、ID 映射（与普通模型相同）
+- 共现点积矩阵 G = RᵀR（cooccurrence_*.npy）和物品平方范数（item_sq_norms.npy）
+- 水位线：上次增量处理到的数据库时间（meta.json 的 watermark）
+- 时间衰减基准时间（meta.json 的 decay_as_of）：重新聚合的用户沿用同一基准，
+  其他用户的评分行不用重读——随时间推移全部评分同比例衰减，不影响相似度
+
+每次增量运行只读取水位线之后有行为的用户，重新聚合这些用户的评分行，
+用 G += R_newᵀR_new − R_oldᵀR_old 更新受影响的物品对，只重新计算相似度变化的物品近邻，
+最后只为这些用户重新打分：读库、矩阵乘法、相似度和打分的计算量与新增行为量成正比
+
+局限：评分矩阵、共现矩阵和近邻索引仍以整块 CSR 数组保存，替换行时要把未变化的行整段拷贝到新数组，
+save_state 也会重写全部状态文件，这两部分是与模型大小成正比的内存拷贝和顺序写盘（不含计算），
+模型很大时每小时运行的固定开销由它们决定；要真正按变化量持久化需要改为增量日志 + 定期合并
+
+注意：物理删除的行为（取消收藏、清空浏览历史）不会出现在水位线之后，
+需依赖定期全量构建（删除状态目录或重新 bootstrap）纠正
+
+@author JacoryCyJin
+@date 2025/04/11
+"""
+import logging
+import os
+from datetime import datetime
+from typing import List, Optional, Tuple
+import numpy as np
+import pandas as pd
+from scipy.sparse import csr_matrix
+from sqlalchemy import text
+from neighbor_index import ItemNeighborIndex
+from id_encoder import IdEncoder
+from result_writer import RecommendResultWriter
+from sparse_ops import replace_csr_rows
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class IncrementalEngine:
+    """增量推荐引擎"""
+
+    # 浮点抵消后残留的极小值视为 0
+    ZERO_TOLERANCE = 1e-9
+
+    def __init__(self, recommender, state_path: Optional[str] = None):
+        """
+        Args:
+            recommender: ItemCFRecommender 实例（共享其评分矩阵、近邻索引和数据库连接）
+            state_path: 状态目录（默认使用配置 INCREMENTAL_STATE_PATH）
+        """
+        self.recommender = recommender
+        self.config = recommender.config
+        self.state_path = state_path or self.config.INCREMENTAL_STATE_PATH
+
+        self.cooccurrence = None  # 共现点积矩阵 G = RᵀR（CSR，资源 × 资源）
+        self.sq_norms = None  # 物品平方范数（G 的对角线）
+        self.watermark = None  # 已处理到的数据库时间
+
+    def run(self, hours: int = 1) -> Tuple[int, int]:
+        """
+        执行一次增量更新
+
+        Args:
+            hours: 没有增量状态时（首次运行），先全量构建，再为最近N小时的活跃用户生成推荐
+
+        Returns:
+            (success_count, fail_count)
+        """
+        if self.load_state():
+            logger.info(f"已加载增量状态，水位线: {self.watermark}")
+            touched_users = self.update()
+        else:
+            logger.info("未找到增量状态，先全量构建...")
+            if not self.bootstrap():
+                return 0, 0
+            touched_users = self.recommender._get_active_users(hours)
+
+        if not touched_users:
+            logger.info("没有新的用户行为，跳过增量更新")
+            self.save_state()
+            return 0, 0
+
+        logger.info(f"发现 {len(touched_users)} 个有新行为的用户，重新生成推荐...")
+        success_count, fail_count = self._rescore_users(touched_users)
+
+        # 推荐写入完成后再保存状态（中途失败时下次会从旧水位线重新处理）
+        self.save_state()
+
+        return success_count, fail_count
+
+    def bootstrap(self) -> bool:
+        """全量构建增量状态"""
+        # 先取水位线：构建期间产生的新行为留给下一次增量处理
+        watermark = self._db_now()
+
+        if not self.recommender.prepare():
+            return False
+
+        rating_matrix = self.recommender.rating_matrix
+        self.cooccurrence = (rating_matrix.T @ rating_matrix).tocsr()
+        self.sq_norms = self.cooccurrence.diagonal()
+        self.watermark = watermark
+
+        logger.info(f"共现矩阵构建完成: {self.cooccurrence.nnz} 个非零物品对")
+        self.save_state()
+        return True
+
+    def load_state(self) -> bool:
+        """加载增量状态（读入内存，后续会原地更新）"""
+        if not os.path.exists(os.path.join(self.state_path, 'cooccurrence_data.npy')):
+            return False
+
+        if not self.recommender.load_model(self.state_path, mmap_mode=None):
+            return False
+
+        watermark = self.recommender.model_meta.get('watermark')
+        if not watermark:
+            return False
+
+        # 半衰期变化后旧评分的尺度不再适用，需要重新全量构建
+        if self.recommender.model_meta.get('decay_half_life_days', 0) != self.recommender.aggregator.half_life_days:
+            logger.warning("衰减半衰期配置已变化，重新全量构建增量状态")
+            return False
+
+        n_items = len(self.recommender.resources)
+        self.cooccurrence = csr_matrix(
+            (
+                np.load(os.path.join(self.state_path, 'cooccurrence_data.npy')),
+                np.load(os.path.join(self.state_path, 'cooccurrence_indices.npy')),
+                np.load(os.path.join(self.state_path, 'cooccurrence_indptr.npy'))
+            ),
+            shape=(n_items, n_items)
+        )
+        self.sq_norms = np.load(os.path.join(self.state_path, 'item_sq_norms.npy'))
+        self.watermark = datetime.fromisoformat(watermark)
+        return True
+
+    def save_state(self):
+        """
+        保存增量状态（评分矩阵、近邻索引、共现矩阵、范数、水位线）
+
+        整体重写到临时目录再替换（与 save_model 相同），写盘量与模型大小成正比，不是只写变化部分
+        """
+        self.recommender.save_model(
+            self.state_path,
+            extra_arrays={
+                'cooccurrence_indptr': self.cooccurrence.indptr,
+                'cooccurrence_indices': self.cooccurrence.indices,
+                'cooccurrence_data': self.cooccurrence.data,
+                'item_sq_norms': self.sq_norms
+            },
+            extra_meta={
+                'watermark': self.watermark.isoformat(sep=' '),
+                'cooccurrence_nnz': int(self.cooccurrence.nnz)
+            }
+        )
+
+    def update(self) -> List[str]:
+        """
+        读取水位线之后有新行为的用户，更新评分矩阵、共现矩阵和受影响的近邻
+
+        Returns:
+            有新行为的用户ID列表
+        """
+        metrics = self.recommender.metrics
+        new_watermark = self._db_now()
+        with metrics.span('fetch') as span:
+            touched_users = self._get_touched_users(self.watermark)
+            span.rows = len(touched_users)
+
+        if touched_users:
+            with metrics.span('aggregate') as span:
+                fresh_ratings = self.recommender.aggregator.aggregate_ratings_for_users(touched_users)
+                span.rows = len(fresh_ratings)
+            with metrics.span('similarity', rows=len(touched_users)):
+                self._apply_user_rows(touched_users, fresh_ratings)
+
+        self.watermark = new_watermark
+        return touched_users
+
+    def _apply_user_rows(self, touched_users: List[str], fresh_ratings: pd.DataFrame):
+        """
+        用重新聚合的评分替换这些用户的评分行，并增量更新共现矩阵和近邻索引
+
+        矩阵运算只涉及这些用户的行和评分变化物品的行；其余行只做整段数组拷贝（见 replace_csr_rows）
+
+        Args:
+            touched_users: 有新行为的用户ID
+            fresh_ratings: 这些用户重新聚合后的评分 (user_id, resource_id, rating)
+        """
+        rec = self.recommender
+
+        # 1. 新用户/新资源追加到编码末尾（已有编码不变）
+        touched_rows = rec.users.encode_or_add(touched_users).astype(np.int64)
+        fresh_cols = rec.resources.encode_or_add(fresh_ratings['resource_id'])
+
+        n_users, n_items = len(rec.users), len(rec.resources)
+        rating_matrix = self._resize(rec.rating_matrix, n_users, n_items)
+        cooccurrence = self._resize(self.cooccurrence, n_items, n_items)
+        sq_norms = np.zeros(n_items, dtype=np.float64)
+        sq_norms[:len(self.sq_norms)] = self.sq_norms
+
+        # 2. 这些用户的旧评分行和新评分行（新评分行按 touched_users 的顺序排列）
+        old_block = rating_matrix[touched_rows]
+
+        position = IdEncoder(touched_users)
+        new_block = csr_matrix(
+            (
+                fresh_ratings['rating'].to_numpy(dtype=np.float64),
+                (position.encode(fresh_ratings['user_id']), fresh_cols)
+            ),
+            shape=(len(touched_users), n_items)
+        )
+
+        new_block.sum_duplicates()
+        new_block.eliminate_zeros()
+
+        # 3. 更新共现点积：ΔG = R_newᵀR_new − R_oldᵀR_old 只在 变化物品 × 变化物品 上非零
+        #    （变化物品 = 这些用户更新前后评分过的物品），只需重算这些物品的行，再整行拼回 G
+        changed_items = np.union1d(old_block.indices, new_block.indices).astype(np.int64)
+        delta = (new_block.T @ new_block - old_block.T @ old_block).tocsr()
+        changed_rows = (cooccurrence[changed_items] + delta[changed_items]).tocsr()
+        changed_rows.data[np.abs(changed_rows.data) < self.ZERO_TOLERANCE] = 0
+        changed_rows.eliminate_zeros()
+        changed_rows.sort_indices()
+
+        cooccurrence = self._replace_rows(cooccurrence, changed_items, changed_rows)
+        sq_norms[changed_items] = np.maximum(
+            np.asarray(changed_rows[np.arange(len(changed_items)), changed_items]).ravel(), 0
+        )
+
+        # 4. 替换评分矩阵中这些用户的行
+        rating_matrix = self._replace_rows(rating_matrix, touched_rows, new_block)
+
+        # 5. 重新计算受影响物品的近邻：评分变化的物品，以及更新前后与它们有共现的物品
+        #    （范数变化影响这些物品与变化物品的相似度；共现降为 0 的物品只出现在旧矩阵中）
+        old_changed_items = changed_items[changed_items < self.cooccurrence.shape[0]]
+        affected_items = np.union1d(
+            np.union1d(changed_items, changed_rows.indices),
+            self.cooccurrence[old_changed_items].indices
+        ).astype(np.int64)
+        rows = ItemNeighborIndex.compute_rows(
+            cooccurrence, sq_norms, affected_items,
+            top_k=self.config.TOP_N_SIMILAR,
+            threshold=self.config.SIMILARITY_THRESHOLD
+        )
+        rec.neighbor_index = rec.neighbor_index.replace_rows(affected_items, *rows, n_items=n_items)
+
+        rec.rating_matrix = rating_matrix
+        self.cooccurrence = cooccurrence
+        self.sq_norms = sq_norms
+
+        logger.info(f"增量更新: {len(touched_users)} 个用户, {len(changed_items)} 个物品评分变化, "
+                    f"{len(affected_items)} 个物品重新计算近邻")
+
+    def _rescore_users(self, user_ids: List[str]) -> Tuple[int, int]:
+        """为指定用户重新打分并批量写入推荐结果"""
+        success_count = 0
+        fail_count = 0
+        block_size = self.config.SCORING_BLOCK_SIZE
+
+        self.recommender.build_fallback()
+
+        with RecommendResultWriter(self.recommender.engine, cache=self.recommender.cache,
+                                   metrics=self.recommender.metrics) as writer:
+            for start in range(0, len(user_ids), block_size):
+                block = user_ids[start:start + block_size]
+                with self.recommender.metrics.span('score', rows=len(block)):
+                    results = self.recommender.recommend_for_users(block)
+                for user_id in block:
+                    if self.recommender._add_user_result(user_id, results.get(user_id), writer):
+                        success_count += 1
+                    else:
+                        fail_count += 1
+
+                processed = min(start + block_size, len(user_ids))
+                progress = (processed / len(user_ids)) * 100
+                logger.info(f"进度: {processed}/{len(user_ids)} ({progress:.1f}%) | 成功: {success_count} | 失败: {fail_count}")
+
+        return success_count, fail_count
+
+    def _get_touched_users(self, since: datetime) -> List[str]:
+        """查询水位线之后有浏览、收藏、评分行为的用户"""
+        query = text("""
+            SELECT DISTINCT user_id FROM (
+                SELECT user_id FROM user_browse_history WHERE mtime >= :since
+                UNION
+                SELECT user_id FROM user_favorite WHERE ctime >= :since
+                UNION
+                SELECT user_id FROM comment WHERE mtime >= :since
+            ) AS touched_users
+        """)
+        with self.recommender.engine.connect() as conn:
+            return [row[0] for row in conn.execute(query, {"since": since})]
+
+    def _db_now(self) -> datetime:
+        """数据库当前时间（水位线以数据库时钟为准）"""
+        with self.recommender.engine.connect() as conn:
+            value = conn.execute(text("SELECT NOW()")).scalar()
+        return pd.Timestamp(value).to_pydatetime()
+
+    @staticmethod
+    def _replace_rows(matrix: csr_matrix, rows: np.ndarray, block: csr_matrix) -> csr_matrix:
+        """用 block 的各行（与 rows 对齐）替换 CSR 矩阵中的对应行，其余行整段复制"""
+        indptr, (indices, data) = replace_csr_rows(
+            np.asarray(matrix.indptr), (np.asarray(matrix.indices), np.asarray(matrix.data)),
+            rows, block.indptr, (block.indices, block.data.astype(matrix.dtype, copy=False))
+        )
+        return csr_matrix((data, indices, indptr), shape=matrix.shape)
+
+    @staticmethod
+    def _resize(matrix: csr_matrix, n_rows: int, n_cols: int) -> csr_matrix:
+        """扩展 CSR 矩阵的形状（新增行列为空）"""
+        indptr = np.asarray(matrix.indptr)
+        if n_rows > matrix.shape[0]:
+            indptr = np.concatenate([indptr, np.full(n_rows - matrix.shape[0], indptr[-1], dtype=indptr.dtype)])
+        return csr_matrix((np.asarray(matrix.data), np.asarray(matrix.indices), indptr), shape=(n_rows, n_cols))
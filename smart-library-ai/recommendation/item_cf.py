@@ -4,14 +4,30 @@ Item-CF 协同过滤推荐算法
 @author JacoryCyJin
 @date 2025/04/11
 """
+import json
 import logging
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+from datetime import datetime
 import numpy as np
-import pandas as pd
-from typing import Dict, List, Tuple
-from sklearn.metrics.pairwise import cosine_similarity
+from typing import Dict, List, Optional, Tuple
+from scipy.sparse import csr_matrix
 from sqlalchemy import create_engine, text
+from sqlalchemy.engine import Engine
 from config import RecommendConfig
 from rating_aggregator import RatingAggregator
+from sparse_ops import csr_row_ids, top_n_candidates, top_n_per_row
+from neighbor_index import ItemNeighborIndex
+from ann_index import LSHNeighborSearch
+from result_writer import RecommendResultWriter
+from recommend_cache import RecommendCache
+from incremental import IncrementalEngine
+from metrics import StageMetrics
+from id_encoder import IdEncoder
+from fallback import PopularityFallback
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -20,24 +36,34 @@ logger = logging.getLogger(__name__)
 class ItemCFRecommender:
     """基于物品的协同过滤推荐器"""
     
-    def __init__(self):
+    # 模型文件格式版本（文件结构变化时递增）
+    MODEL_FORMAT_VERSION = 1
+    
+    def __init__(self, engine: Optional[Engine] = None):
+        """
+        Args:
+            engine: 数据库引擎（默认按配置连接 MySQL，基准测试等场景可传入 SQLite 引擎）
+        """
         self.config = RecommendConfig()
-        self.engine = create_engine(self.config.get_db_url())
-        self.aggregator = RatingAggregator()
+        self.engine = engine or create_engine(self.config.get_db_url())
+        self.metrics = StageMetrics()  # 本次运行的阶段指标（与评分聚合器、结果写入器共享）
+        self.aggregator = RatingAggregator(engine=self.engine, metrics=self.metrics)
+        self.cache = RecommendCache.from_config()  # 推荐结果 Redis 缓存（未启用时为 None）
         
         # 缓存数据
-        self.rating_matrix = None
-        self.user_ids = []
-        self.resource_ids = []
-        self.similarity_matrix = None
+        self.model_meta = {}  # 已加载模型的元数据（meta.json）
+        self.rating_matrix = None  # 稀疏评分矩阵（CSR，用户 × 资源）
+        self.users = IdEncoder()  # 用户ID <-> 行号
+        self.resources = IdEncoder()  # 资源ID <-> 列号
+        self.neighbor_index = None  # 物品 Top-K 近邻索引
+        self.fallback = None  # 协同过滤没有结果时的热门/分类热门兜底推荐
     
     def build_rating_matrix(self):
         """构建评分矩阵"""
         logger.info("构建评分矩阵...")
-        self.rating_matrix, self.user_ids, self.resource_ids = \
-            self.aggregator.get_user_item_matrix()
+        self.rating_matrix, self.users, self.resources = self.aggregator.get_sparse_user_item_matrix()
         
-        if self.rating_matrix.empty:
+        if self.rating_matrix.nnz == 0:
             logger.error("评分矩阵为空，无法进行推荐！")
             return False
         
@@ -45,29 +71,154 @@ class ItemCFRecommender:
     
     def calculate_similarity(self):
         """
-        计算物品相似度矩阵
-        使用余弦相似度
+        计算物品相似度，构建 Top-K 近邻索引
+        使用余弦相似度，每个物品只保留 TOP_N_SIMILAR 个不低于阈值的近邻
         """
-        if self.rating_matrix is None or self.rating_matrix.empty:
+        if self.rating_matrix is None or self.rating_matrix.nnz == 0:
             logger.error("评分矩阵未构建，无法计算相似度！")
             return False
         
-        logger.info("计算物品相似度矩阵...")
+        logger.info("计算物品相似度，构建近邻索引...")
+        
+        with self.metrics.span('similarity') as span:
+            # 转置矩阵：行为资源，列为用户
+            item_matrix = self.rating_matrix.T.tocsr()
+            
+            if self.config.SIMILARITY_ENGINE == 'lsh':
+                # 随机投影 LSH 近似近邻，资源规模很大时开销近似线性
+                self.neighbor_index = LSHNeighborSearch().build(
+                    item_matrix,
+                    top_k=self.config.TOP_N_SIMILAR,
+                    threshold=self.config.SIMILARITY_THRESHOLD
+                )
+            elif self.config.SIMILARITY_ENGINE == 'exact':
+                # 分块计算余弦相似度，只保留每个物品的 Top-K 近邻（不生成 N × N 矩阵）
+                self.neighbor_index = ItemNeighborIndex.build(
+                    item_matrix,
+                    top_k=self.config.TOP_N_SIMILAR,
+                    threshold=self.config.SIMILARITY_THRESHOLD,
+                    block_size=self.config.SIMILARITY_BLOCK_SIZE
+                )
+            else:
+                raise ValueError(f"未知的相似度计算方式: {self.config.SIMILARITY_ENGINE}（可选: exact, lsh）")
+            
+            span.rows = self.neighbor_index.nnz
+        
+        return True
+    
+    def prepare(self, model_path: Optional[str] = None) -> bool:
+        """
+        准备评分矩阵和近邻索引
+        
+        Args:
+            model_path: 模型目录；指定时直接加载已构建的模型，否则从数据库重新构建
+        """
+        if model_path:
+            return self.load_model(model_path)
+        
+        return self.build_rating_matrix() and self.calculate_similarity()
+    
+    def save_model(self, model_path: str, extra_arrays: Optional[Dict[str, np.ndarray]] = None,
+                   extra_meta: Optional[Dict] = None):
+        """
+        保存模型到目录：评分矩阵、近邻索引、ID 映射（.npy）和构建元数据（meta.json）
+        
+        先写入临时目录再整体替换，正在读取旧模型的进程不受影响
+        
+        Args:
+            model_path: 模型目录
+            extra_arrays: 附加保存的数组 {文件名(不含 .npy): 数组}（如增量更新状态）
+            extra_meta: 附加写入 meta.json 的字段
+        """
+        if self.rating_matrix is None or self.neighbor_index is None:
+            logger.error("评分矩阵或近邻索引未准备好，无法保存模型！")
+            return
+        
+        model_path = os.path.abspath(model_path)
+        tmp_path = f"{model_path}.tmp-{os.getpid()}"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+        
+        np.save(os.path.join(tmp_path, 'rating_indptr.npy'), self.rating_matrix.indptr)
+        np.save(os.path.join(tmp_path, 'rating_indices.npy'), self.rating_matrix.indices)
+        np.save(os.path.join(tmp_path, 'rating_data.npy'), self.rating_matrix.data)
+        self.users.save(tmp_path, 'user')
+        self.resources.save(tmp_path, 'resource')
+        self.neighbor_index.save(tmp_path)
+        for name, array in (extra_arrays or {}).items():
+            np.save(os.path.join(tmp_path, f'{name}.npy'), array)
+        
+        meta = {
+            "format_version": self.MODEL_FORMAT_VERSION,
+            "built_at": time.strftime('%Y-%m-%d %H:%M:%S'),
+            "n_users": len(self.users),
+            "n_resources": len(self.resources),
+            "rating_nnz": int(self.rating_matrix.nnz),
+            "neighbor_nnz": int(self.neighbor_index.nnz),
+            "top_n_similar": self.config.TOP_N_SIMILAR,
+            "similarity_threshold": self.config.SIMILARITY_THRESHOLD,
+            "decay_half_life_days": self.aggregator.half_life_days,
+            "decay_as_of": self.aggregator.as_of.isoformat(sep=' ') if self.aggregator.as_of else None
+        }
+        meta.update(extra_meta or {})
+        with open(os.path.join(tmp_path, 'meta.json'), 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False, indent=2)
+        
+        # 整体替换旧模型目录
+        old_path = f"{model_path}.old-{os.getpid()}"
+        if os.path.exists(model_path):
+            os.rename(model_path, old_path)
+        os.rename(tmp_path, model_path)
+        shutil.rmtree(old_path, ignore_errors=True)
+        
+        logger.info(f"模型已保存: {model_path} ({meta['n_users']} 用户, {meta['n_resources']} 资源)")
+    
+    def load_model(self, model_path: str, mmap_mode: Optional[str] = 'r') -> bool:
+        """
+        从目录加载模型
+        
+        Args:
+            model_path: 模型目录
+            mmap_mode: 传给 np.load，默认 'r' 以只读内存映射方式打开，
+                       多个进程共享同一份页缓存；None 表示读入内存
+        
+        Returns:
+            是否加载成功
+        """
+        meta_file = os.path.join(model_path, 'meta.json')
+        if not os.path.exists(meta_file):
+            logger.error(f"模型不存在: {model_path}")
+            return False
         
-        # 转置矩阵：行为资源，列为用户
-        item_matrix = self.rating_matrix.T
+        with open(meta_file, encoding='utf-8') as f:
+            meta = json.load(f)
+        self.model_meta = meta
         
-        # 计算余弦相似度
-        similarity = cosine_similarity(item_matrix)
+        if meta.get('format_version') != self.MODEL_FORMAT_VERSION:
+            logger.error(f"模型格式版本不匹配: {meta.get('format_version')}，请重新构建模型")
+            return False
         
-        # 转换为 DataFrame
-        self.similarity_matrix = pd.DataFrame(
-            similarity,
-            index=self.resource_ids,
-            columns=self.resource_ids
+        # 增量聚合和实时打分沿用模型的衰减基准时间
+        if meta.get('decay_half_life_days', 0) != self.aggregator.half_life_days:
+            logger.warning(f"模型的衰减半衰期 ({meta.get('decay_half_life_days', 0)}) 与当前配置 "
+                           f"({self.aggregator.half_life_days}) 不同，实时打分的评分尺度可能不一致")
+        self.aggregator.as_of = datetime.fromisoformat(meta['decay_as_of']) if meta.get('decay_as_of') else None
+        
+        self.users = IdEncoder.load(model_path, 'user')
+        self.resources = IdEncoder.load(model_path, 'resource')
+        
+        self.rating_matrix = csr_matrix(
+            (
+                np.load(os.path.join(model_path, 'rating_data.npy'), mmap_mode=mmap_mode),
+                np.load(os.path.join(model_path, 'rating_indices.npy'), mmap_mode=mmap_mode),
+                np.load(os.path.join(model_path, 'rating_indptr.npy'), mmap_mode=mmap_mode)
+            ),
+            shape=(len(self.users), len(self.resources))
         )
+        self.neighbor_index = ItemNeighborIndex.load(model_path, mmap_mode=mmap_mode)
         
-        logger.info(f"相似度矩阵维度: {self.similarity_matrix.shape}")
+        logger.info(f"已加载模型: {model_path} (构建于 {meta['built_at']}, "
+                    f"{meta['n_users']} 用户, {meta['n_resources']} 资源)")
         
         return True
     
@@ -82,28 +233,22 @@ class ItemCFRecommender:
         Returns:
             [(resource_id, similarity_score), ...]
         """
-        if self.similarity_matrix is None:
-            logger.error("相似度矩阵未计算！")
+        if self.neighbor_index is None:
+            logger.error("近邻索引未构建！")
             return []
         
-        if resource_id not in self.similarity_matrix.index:
-            logger.warning(f"资源 {resource_id} 不在相似度矩阵中")
+        item_idx = self.resources.get(resource_id)
+        if item_idx is None:
+            logger.warning(f"资源 {resource_id} 不在近邻索引中")
             return []
         
         if top_n is None:
             top_n = self.config.TOP_N_SIMILAR
         
-        # 获取相似度分数
-        similarities = self.similarity_matrix[resource_id].sort_values(ascending=False)
+        # 近邻已排除自己、过滤低相似度并按相似度降序（最多 TOP_N_SIMILAR 个）
+        neighbor_indices, neighbor_scores = self.neighbor_index.neighbors(item_idx)
         
-        # 排除自己，过滤低相似度
-        similarities = similarities[similarities.index != resource_id]
-        similarities = similarities[similarities >= self.config.SIMILARITY_THRESHOLD]
-        
-        # 返回 Top-N
-        top_similar = similarities.head(top_n)
-        
-        return list(zip(top_similar.index, top_similar.values))
+        return list(zip(self.resources.decode(neighbor_indices[:top_n]), neighbor_scores[:top_n].tolist()))
     
     def recommend_for_user(self, user_id: str, top_n: int = None) -> List[Tuple[str, float]]:
         """
@@ -116,53 +261,244 @@ class ItemCFRecommender:
         Returns:
             [(resource_id, predicted_score), ...]
         """
-        if self.rating_matrix is None or self.similarity_matrix is None:
-            logger.error("评分矩阵或相似度矩阵未准备好！")
+        if self.rating_matrix is None or self.neighbor_index is None:
+            logger.error("评分矩阵或近邻索引未准备好！")
             return []
         
-        if user_id not in self.user_ids:
+        user_idx = self.users.get(user_id)
+        if user_idx is None:
             logger.warning(f"用户 {user_id} 没有历史行为数据")
             return []
         
         if top_n is None:
             top_n = self.config.TOP_N_RECOMMEND
         
-        # 获取用户已交互的资源
-        user_ratings = self.rating_matrix.loc[user_id]
-        interacted_items = user_ratings[user_ratings > 0].index.tolist()
-        
-        if not interacted_items:
+        # 检查用户是否有交互资源（稀疏行的非零列）
+        if self.rating_matrix.indptr[user_idx + 1] == self.rating_matrix.indptr[user_idx]:
             logger.warning(f"用户 {user_id} 没有交互记录")
             return []
         
-        # 计算推荐分数
-        scores = {}
-        for item_id in self.resource_ids:
-            # 跳过已交互的资源
-            if item_id in interacted_items:
-                continue
-            
-            # 计算预测评分：加权求和
-            numerator = 0.0
-            denominator = 0.0
-            
-            for interacted_item in interacted_items:
-                if item_id in self.similarity_matrix.index and \
-                   interacted_item in self.similarity_matrix.columns:
-                    similarity = self.similarity_matrix.loc[item_id, interacted_item]
-                    
-                    if similarity >= self.config.SIMILARITY_THRESHOLD:
-                        user_rating = user_ratings[interacted_item]
-                        numerator += similarity * user_rating
-                        denominator += abs(similarity)
-            
-            if denominator > 0:
-                scores[item_id] = numerator / denominator
+        return self._score_users(np.array([user_idx]), top_n)[0]
+    
+    def recommend_for_users(self, user_ids: List[str], top_n: int = None) -> Dict[str, List[Tuple[str, float]]]:
+        """
+        批量为一组用户生成推荐（整块用户一次稀疏矩阵乘法完成打分）
+        
+        Args:
+            user_ids: 用户ID列表（不在评分矩阵中的用户会被忽略）
+            top_n: 推荐数量（默认使用配置）
+        
+        Returns:
+            {user_id: [(resource_id, predicted_score), ...]}
+        """
+        if self.rating_matrix is None or self.neighbor_index is None:
+            logger.error("评分矩阵或近邻索引未准备好！")
+            return {}
+        
+        if top_n is None:
+            top_n = self.config.TOP_N_RECOMMEND
+        
+        user_indices = self.users.encode(user_ids)
+        user_indices = user_indices[user_indices >= 0]
+        if len(user_indices) == 0:
+            return {}
+        
+        results = self._score_users(user_indices, top_n)
+        
+        return dict(zip(self.users.decode(user_indices), results))
+    
+    def recommend_from_ratings(self, ratings: Dict[str, float], top_n: int = None) -> List[Tuple[str, float]]:
+        """
+        按给定的评分实时打分（用于模型构建之后才出现的用户，评分来自其最新行为）
+        
+        Args:
+            ratings: {resource_id: rating}，不在模型中的资源会被忽略
+            top_n: 推荐数量（默认使用配置）
+        
+        Returns:
+            [(resource_id, predicted_score), ...]
+        """
+        if self.neighbor_index is None:
+            logger.error("近邻索引未准备好！")
+            return []
+        
+        if top_n is None:
+            top_n = self.config.TOP_N_RECOMMEND
+        
+        cols = self.resources.encode(list(ratings.keys()))
+        values = np.fromiter(ratings.values(), dtype=np.float64, count=len(ratings))
+        known = (cols >= 0) & (values > 0)
+        if not known.any():
+            return []
+        
+        user_block = csr_matrix(
+            (values[known], (np.zeros(known.sum(), dtype=np.int64), cols[known])),
+            shape=(1, len(self.resources))
+        )
+        return self._score_rows(user_block, top_n)[0]
+    
+    def recommend_for_session(self, resource_ids: List[str], top_n: int = None) -> List[Tuple[str, float]]:
+        """
+        基于会话内最近浏览的资源实时推荐（匿名用户、新用户，不依赖历史评分）
+        
+        分数 = Σ 衰减权重 × 相似度，即把会话资源的近邻行按权重相加，
+        一次稀疏向量与近邻矩阵的乘法完成；越近浏览的资源权重越高（SESSION_DECAY ** 位置）
+        
+        Args:
+            resource_ids: 最近浏览的资源ID，按时间从近到远排列（不在模型中的资源会被忽略）
+            top_n: 推荐数量（默认使用配置）
+        
+        Returns:
+            [(resource_id, score), ...]，不包含会话中已浏览的资源
+        """
+        if self.neighbor_index is None:
+            logger.error("近邻索引未准备好！")
+            return []
+        
+        if top_n is None:
+            top_n = self.config.TOP_N_RECOMMEND
+        
+        cols = self.resources.encode(resource_ids[:self.config.SESSION_MAX_ITEMS])
+        position = np.flatnonzero(cols >= 0)
+        if len(position) == 0:
+            return []
+        
+        cols = cols[position]
+        weights = np.power(self.config.SESSION_DECAY, position, dtype=np.float64)
+        session = csr_matrix(
+            (weights, (np.zeros(len(cols), dtype=np.int64), cols)),
+            shape=(1, len(self.resources))
+        )
         
-        # 排序并返回 Top-N
-        sorted_scores = sorted(scores.items(), key=lambda x: x[1], reverse=True)
+        scores = (session @ self.neighbor_index.matrix).tocsr()
+        candidates = scores.indices.astype(np.int64)
+        keep = ~np.isin(candidates, cols)
         
-        return sorted_scores[:top_n]
+        _, top_cols, top_scores = top_n_per_row(
+            np.zeros(keep.sum(), dtype=np.int64), candidates[keep], scores.data[keep], 1, top_n
+        )
+        
+        return list(zip(self.resources.decode(top_cols), top_scores.tolist()))
+    
+    def build_fallback(self) -> bool:
+        """构建兜底推荐（每次运行一次，失败时只记录警告，不影响协同过滤推荐）"""
+        if not self.config.FALLBACK_ENABLED or self.rating_matrix is None:
+            return False
+        
+        try:
+            self.fallback = PopularityFallback.build(self.rating_matrix, self.resources, self.engine)
+            return True
+        except Exception as e:
+            logger.warning(f"构建兜底推荐失败，协同过滤没有结果的用户将不生成推荐: {e}")
+            self.fallback = None
+            return False
+    
+    def recommend_fallback(self, user_id: str, top_n: int = None) -> Tuple[List[Tuple[str, float]], str]:
+        """
+        热门/分类热门兜底推荐（需先调用 build_fallback）
+        
+        Returns:
+            ([(resource_id, score), ...], 推荐理由)，不包含用户已交互的资源
+        """
+        if self.fallback is None:
+            return [], PopularityFallback.REASON_POPULAR
+        
+        if top_n is None:
+            top_n = self.config.TOP_N_RECOMMEND
+        
+        user_idx = self.users.get(user_id)
+        interacted = self.rating_matrix[user_idx].indices if user_idx is not None else np.zeros(0, dtype=np.int32)
+        items, reason = self.fallback.recommend(interacted, top_n)
+        return [(self.resources[col], score) for col, score in items], reason
+    
+    def _score_users(self, user_indices: np.ndarray, top_n: int) -> List[List[Tuple[str, float]]]:
+        """向量化计算一组用户（评分矩阵中的行）的推荐分数"""
+        return self._score_rows(self.rating_matrix[user_indices], top_n)
+    
+    def _score_rows(self, user_block: csr_matrix, top_n: int) -> List[List[Tuple[str, float]]]:
+        """
+        向量化计算一组评分行的推荐分数
+        
+        Args:
+            user_block: 用户 × 资源 的稀疏评分行（CSR）
+            top_n: 推荐数量
+        
+        Returns:
+            与 user_block 各行对齐的推荐列表 [[(resource_id, score), ...], ...]
+        """
+        indptr, top_cols, top_scores = self._top_n_rows(user_block, top_n)
+        
+        # 整块一次解码，再按行切分
+        resource_ids = self.resources.decode(top_cols)
+        scores = top_scores.tolist()
+        return [
+            list(zip(resource_ids[indptr[i]:indptr[i + 1]], scores[indptr[i]:indptr[i + 1]]))
+            for i in range(user_block.shape[0])
+        ]
+    
+    def _top_n_rows(self, user_block: csr_matrix, top_n: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        一组评分行的 Top-N 推荐（列号形式，离线评估直接使用）
+        
+        预测评分 = Σ(相似度 × 用户评分) / Σ|相似度|，对整块用户写成矩阵乘法：
+        分子 = R_block · S，分母 = 1(R_block > 0) · S
+        其中 S 为 Top-K 近邻图（第 i 行为物品 i 的近邻），即每个已交互物品
+        只向自己的 K 个近邻贡献分数；评分均为正数，余弦相似度非负（|S| = S）
+        
+        Args:
+            user_block: 用户 × 资源 的稀疏评分行（CSR）
+            top_n: 推荐数量
+        
+        Returns:
+            (indptr, cols, scores)，CSR 风格：第 r 行的推荐为 cols[indptr[r]:indptr[r+1]]，按分数降序
+        """
+        interacted = user_block.copy()
+        interacted.data[:] = 1.0
+        
+        similarity = self.neighbor_index.matrix
+        numerator = (user_block @ similarity).tocsr()
+        denominator = (interacted @ similarity).tocsr()
+        
+        # 两次乘法的稀疏结构相同，逐元素对齐后相除（元素顺序只取决于结构，一般无需排序）
+        if not np.array_equal(numerator.indices, denominator.indices):
+            numerator.sort_indices()
+            denominator.sort_indices()
+        
+        rows = csr_row_ids(numerator)
+        cols = numerator.indices.astype(np.int64)
+        valid = denominator.data > 0
+        scores = np.zeros_like(numerator.data)
+        np.divide(numerator.data, denominator.data, out=scores, where=valid)
+        
+        # 剔除已交互的资源：已交互的 (行, 列) 组合键有序，候选键二分查找即可
+        if not user_block.has_sorted_indices:
+            user_block = user_block.sorted_indices()
+        n_items = user_block.shape[1]
+        candidate_keys = rows * n_items + cols
+        interacted_keys = csr_row_ids(user_block) * n_items + user_block.indices
+        if len(interacted_keys):
+            position = np.minimum(np.searchsorted(interacted_keys, candidate_keys), len(interacted_keys) - 1)
+            keep = valid & (interacted_keys[position] != candidate_keys)
+        else:
+            keep = valid
+        rows, cols, scores = rows[keep], cols[keep], scores[keep]
+        
+        # 先按行 argpartition 筛掉进不了 Top-N 的候选，只对剩下的排序
+        n_rows = user_block.shape[0]
+        row_indptr = np.zeros(n_rows + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=n_rows), out=row_indptr[1:])
+        keep = top_n_candidates(row_indptr, scores, top_n)
+        
+        indptr, top_cols, top_scores = top_n_per_row(
+            rows[keep], cols[keep], scores[keep], n_rows, top_n
+        )
+        
+        # 评分按衰减基准时间计算，换算到当前时间（同比例缩放，不影响排序）
+        decay_scale = self.aggregator.decay_scale()
+        if decay_scale != 1.0:
+            top_scores = top_scores * decay_scale
+        
+        return indptr, top_cols, top_scores
     
     def save_recommendations_to_db(self, user_id: str, recommendations: List[Tuple[str, float]]):
         """
@@ -176,118 +512,188 @@ class ItemCFRecommender:
             logger.warning(f"用户 {user_id} 没有推荐结果")
             return
         
-        with self.engine.connect() as conn:
-            # 清空该用户的旧推荐
-            conn.execute(text("DELETE FROM recommend_result WHERE user_id = :user_id"), 
-                        {"user_id": user_id})
-            
-            # 插入新推荐
-            for resource_id, score in recommendations:
-                conn.execute(text("""
-                    INSERT INTO recommend_result (user_id, resource_id, score, reason, ctime)
-                    VALUES (:user_id, :resource_id, :score, :reason, NOW())
-                """), {
-                    "user_id": user_id,
-                    "resource_id": resource_id,
-                    "score": float(score),
-                    "reason": "基于协同过滤"
-                })
-            
-            conn.commit()
+        # 清空该用户的旧推荐并插入新推荐（同一事务）
+        with RecommendResultWriter(self.engine, cache=self.cache, metrics=self.metrics) as writer:
+            writer.add(user_id, recommendations)
         
         logger.info(f"已为用户 {user_id} 保存 {len(recommendations)} 条推荐")
     
-    def generate_recommendations_for_all_users(self):
-        """为所有用户生成推荐（全量更新）"""
-        if not self.build_rating_matrix():
-            return
+    def generate_recommendations_for_all_users(self, model_path: Optional[str] = None, workers: int = 1,
+                                               swap: Optional[bool] = None):
+        """
+        为所有用户生成推荐（全量更新）
         
-        if not self.calculate_similarity():
+        Args:
+            model_path: 模型目录；指定时使用已构建的模型，不再从数据库重新计算
+            workers: 并行进程数；大于 1 时把用户分片交给进程池处理
+            swap: 是否先写入影子表再原子替换 recommend_result（默认使用配置 WRITE_STAGING_SWAP）
+        """
+        if not self.prepare(model_path):
             return
         
-        total_users = len(self.user_ids)
+        if swap is None:
+            swap = self.config.WRITE_STAGING_SWAP
+        
+        if workers <= 1:
+            self.build_fallback()
+        
+        total_users = len(self.users)
         logger.info(f"开始为 {total_users} 个用户生成推荐...")
         
-        success_count = 0
-        fail_count = 0
+        writer = RecommendResultWriter(self.engine, staging=swap, cache=self.cache, metrics=self.metrics)
+        if swap:
+            writer.prepare_staging()
         
-        for i, user_id in enumerate(self.user_ids, 1):
-            try:
-                recommendations = self.recommend_for_user(user_id)
-                if recommendations:
-                    self.save_recommendations_to_db(user_id, recommendations)
-                    success_count += 1
-                else:
-                    fail_count += 1
-                    # 详细分析失败原因
-                    self._log_failure_reason(user_id)
+        if workers > 1:
+            success_count, fail_count = self._generate_parallel(model_path, workers, swap)
+        else:
+            success_count = 0
+            fail_count = 0
+            block_size = self.config.SCORING_BLOCK_SIZE
+            
+            for start in range(0, total_users, block_size):
+                end = min(start + block_size, total_users)
+                block_success, block_fail = self._generate_block(start, end, writer)
+                success_count += block_success
+                fail_count += block_fail
                 
-                # 每10个用户显示一次进度
-                if i % 10 == 0 or i == total_users:
-                    progress = (i / total_users) * 100
-                    logger.info(f"进度: {i}/{total_users} ({progress:.1f}%) | 成功: {success_count} | 失败: {fail_count}")
+                progress = (end / total_users) * 100
+                logger.info(f"进度: {end}/{total_users} ({progress:.1f}%) | 成功: {success_count} | 失败: {fail_count}")
             
-            except Exception as e:
-                fail_count += 1
-                logger.error(f"❌ 用户 {user_id} 失败: 异常 - {str(e)}")
+            writer.flush()
+        
+        if swap:
+            if success_count > 0:
+                with self.metrics.span('write'):
+                    writer.swap_staging()
+            else:
+                logger.error("没有任何用户生成推荐，保留原 recommend_result 不替换")
+        
+        self.metrics.counters.update({'users': total_users, 'success': success_count, 'fail': fail_count})
         
         logger.info("=" * 60)
         logger.info(f"推荐生成完成！")
         logger.info(f"  总用户数: {total_users}")
-        logger.info(f"  成功: {success_count}")
+        logger.info(f"  成功: {success_count}（其中兜底推荐 {int(self.metrics.counters.get('fallback', 0))}）")
         logger.info(f"  失败: {fail_count}")
         logger.info(f"  成功率: {(success_count/total_users)*100:.1f}%")
         logger.info("=" * 60)
     
-    def generate_recommendations_incremental(self, hours=1):
+    def _generate_block(self, start: int, end: int, writer: RecommendResultWriter) -> Tuple[int, int]:
         """
-        增量更新推荐（只更新有新行为的用户）
+        为评分矩阵行号区间 [start, end) 的用户整块打分（一次 R_block · S），结果交给写入器缓冲
         
-        Args:
-            hours: 查询最近N小时有行为的用户
+        Returns:
+            (success_count, fail_count)
         """
-        logger.info(f"开始增量更新推荐（最近 {hours} 小时有行为的用户）...")
+        user_ids = self.users[start:end]
+        try:
+            with self.metrics.span('score', rows=len(user_ids)):
+                results = self._score_users(np.arange(start, end), self.config.TOP_N_RECOMMEND)
+        except Exception as e:
+            logger.error(f"❌ 用户 {user_ids[0]} ~ {user_ids[-1]} 打分失败: 异常 - {str(e)}")
+            return 0, len(user_ids)
         
-        # 1. 查询最近有行为的用户
-        active_users = self._get_active_users(hours)
+        success_count = 0
+        for user_id, recommendations in zip(user_ids, results):
+            if self._add_user_result(user_id, recommendations, writer):
+                success_count += 1
         
-        if not active_users:
-            logger.info("没有活跃用户，跳过增量更新")
-            return
+        return success_count, len(user_ids) - success_count
+    
+    def _add_user_result(self, user_id: str, recommendations: List[Tuple[str, float]],
+                         writer: RecommendResultWriter) -> bool:
+        """
+        把单个用户的协同过滤结果交给写入器缓冲，没有结果时改用兜底推荐
         
-        logger.info(f"发现 {len(active_users)} 个活跃用户")
+        Returns:
+            是否成功
+        """
+        if recommendations:
+            writer.add(user_id, recommendations)
+            return True
         
-        # 2. 构建评分矩阵（全量，因为相似度需要全局计算）
-        if not self.build_rating_matrix():
-            return
+        # 协同过滤没有结果：热门/分类热门兜底（失败原因可用 test 命令单独查看）
+        try:
+            recommendations, reason = self.recommend_fallback(user_id)
+        except Exception as e:
+            logger.error(f"❌ 用户 {user_id} 兜底推荐失败: 异常 - {str(e)}")
+            return False
         
-        if not self.calculate_similarity():
-            return
+        if recommendations:
+            writer.add(user_id, recommendations, reason=reason)
+            self.metrics.counters['fallback'] = self.metrics.counters.get('fallback', 0) + 1
+            return True
+        
+        return False
+    
+    def _generate_parallel(self, model_path: Optional[str], workers: int, staging: bool) -> Tuple[int, int]:
+        """
+        多进程全量生成：按用户行号分片，交给进程池处理
+        
+        各进程以只读内存映射方式加载同一个模型目录（共享页缓存），
+        任务本身只传递行号区间，不会为每个任务序列化评分矩阵或近邻索引
+        
+        Args:
+            model_path: 模型目录；为空时先把当前模型保存到临时目录
+            workers: 进程数
+            staging: 各进程是否写入影子表
+        
+        Returns:
+            (success_count, fail_count)
+        """
+        temp_dir = None
+        if not model_path:
+            temp_dir = tempfile.mkdtemp(prefix='recommend-model-')
+            model_path = os.path.join(temp_dir, 'model')
+            self.save_model(model_path)
+        
+        total_users = len(self.users)
+        shard_size = self.config.WORKER_SHARD_SIZE
+        shards = [(start, min(start + shard_size, total_users)) for start in range(0, total_users, shard_size)]
+        
+        logger.info(f"启动 {workers} 个进程，共 {len(shards)} 个分片（每片 {shard_size} 个用户）")
         
-        # 3. 只为活跃用户生成推荐
+        processed = 0
         success_count = 0
         fail_count = 0
         
-        for i, user_id in enumerate(active_users, 1):
-            try:
-                recommendations = self.recommend_for_user(user_id)
-                if recommendations:
-                    self.save_recommendations_to_db(user_id, recommendations)
-                    success_count += 1
-                else:
-                    fail_count += 1
-                
-                if i % 10 == 0 or i == len(active_users):
-                    progress = (i / len(active_users)) * 100
-                    logger.info(f"进度: {i}/{len(active_users)} ({progress:.1f}%) | 成功: {success_count} | 失败: {fail_count}")
-            
-            except Exception as e:
-                fail_count += 1
-                logger.error(f"为用户 {user_id} 生成推荐失败: {e}")
+        try:
+            context = multiprocessing.get_context('spawn')
+            with context.Pool(workers, initializer=_init_worker, initargs=(model_path, staging)) as pool:
+                for shard_success, shard_fail, shard_stages, shard_counters in pool.imap_unordered(_generate_shard, shards):
+                    self.metrics.merge(shard_stages, shard_counters)
+                    processed += shard_success + shard_fail
+                    success_count += shard_success
+                    fail_count += shard_fail
+                    progress = (processed / total_users) * 100
+                    logger.info(f"进度: {processed}/{total_users} ({progress:.1f}%) | 成功: {success_count} | 失败: {fail_count}")
+        finally:
+            if temp_dir:
+                shutil.rmtree(temp_dir, ignore_errors=True)
+        
+        return success_count, fail_count
+    
+    def generate_recommendations_incremental(self, hours=1, state_path: Optional[str] = None):
+        """
+        增量更新推荐（只更新水位线之后有新行为的用户）
+        
+        首次运行（没有增量状态）时先全量构建，并为最近N小时有行为的用户生成推荐；
+        之后每次只重新聚合新行为用户的评分、更新受影响物品的近邻，再为这些用户打分
+        
+        Args:
+            hours: 首次运行时查询最近N小时有行为的用户
+            state_path: 增量状态目录（默认使用配置 INCREMENTAL_STATE_PATH）
+        """
+        logger.info("开始增量更新推荐...")
+        
+        engine = IncrementalEngine(self, state_path)
+        success_count, fail_count = engine.run(hours)
+        self.metrics.counters.update({'success': success_count, 'fail': fail_count})
         
         logger.info("=" * 60)
         logger.info(f"增量更新完成！")
-        logger.info(f"  活跃用户数: {len(active_users)}")
+        logger.info(f"  水位线: {engine.watermark}")
         logger.info(f"  成功: {success_count}")
         logger.info(f"  失败: {fail_count}")
         logger.info("=" * 60)
@@ -331,31 +737,22 @@ class ItemCFRecommender:
         """
         try:
             # 1. 检查用户是否在评分矩阵中
-            if user_id not in self.user_ids:
+            user_idx = self.users.get(user_id)
+            if user_idx is None:
                 logger.warning(f"❌ 用户 {user_id} 失败: 用户不在评分矩阵中（没有任何行为数据）")
                 return
             
             # 2. 获取用户的交互数据
-            user_idx = self.user_ids.index(user_id)
-            user_ratings = self.rating_matrix.iloc[user_idx]
-            interacted_items = user_ratings[user_ratings > 0].index.tolist()
+            interacted_idx = self.rating_matrix[user_idx].indices
+            interacted_items = self.resources.decode(interacted_idx)
             interacted_count = len(interacted_items)
             
             if interacted_count == 0:
                 logger.warning(f"❌ 用户 {user_id} 失败: 交互资源数=0（评分矩阵中没有正值）")
                 return
             
-            # 3. 检查交互资源的相似度情况
-            similar_items_count = 0
-            for item_id in interacted_items:
-                if item_id in self.similarity_matrix.index:
-                    # 获取与该资源相似的物品（排除自己）
-                    similarities = self.similarity_matrix[item_id]
-                    similar_items = similarities[
-                        (similarities.index != item_id) & 
-                        (similarities >= self.config.SIMILARITY_THRESHOLD)
-                    ]
-                    similar_items_count += len(similar_items)
+            # 3. 检查交互资源的相似度情况（近邻索引已排除自己并过滤低相似度）
+            similar_items_count = int(self.neighbor_index.neighbor_counts()[interacted_idx].sum())
             
             if similar_items_count == 0:
                 logger.warning(
@@ -365,7 +762,7 @@ class ItemCFRecommender:
                 logger.warning(f"   交互的资源ID: {interacted_items[:5]}{'...' if len(interacted_items) > 5 else ''}")
             else:
                 # 4. 检查是否所有候选资源都已被用户交互过
-                candidate_count = len(self.resource_ids) - interacted_count
+                candidate_count = len(self.resources) - interacted_count
                 logger.warning(
                     f"❌ 用户 {user_id} 失败: 交互资源数={interacted_count}, "
                     f"找到 {similar_items_count} 个相似物品，但可能都已被用户交互过"
@@ -378,16 +775,73 @@ class ItemCFRecommender:
     def get_statistics(self) -> Dict:
         """获取推荐系统统计信息"""
         stats = {
-            "total_users": len(self.user_ids),
-            "total_resources": len(self.resource_ids),
+            "total_users": len(self.users),
+            "total_resources": len(self.resources),
             "matrix_sparsity": 0.0,
             "avg_interactions_per_user": 0.0
         }
         
-        if self.rating_matrix is not None and not self.rating_matrix.empty:
+        if self.rating_matrix is not None and self.rating_matrix.nnz > 0:
             total_cells = self.rating_matrix.shape[0] * self.rating_matrix.shape[1]
-            non_zero_cells = (self.rating_matrix > 0).sum().sum()
+            non_zero_cells = self.rating_matrix.nnz
             stats["matrix_sparsity"] = 1 - (non_zero_cells / total_cells)
             stats["avg_interactions_per_user"] = non_zero_cells / self.rating_matrix.shape[0]
         
         return stats
+
+
+# 进程池工作进程内的推荐器（每个进程在初始化时加载一次模型）
+_worker_recommender = None
+_worker_staging = False
+_worker_model_path = None
+
+
+def _init_worker(model_path: str, staging: bool):
+    """
+    进程池初始化：以只读内存映射方式加载模型
+    
+    加载失败时不在这里抛异常（初始化函数异常会让进程池不断重启工作进程、主进程一直等待），
+    而是留空推荐器，由 _generate_shard 抛出异常交给主进程
+    """
+    global _worker_recommender, _worker_staging, _worker_model_path
+    _worker_model_path = model_path
+    _worker_staging = staging
+    
+    recommender = ItemCFRecommender()
+    if not recommender.load_model(model_path):
+        logger.error(f"工作进程加载模型失败: {model_path}")
+        return
+    recommender.build_fallback()
+    _worker_recommender = recommender
+
+
+def _generate_shard(bounds: Tuple[int, int]) -> Tuple[int, int, Dict, Dict]:
+    """
+    处理一个用户分片
+    
+    Args:
+        bounds: 用户行号区间 [start, end)
+    
+    Returns:
+        (success_count, fail_count, 本分片的阶段指标, 本分片的计数)
+    """
+    if _worker_recommender is None:
+        raise RuntimeError(f"工作进程模型加载失败: {_worker_model_path}")
+    
+    start, end = bounds
+    success_count = 0
+    fail_count = 0
+    block_size = _worker_recommender.config.SCORING_BLOCK_SIZE
+    
+    # 每个分片单独统计，交给主进程合并
+    _worker_recommender.metrics = StageMetrics()
+    with RecommendResultWriter(_worker_recommender.engine, staging=_worker_staging,
+                               cache=_worker_recommender.cache, metrics=_worker_recommender.metrics) as writer:
+        for block_start in range(start, end, block_size):
+            block_success, block_fail = _worker_recommender._generate_block(
+                block_start, min(block_start + block_size, end), writer
+            )
+            success_count += block_success
+            fail_count += block_fail
+    
+    return success_count, fail_count, _worker_recommender.metrics.stages, _worker_recommender.metrics.counters
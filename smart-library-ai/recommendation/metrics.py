@@ -0,0 +1,199 @@
+"""
+运行指标 - 按阶段记录耗时、处理行数和峰值内存
+
+阶段（span）可以多次进入，耗时、行数、次数累加，峰值内存取最大值：
+- fetch: 读取行为表
+- aggregate: 归一化并合并为 (用户, 资源, 评分)
+- pivot: 评分表转换为稀疏矩阵
+- similarity: 构建近邻索引
+- score: 为用户打分
+- write: 写入 recommend_result（和 Redis 缓存）
+
+运行结束后输出 JSON 报告，也可以输出 Prometheus textfile collector 格式
+（node_exporter --collector.textfile.directory），夜间任务变慢时能直接看出是哪个阶段
+
+@author JacoryCyJin
+@date 2025/04/11
+"""
+import json
+import logging
+import os
+import resource
+import sys
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, Optional
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def peak_rss_mb() -> float:
+    """进程峰值常驻内存（MB，getrusage 高水位）"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 单位为 KB，macOS 为字节
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+class StageSpan:
+    """一次进入阶段时的句柄，可在阶段内补充处理行数"""
+
+    def __init__(self, rows: int = 0):
+        self.rows = rows
+
+
+class StageMetrics:
+    """按阶段累计的运行指标"""
+
+    # Prometheus 指标名前缀
+    METRIC_PREFIX = 'smart_library_recommend'
+
+    def __init__(self):
+        self.stages: Dict[str, Dict] = {}  # 阶段名 -> {seconds, calls, rows, peak_rss_mb, rss_growth_mb}
+        self.counters: Dict[str, float] = {}  # 运行结果计数（成功/失败用户数等）
+        self.started_at = time.time()
+        self._started = time.perf_counter()
+
+    @contextmanager
+    def span(self, name: str, rows: int = 0) -> Iterator[StageSpan]:
+        """
+        记录一次阶段执行
+
+        Args:
+            name: 阶段名
+            rows: 处理行数（也可以在阶段内设置 span.rows）
+        """
+        handle = StageSpan(rows)
+        peak_before = peak_rss_mb()
+        started = time.perf_counter()
+        try:
+            yield handle
+        finally:
+            self._record(name, time.perf_counter() - started, handle.rows, peak_before)
+
+    def iterate(self, name: str, chunks: Iterable) -> Iterator:
+        """
+        逐块迭代并把每次取块的耗时计入阶段（用于分块读取，块内处理不计入）
+
+        Args:
+            name: 阶段名
+            chunks: 块迭代器（DataFrame 等支持 len 的对象）
+        """
+        iterator = iter(chunks)
+        while True:
+            with self.span(name) as handle:
+                try:
+                    chunk = next(iterator)
+                except StopIteration:
+                    return
+                handle.rows = len(chunk)
+            yield chunk
+
+    def _record(self, name: str, seconds: float, rows: int, peak_before: float):
+        """累加一次阶段执行"""
+        stage = self.stages.setdefault(name, {
+            'seconds': 0.0, 'calls': 0, 'rows': 0, 'peak_rss_mb': 0.0, 'rss_growth_mb': 0.0
+        })
+        peak_after = peak_rss_mb()
+        stage['seconds'] += seconds
+        stage['calls'] += 1
+        stage['rows'] += int(rows)
+        stage['peak_rss_mb'] = max(stage['peak_rss_mb'], peak_after)
+        # 本阶段把进程峰值内存抬高了多少（定位内存峰值出现在哪个阶段）
+        stage['rss_growth_mb'] += peak_after - peak_before
+
+    def merge(self, stages: Dict[str, Dict], counters: Optional[Dict[str, float]] = None):
+        """
+        合并其他进程的阶段指标（多进程生成时各工作进程返回）
+
+        耗时、次数、行数、计数累加（耗时为各进程之和），峰值内存取最大值
+        """
+        for name, value in (counters or {}).items():
+            self.counters[name] = self.counters.get(name, 0) + value
+
+        for name, other in stages.items():
+            stage = self.stages.setdefault(name, {
+                'seconds': 0.0, 'calls': 0, 'rows': 0, 'peak_rss_mb': 0.0, 'rss_growth_mb': 0.0
+            })
+            stage['seconds'] += other['seconds']
+            stage['calls'] += other['calls']
+            stage['rows'] += other['rows']
+            stage['peak_rss_mb'] = max(stage['peak_rss_mb'], other['peak_rss_mb'])
+            stage['rss_growth_mb'] = max(stage['rss_growth_mb'], other['rss_growth_mb'])
+
+    def report(self, action: Optional[str] = None) -> Dict:
+        """
+        汇总报告
+
+        Args:
+            action: 运行的命令（generate / incremental / build-model 等）
+        """
+        return {
+            'action': action,
+            'started_at': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self.started_at)),
+            'wall_seconds': time.perf_counter() - self._started,
+            'peak_rss_mb': peak_rss_mb(),
+            'counters': dict(self.counters),
+            'stages': {name: dict(stage) for name, stage in self.stages.items()}
+        }
+
+    def log_summary(self):
+        """输出各阶段耗时"""
+        logger.info(f"{'阶段':<12} {'耗时(秒)':>10} {'次数':>8} {'行数':>12} {'峰值内存(MB)':>14}")
+        for name, stage in self.stages.items():
+            logger.info(f"{name:<12} {stage['seconds']:>10.3f} {stage['calls']:>8} "
+                        f"{stage['rows']:>12} {stage['peak_rss_mb']:>14.1f}")
+
+    def write_json(self, path: str, action: Optional[str] = None):
+        """写入 JSON 报告"""
+        self._write_atomic(path, json.dumps(self.report(action), ensure_ascii=False, indent=2))
+        logger.info(f"运行指标已写入 {path}")
+
+    def write_prometheus(self, path: str, action: Optional[str] = None):
+        """
+        写入 Prometheus textfile collector 格式（先写临时文件再替换，避免采集到写了一半的文件）
+
+        Args:
+            path: 输出文件，需以 .prom 结尾并位于 node_exporter 的 textfile 目录
+            action: 作为 action 标签
+        """
+        report = self.report(action)
+        prefix = self.METRIC_PREFIX
+        action_label = f'action="{action or ""}"'
+        lines = []
+
+        def gauge(name: str, help_text: str, samples):
+            lines.append(f"# HELP {prefix}_{name} {help_text}")
+            lines.append(f"# TYPE {prefix}_{name} gauge")
+            for labels, value in samples:
+                lines.append(f"{prefix}_{name}{{{labels}}} {value}")
+
+        stage_labels = [(f'{action_label},stage="{name}"', stage) for name, stage in report['stages'].items()]
+        gauge('stage_seconds', 'Wall time spent in the stage during the last run.',
+              [(labels, stage['seconds']) for labels, stage in stage_labels])
+        gauge('stage_calls', 'Number of times the stage was entered during the last run.',
+              [(labels, stage['calls']) for labels, stage in stage_labels])
+        gauge('stage_rows', 'Rows processed by the stage during the last run.',
+              [(labels, stage['rows']) for labels, stage in stage_labels])
+        gauge('stage_peak_rss_bytes', 'Process peak RSS at the end of the stage.',
+              [(labels, int(stage['peak_rss_mb'] * 1024 * 1024)) for labels, stage in stage_labels])
+        gauge('run_seconds', 'Wall time of the last run.', [(action_label, report['wall_seconds'])])
+        gauge('run_peak_rss_bytes', 'Process peak RSS of the last run.',
+              [(action_label, int(report['peak_rss_mb'] * 1024 * 1024))])
+        gauge('run_timestamp_seconds', 'Unix time the last run started.', [(action_label, int(self.started_at))])
+        if report['counters']:
+            gauge('run_count', 'Result counters of the last run.',
+                  [(f'{action_label},name="{name}"', value) for name, value in report['counters'].items()])
+
+        self._write_atomic(path, '\n'.join(lines) + '\n')
+        logger.info(f"Prometheus 指标已写入 {path}")
+
+    @staticmethod
+    def _write_atomic(path: str, content: str):
+        """写入临时文件后原子替换"""
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{path}.tmp-{os.getpid()}"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(content)
+        os.replace(tmp_path, path)
@@ -0,0 +1,182 @@
+"""
+物品 Top-K 近邻索引 - 稀疏 K-NN 图
+
+每个物品只保存相似度最高的 K 个近邻（且不低于相似度阈值），
+以 CSR 风格的三个数组存储：indptr / indices / scores，内存 O(N·K)
+
+@author JacoryCyJin
+@date 2025/04/11
+"""
+import logging
+import os
+from typing import Optional, Tuple
+import numpy as np
+from scipy.sparse import csr_matrix
+from sklearn.preprocessing import normalize
+from sparse_ops import csr_row_ids, replace_csr_rows, top_n_per_row
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class ItemNeighborIndex:
+    """物品 Top-K 近邻索引"""
+
+    def __init__(self, indptr: np.ndarray, indices: np.ndarray, scores: np.ndarray):
+        """
+        Args:
+            indptr: 长度 N+1，第 i 个物品的近邻为 indices[indptr[i]:indptr[i+1]]
+            indices: 近邻物品的列号（int32）
+            scores: 对应的相似度，每个物品内按降序排列（float32）
+        """
+        self.indptr = indptr
+        self.indices = indices
+        self.scores = scores
+        self.n_items = len(indptr) - 1
+
+        # 共享同一组数组的 CSR 视图（不复制），用于矩阵乘法打分
+        self.matrix = csr_matrix(
+            (self.scores, self.indices, self.indptr),
+            shape=(self.n_items, self.n_items)
+        )
+
+    @classmethod
+    def build(cls, item_matrix: csr_matrix, top_k: int, threshold: float,
+              block_size: int = 1024) -> 'ItemNeighborIndex':
+        """
+        分块计算余弦相似度并构建 Top-K 近邻索引
+
+        每次只计算 block_size 个物品与全部物品的相似度，取完 Top-K 即丢弃，
+        全程不会出现 N × N 的中间结果
+
+        Args:
+            item_matrix: 物品 × 用户 的稀疏评分矩阵
+            top_k: 每个物品保留的近邻数量
+            threshold: 相似度阈值
+            block_size: 每块物品数
+        """
+        n_items = item_matrix.shape[0]
+
+        # 行向量单位化后，点积即余弦相似度
+        normalized = normalize(item_matrix.tocsr().astype(np.float64), norm='l2', axis=1)
+        normalized_t = normalized.T.tocsr()
+
+        counts = np.zeros(n_items, dtype=np.int64)
+        indices_parts = []
+        scores_parts = []
+
+        for start in range(0, n_items, block_size):
+            end = min(start + block_size, n_items)
+            block = (normalized[start:end] @ normalized_t).tocsr()
+
+            rows = csr_row_ids(block)
+            cols = block.indices.astype(np.int64)
+            sims = block.data
+
+            # 排除自己，过滤低相似度
+            keep = (cols != rows + start) & (sims >= threshold)
+            block_indptr, block_cols, block_sims = top_n_per_row(
+                rows[keep], cols[keep], sims[keep], end - start, top_k
+            )
+
+            counts[start:end] = np.diff(block_indptr)
+            indices_parts.append(block_cols.astype(np.int32))
+            scores_parts.append(block_sims.astype(np.float32))
+
+        indptr = np.zeros(n_items + 1, dtype=np.int64)
+        np.cumsum(counts, out=indptr[1:])
+        indices = np.concatenate(indices_parts) if indices_parts else np.zeros(0, dtype=np.int32)
+        scores = np.concatenate(scores_parts) if scores_parts else np.zeros(0, dtype=np.float32)
+
+        logger.info(f"近邻索引构建完成: {n_items} 个物品, {len(indices)} 条近邻边 (K={top_k})")
+
+        return cls(indptr, indices, scores)
+
+    @staticmethod
+    def compute_rows(cooccurrence: csr_matrix, sq_norms: np.ndarray, rows: np.ndarray,
+                     top_k: int, threshold: float) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        由共现点积矩阵 G = RᵀR 重新计算指定物品的近邻
+
+        sim(i, j) = G[i, j] / (‖i‖ · ‖j‖)，其中 ‖i‖² = G[i, i]
+
+        Args:
+            cooccurrence: 物品 × 物品 的共现点积矩阵（CSR）
+            sq_norms: 每个物品向量的平方范数
+            rows: 需要重新计算的物品列号（升序）
+            top_k: 每个物品保留的近邻数量
+            threshold: 相似度阈值
+
+        Returns:
+            (indptr, indices, scores)，与 rows 对齐的 CSR 风格结果
+        """
+        block = cooccurrence[rows]
+        block_rows = csr_row_ids(block)
+        cols = block.indices.astype(np.int64)
+
+        norms = np.sqrt(sq_norms)
+        denominator = norms[rows][block_rows] * norms[cols]
+        sims = np.zeros(len(cols), dtype=np.float64)
+        np.divide(block.data, denominator, out=sims, where=denominator > 0)
+
+        keep = (cols != rows[block_rows]) & (sims >= threshold)
+        return top_n_per_row(block_rows[keep], cols[keep], sims[keep], len(rows), top_k)
+
+    def replace_rows(self, rows: np.ndarray, row_indptr: np.ndarray, row_indices: np.ndarray,
+                     row_scores: np.ndarray, n_items: Optional[int] = None) -> 'ItemNeighborIndex':
+        """
+        用新结果替换部分物品的近邻，返回新的索引（其余物品的近邻原样保留）
+
+        Args:
+            rows: 被替换的物品列号（升序）
+            row_indptr / row_indices / row_scores: 与 rows 对齐的 CSR 风格新近邻
+            n_items: 新的物品总数（有新物品加入时大于当前数量）
+        """
+        indptr, (indices, scores) = replace_csr_rows(
+            np.asarray(self.indptr), (np.asarray(self.indices), np.asarray(self.scores)),
+            rows, row_indptr,
+            (row_indices.astype(np.int32, copy=False), row_scores.astype(np.float32, copy=False)),
+            n_rows=n_items or self.n_items
+        )
+        return ItemNeighborIndex(indptr, indices, scores)
+
+    def neighbors(self, item_idx: int) -> Tuple[np.ndarray, np.ndarray]:
+        """获取物品的近邻（按相似度降序）: (列号数组, 相似度数组)"""
+        start, end = self.indptr[item_idx], self.indptr[item_idx + 1]
+        return self.indices[start:end], self.scores[start:end]
+
+    def neighbor_counts(self) -> np.ndarray:
+        """每个物品的近邻数量"""
+        return np.diff(self.indptr)
+
+    @property
+    def nnz(self) -> int:
+        """近邻边总数"""
+        return len(self.indices)
+
+    def save(self, directory: str):
+        """
+        保存为 .npy 文件（neighbor_indptr / neighbor_indices / neighbor_scores）
+
+        Args:
+            directory: 模型目录（需已存在）
+        """
+        np.save(os.path.join(directory, 'neighbor_indptr.npy'), np.asarray(self.indptr))
+        np.save(os.path.join(directory, 'neighbor_indices.npy'), np.asarray(self.indices))
+        np.save(os.path.join(directory, 'neighbor_scores.npy'), np.asarray(self.scores))
+
+    @classmethod
+    def load(cls, directory: str, mmap_mode: Optional[str] = 'r') -> 'ItemNeighborIndex':
+        """
+        从模型目录加载近邻索引
+
+        Args:
+            directory: 模型目录
+            mmap_mode: 传给 np.load，默认 'r' 以只读内存映射方式打开，
+                       多个进程共享同一份页缓存；None 表示读入内存
+        """
+        return cls(
+            np.load(os.path.join(directory, 'neighbor_indptr.npy'), mmap_mode=mmap_mode),
+            np.load(os.path.join(directory, 'neighbor_indices.npy'), mmap_mode=mmap_mode),
+            np.load(os.path.join(directory, 'neighbor_scores.npy'), mmap_mode=mmap_mode)
+        )
@@ -0,0 +1,75 @@
+"""
+行为分数归一化器 - 把原始行为值（浏览次数、评分等）向量化映射为 0-1 分数
+
+新的归一化曲线只需继承 ScoreNormalizer 并用 @register_normalizer 注册，
+然后在配置中按名称选用（BROWSE_NORMALIZER / COMMENT_NORMALIZER）
+
+@author JacoryCyJin
+@date 2025/04/11
+"""
+from typing import Dict, Type
+import numpy as np
+
+
+class ScoreNormalizer:
+    """归一化器基类"""
+
+    # 注册名称（配置中使用）
+    name = None
+
+    def __init__(self, scale: float):
+        """
+        Args:
+            scale: 满分对应的原始值（如浏览次数上限、评分满分）
+        """
+        self.scale = float(scale)
+
+    def __call__(self, values: np.ndarray) -> np.ndarray:
+        """对整列原始值归一化"""
+        raise NotImplementedError
+
+
+NORMALIZERS: Dict[str, Type[ScoreNormalizer]] = {}
+
+
+def register_normalizer(cls: Type[ScoreNormalizer]) -> Type[ScoreNormalizer]:
+    """注册归一化器（类装饰器）"""
+    NORMALIZERS[cls.name] = cls
+    return cls
+
+
+def create_normalizer(name: str, scale: float) -> ScoreNormalizer:
+    """
+    按名称创建归一化器
+
+    Args:
+        name: 注册名称
+        scale: 满分对应的原始值
+    """
+    if name not in NORMALIZERS:
+        raise ValueError(f"未知的归一化器: {name}（可选: {', '.join(sorted(NORMALIZERS))}）")
+    return NORMALIZERS[name](scale)
+
+
+@register_normalizer
+class LogNormalizer(ScoreNormalizer):
+    """对数归一化: log(1 + min(x, scale)) / log(1 + scale)，平滑极端值"""
+
+    name = 'log'
+
+    def __init__(self, scale: float):
+        super().__init__(scale)
+        self._denominator = np.log1p(self.scale)
+
+    def __call__(self, values: np.ndarray) -> np.ndarray:
+        return np.log1p(np.clip(values, 0, self.scale)) / self._denominator
+
+
+@register_normalizer
+class LinearNormalizer(ScoreNormalizer):
+    """线性归一化: x / scale"""
+
+    name = 'linear'
+
+    def __call__(self, values: np.ndarray) -> np.ndarray:
+        return np.asarray(values, dtype=np.float64) / self.scale
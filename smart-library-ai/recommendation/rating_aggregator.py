@@ -1,14 +1,27 @@
 """
 评分聚合器 - 将浏览、收藏、评分融合为统一评分
 
+配置 DECAY_HALF_LIFE_DAYS 后按行为时间指数衰减：每条行为的评分乘以
+2^(-(as_of - 行为时间) / 半衰期)，越久以前的行为权重越低。as_of 为评分矩阵的基准时间，
+全量聚合时取当前时间并随模型保存；增量聚合沿用模型的基准时间，
+因此未变化用户的评分行不需要重新读取——随时间推移所有评分同比例衰减，
+对余弦相似度和每个用户的推荐排序都没有影响
+
 @author JacoryCyJin
 @date 2025/04/11
 """
 import logging
-from typing import Dict, List, Tuple
+from datetime import datetime
+from typing import Iterator, List, Optional, Tuple, Union
+import numpy as np
 import pandas as pd
-from sqlalchemy import create_engine, text
+from scipy.sparse import coo_matrix, csr_matrix
+from sqlalchemy import bindparam, create_engine, text
+from sqlalchemy.engine import Engine
 from config import RecommendConfig
+from normalizers import ScoreNormalizer, create_normalizer
+from metrics import StageMetrics
+from id_encoder import IdEncoder
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -17,110 +30,315 @@ logger = logging.getLogger(__name__)
 class RatingAggregator:
     """评分聚合器"""
     
-    def __init__(self):
+    def __init__(self, browse_normalizer: Optional[ScoreNormalizer] = None,
+                 comment_normalizer: Optional[ScoreNormalizer] = None,
+                 engine: Optional[Engine] = None, metrics: Optional[StageMetrics] = None,
+                 half_life_days: Optional[float] = None, keep_event_time: bool = False):
+        """
+        Args:
+            browse_normalizer: 浏览次数归一化器（默认按配置 BROWSE_NORMALIZER 创建）
+            comment_normalizer: 评分归一化器（默认按配置 COMMENT_NORMALIZER 创建）
+            engine: 数据库引擎（默认按配置连接 MySQL）
+            metrics: 阶段指标（记录 fetch / aggregate / pivot 阶段）
+            half_life_days: 行为时间衰减的半衰期（天，默认使用配置 DECAY_HALF_LIFE_DAYS，0 表示不衰减）
+            keep_event_time: aggregate_ratings 是否额外返回每个 (用户, 资源) 最近一次行为的时间
+                             （event_time 列，离线评估按时间切分训练/测试集时使用）
+        """
         self.config = RecommendConfig()
-        self.engine = create_engine(self.config.get_db_url())
+        self.engine = engine or create_engine(self.config.get_db_url())
+        self.metrics = metrics or StageMetrics()
+        self.half_life_days = self.config.DECAY_HALF_LIFE_DAYS if half_life_days is None else half_life_days
+        self.as_of: Optional[datetime] = None  # 时间衰减的基准时间（全量聚合时确定）
+        self.keep_event_time = keep_event_time
+        self.browse_normalizer = browse_normalizer or \
+            create_normalizer(self.config.BROWSE_NORMALIZER, self.config.MAX_BROWSE_COUNT)
+        self.comment_normalizer = comment_normalizer or \
+            create_normalizer(self.config.COMMENT_NORMALIZER, self.config.COMMENT_SCORE_SCALE)
     
-    def fetch_browse_data(self) -> pd.DataFrame:
-        """获取浏览历史数据"""
-        query = """
-        SELECT user_id, resource_id, view_count
+    def fetch_browse_data(self, chunksize: Optional[int] = None) -> Union[pd.DataFrame, Iterator[pd.DataFrame]]:
+        """
+        获取浏览历史数据
+        
+        Args:
+            chunksize: 指定时使用服务端游标分块读取，返回 DataFrame 迭代器
+        """
+        query = f"""
+        SELECT user_id, resource_id, view_count{self._event_time_column('mtime')}
         FROM user_browse_history
         WHERE view_count > 0
         """
+        if chunksize:
+            return self._read_sql_chunks(query, chunksize)
         df = pd.read_sql(query, self.engine)
         logger.info(f"获取浏览数据: {len(df)} 条记录")
         return df
     
-    def fetch_favorite_data(self) -> pd.DataFrame:
-        """获取收藏数据"""
-        query = """
-        SELECT user_id, resource_id, 1 as is_favorited
+    def fetch_favorite_data(self, chunksize: Optional[int] = None) -> Union[pd.DataFrame, Iterator[pd.DataFrame]]:
+        """
+        获取收藏数据
+        
+        Args:
+            chunksize: 指定时使用服务端游标分块读取，返回 DataFrame 迭代器
+        """
+        query = f"""
+        SELECT user_id, resource_id, 1 as is_favorited{self._event_time_column('ctime')}
         FROM user_favorite
         """
+        if chunksize:
+            return self._read_sql_chunks(query, chunksize)
         df = pd.read_sql(query, self.engine)
         logger.info(f"获取收藏数据: {len(df)} 条记录")
         return df
     
-    def fetch_comment_data(self) -> pd.DataFrame:
-        """获取评分数据"""
-        query = """
-        SELECT user_id, resource_id, score
+    def fetch_comment_data(self, chunksize: Optional[int] = None) -> Union[pd.DataFrame, Iterator[pd.DataFrame]]:
+        """
+        获取评分数据
+        
+        Args:
+            chunksize: 指定时使用服务端游标分块读取，返回 DataFrame 迭代器
+        """
+        query = f"""
+        SELECT user_id, resource_id, score{self._event_time_column('mtime')}
         FROM comment
         WHERE score > 0 AND deleted = 0 AND audit_status = 1
         """
+        if chunksize:
+            return self._read_sql_chunks(query, chunksize)
         df = pd.read_sql(query, self.engine)
         logger.info(f"获取评分数据: {len(df)} 条记录")
         return df
     
+    @property
+    def decay_enabled(self) -> bool:
+        """是否按行为时间衰减"""
+        return self.half_life_days > 0
+    
+    def _event_time_column(self, column: str) -> str:
+        """开启时间衰减或需要保留行为时间时额外查询的行为时间列"""
+        return f", {column} AS event_time" if self.decay_enabled or self.keep_event_time else ""
+    
+    def _rating_columns(self) -> List[str]:
+        """单种行为转换后保留的列"""
+        columns = ['user_id', 'resource_id', 'rating']
+        return columns + ['event_time'] if self.keep_event_time else columns
+    
+    def _decay_weights(self, df: pd.DataFrame) -> Union[np.ndarray, float]:
+        """
+        整列计算时间衰减系数 2^(-(as_of - 行为时间) / 半衰期)
+        
+        行为时间为空时按基准时间计（系数 1）；基准时间之后的行为（增量聚合）系数大于 1
+        """
+        if not self.decay_enabled or 'event_time' not in df:
+            return 1.0
+        
+        if self.as_of is None:
+            self.as_of = datetime.now().replace(microsecond=0)
+        
+        age_seconds = (pd.Timestamp(self.as_of) - pd.to_datetime(df['event_time'])).dt.total_seconds()
+        age_days = age_seconds.fillna(0.0).to_numpy(dtype=np.float64) / 86400.0
+        return np.exp2(-age_days / self.half_life_days)
+    
+    def decay_scale(self, now: Optional[datetime] = None) -> float:
+        """
+        把基准时间的评分换算到当前时间的系数（不衰减或尚未聚合时为 1）
+        
+        所有评分同比例换算，只影响推荐分数的数值，不影响排序
+        """
+        if not self.decay_enabled or self.as_of is None:
+            return 1.0
+        
+        age_days = ((now or datetime.now()) - self.as_of).total_seconds() / 86400.0
+        return float(np.exp2(-age_days / self.half_life_days))
+    
+    def _read_sql_chunks(self, query: str, chunksize: int) -> Iterator[pd.DataFrame]:
+        """
+        使用服务端游标（stream_results）分块读取查询结果
+        
+        结果集不会一次性拉到客户端，内存占用只与 chunksize 有关
+        """
+        with self.engine.connect().execution_options(stream_results=True) as conn:
+            for chunk in pd.read_sql(text(query), conn, chunksize=chunksize):
+                yield chunk
+    
     def normalize_browse_score(self, view_count: int) -> float:
         """
-        归一化浏览次数为 0-1 分数
-        使用对数函数平滑处理，避免极端值
+        归一化浏览次数为 0-1 分数（单个值，批量计算见 _browse_ratings）
+        默认使用对数函数平滑处理，避免极端值
         """
-        import math
-        # 使用对数函数: log(1 + x) / log(1 + max)
-        normalized = math.log(1 + min(view_count, self.config.MAX_BROWSE_COUNT)) / \
-                     math.log(1 + self.config.MAX_BROWSE_COUNT)
-        return normalized
+        return float(self.browse_normalizer(np.array([view_count], dtype=np.float64))[0])
     
     def normalize_comment_score(self, score: float) -> float:
-        """归一化评分为 0-1 分数"""
-        return score / self.config.COMMENT_SCORE_SCALE
+        """归一化评分为 0-1 分数（单个值，批量计算见 _comment_ratings）"""
+        return float(self.comment_normalizer(np.array([score], dtype=np.float64))[0])
     
     def aggregate_ratings(self) -> pd.DataFrame:
         """
         聚合所有行为数据为统一评分矩阵
         
         Returns:
-            DataFrame with columns: user_id, resource_id, rating
+            DataFrame with columns: user_id, resource_id, rating（keep_event_time 时另有 event_time）
         """
         logger.info("开始聚合评分数据...")
+        self._reset_as_of()
         
         # 1. 获取原始数据
-        browse_df = self.fetch_browse_data()
-        favorite_df = self.fetch_favorite_data()
-        comment_df = self.fetch_comment_data()
+        with self.metrics.span('fetch') as span:
+            browse_df = self.fetch_browse_data()
+            favorite_df = self.fetch_favorite_data()
+            comment_df = self.fetch_comment_data()
+            span.rows = len(browse_df) + len(favorite_df) + len(comment_df)
         
-        # 2. 归一化浏览数据
-        if not browse_df.empty:
-            browse_df['normalized_score'] = browse_df['view_count'].apply(self.normalize_browse_score)
-            browse_df['rating'] = browse_df['normalized_score'] * self.config.WEIGHT_BROWSE
-            browse_df = browse_df[['user_id', 'resource_id', 'rating']]
+        with self.metrics.span('aggregate') as span:
+            rating_matrix = self._combine_ratings(browse_df, favorite_df, comment_df)
+            span.rows = len(rating_matrix)
         
-        # 3. 处理收藏数据（收藏即为满分）
-        if not favorite_df.empty:
-            favorite_df['rating'] = self.config.WEIGHT_FAVORITE
-            favorite_df = favorite_df[['user_id', 'resource_id', 'rating']]
+        if rating_matrix.empty:
+            logger.warning("没有任何评分数据！")
+            return rating_matrix
         
-        # 4. 归一化评分数据
-        if not comment_df.empty:
-            comment_df['normalized_score'] = comment_df['score'].apply(self.normalize_comment_score)
-            comment_df['rating'] = comment_df['normalized_score'] * self.config.WEIGHT_COMMENT
-            comment_df = comment_df[['user_id', 'resource_id', 'rating']]
+        logger.info(f"聚合完成: {len(rating_matrix)} 条评分记录")
+        logger.info(f"涉及用户数: {rating_matrix['user_id'].nunique()}")
+        logger.info(f"涉及资源数: {rating_matrix['resource_id'].nunique()}")
         
-        # 5. 合并所有数据
+        return rating_matrix
+    
+    def _reset_as_of(self):
+        """全量聚合前以当前时间作为新的衰减基准时间"""
+        if self.decay_enabled:
+            self.as_of = datetime.now().replace(microsecond=0)
+            logger.info(f"按行为时间衰减评分: 半衰期 {self.half_life_days} 天, 基准时间 {self.as_of}")
+    
+    def _combine_ratings(self, browse_df: pd.DataFrame, favorite_df: pd.DataFrame,
+                         comment_df: pd.DataFrame) -> pd.DataFrame:
+        """三种行为归一化后合并，同一用户对同一资源的多种行为累加"""
         all_ratings = []
+        
+        # 归一化浏览数据
         if not browse_df.empty:
-            all_ratings.append(browse_df)
+            all_ratings.append(self._browse_ratings(browse_df))
+        
+        # 处理收藏数据（收藏即为满分）
         if not favorite_df.empty:
-            all_ratings.append(favorite_df)
+            all_ratings.append(self._favorite_ratings(favorite_df))
+        
+        # 归一化评分数据
         if not comment_df.empty:
-            all_ratings.append(comment_df)
+            all_ratings.append(self._comment_ratings(comment_df))
+        
+        if not all_ratings:
+            return pd.DataFrame(columns=self._rating_columns())
+        
+        rating_df = pd.concat(all_ratings, ignore_index=True)
+        if self.keep_event_time:
+            rating_df['event_time'] = pd.to_datetime(rating_df['event_time'])
+            return rating_df.groupby(['user_id', 'resource_id'], as_index=False).agg(
+                rating=('rating', 'sum'), event_time=('event_time', 'max')
+            )
+        return rating_df.groupby(['user_id', 'resource_id'], as_index=False)['rating'].sum()
+    
+    def aggregate_ratings_for_users(self, user_ids: List[str], batch_size: int = 1000) -> pd.DataFrame:
+        """
+        只聚合指定用户的评分（按用户ID分批查询，不扫描整张行为表）
+        
+        时间衰减沿用已有的基准时间（as_of），与评分矩阵中其他用户的评分可以直接比较
+        
+        Args:
+            user_ids: 用户ID列表
+            batch_size: 每次查询的用户数
+        
+        Returns:
+            DataFrame with columns: user_id, resource_id, rating
+        """
+        queries = [
+            (f"""
+            SELECT user_id, resource_id, view_count{self._event_time_column('mtime')}
+            FROM user_browse_history
+            WHERE view_count > 0 AND user_id IN :user_ids
+            """, self._browse_ratings),
+            (f"""
+            SELECT user_id, resource_id, 1 as is_favorited{self._event_time_column('ctime')}
+            FROM user_favorite
+            WHERE user_id IN :user_ids
+            """, self._favorite_ratings),
+            (f"""
+            SELECT user_id, resource_id, score{self._event_time_column('mtime')}
+            FROM comment
+            WHERE score > 0 AND deleted = 0 AND audit_status = 1 AND user_id IN :user_ids
+            """, self._comment_ratings),
+        ]
+        
+        all_ratings = []
+        with self.engine.connect() as conn:
+            for start in range(0, len(user_ids), batch_size):
+                params = {"user_ids": list(user_ids[start:start + batch_size])}
+                for query, to_ratings in queries:
+                    sql = text(query).bindparams(bindparam("user_ids", expanding=True))
+                    df = pd.read_sql(sql, conn, params=params)
+                    if not df.empty:
+                        all_ratings.append(to_ratings(df))
         
         if not all_ratings:
-            logger.warning("没有任何评分数据！")
             return pd.DataFrame(columns=['user_id', 'resource_id', 'rating'])
         
-        # 6. 合并并求和（同一用户对同一资源的多种行为累加）
-        rating_matrix = pd.concat(all_ratings, ignore_index=True)
-        rating_matrix = rating_matrix.groupby(['user_id', 'resource_id'], as_index=False)['rating'].sum()
+        rating_df = pd.concat(all_ratings, ignore_index=True)
+        return rating_df.groupby(['user_id', 'resource_id'], as_index=False)['rating'].sum()
+    
+    def _browse_ratings(self, browse_df: pd.DataFrame) -> pd.DataFrame:
+        """浏览记录 -> (user_id, resource_id, rating)，整列向量化归一化"""
+        view_counts = browse_df['view_count'].to_numpy(dtype=np.float64)
+        browse_df['rating'] = self.browse_normalizer(view_counts) * self.config.WEIGHT_BROWSE * self._decay_weights(browse_df)
+        return browse_df[self._rating_columns()]
+    
+    def _favorite_ratings(self, favorite_df: pd.DataFrame) -> pd.DataFrame:
+        """收藏记录 -> (user_id, resource_id, rating)"""
+        favorite_df['rating'] = self.config.WEIGHT_FAVORITE * self._decay_weights(favorite_df)
+        return favorite_df[self._rating_columns()]
+    
+    def _comment_ratings(self, comment_df: pd.DataFrame) -> pd.DataFrame:
+        """评分记录 -> (user_id, resource_id, rating)，整列向量化归一化"""
+        scores = comment_df['score'].to_numpy(dtype=np.float64)
+        comment_df['rating'] = self.comment_normalizer(scores) * self.config.WEIGHT_COMMENT * self._decay_weights(comment_df)
+        return comment_df[self._rating_columns()]
+    
+    def aggregate_ratings_streaming(self, chunksize: Optional[int] = None) -> 'SparseRatingAccumulator':
+        """
+        流式聚合评分：三张行为表分块读取，每块折叠进稀疏累加器
         
-        logger.info(f"聚合完成: {len(rating_matrix)} 条评分记录")
-        logger.info(f"涉及用户数: {rating_matrix['user_id'].nunique()}")
-        logger.info(f"涉及资源数: {rating_matrix['resource_id'].nunique()}")
+        峰值内存由 chunksize 和最终的非零评分数决定，与行为表的总行数无关
         
-        return rating_matrix
+        Args:
+            chunksize: 每块行数（默认使用配置 INGEST_CHUNK_SIZE）
+        
+        Returns:
+            累加完成的 SparseRatingAccumulator
+        """
+        chunksize = chunksize or self.config.INGEST_CHUNK_SIZE
+        logger.info(f"开始流式聚合评分数据（每块 {chunksize} 行）...")
+        self._reset_as_of()
+        
+        accumulator = SparseRatingAccumulator()
+        sources = [
+            ("浏览", self.fetch_browse_data, self._browse_ratings),
+            ("收藏", self.fetch_favorite_data, self._favorite_ratings),
+            ("评分", self.fetch_comment_data, self._comment_ratings),
+        ]
+        
+        for name, fetch, to_ratings in sources:
+            row_count = 0
+            for chunk in self.metrics.iterate('fetch', fetch(chunksize=chunksize)):
+                if chunk.empty:
+                    continue
+                row_count += len(chunk)
+                with self.metrics.span('aggregate', rows=len(chunk)):
+                    ratings = to_ratings(chunk)
+                    accumulator.add(ratings['user_id'], ratings['resource_id'], ratings['rating'].to_numpy(dtype=np.float64))
+            logger.info(f"获取{name}数据: {row_count} 条记录")
+        
+        logger.info(f"聚合完成: {accumulator.nnz} 条评分记录")
+        logger.info(f"涉及用户数: {len(accumulator.users)}")
+        logger.info(f"涉及资源数: {len(accumulator.resources)}")
+        
+        return accumulator
     
     def get_user_item_matrix(self) -> Tuple[pd.DataFrame, List[str], List[str]]:
         """
@@ -148,3 +366,150 @@ class RatingAggregator:
         logger.info(f"评分矩阵维度: {matrix.shape[0]} 用户 × {matrix.shape[1]} 资源")
         
         return matrix, user_ids, resource_ids
+    
+    def get_sparse_user_item_matrix(self, streaming: Optional[bool] = None) -> Tuple[csr_matrix, IdEncoder, IdEncoder]:
+        """
+        构建稀疏用户-物品评分矩阵（CSR 格式）
+        
+        行列顺序与 get_user_item_matrix 一致（ID 升序），但只存储非零评分，
+        内存与评分记录数成正比，而不是 用户数 × 资源数
+        
+        Args:
+            streaming: 是否流式分块读取（默认使用配置 STREAMING_INGEST）
+        
+        Returns:
+            (matrix, users, resources)
+            users / resources 为用户ID/资源ID 与 行号/列号 之间的编码器
+        """
+        if streaming is None:
+            streaming = self.config.STREAMING_INGEST
+        
+        if streaming:
+            accumulator = self.aggregate_ratings_streaming()
+            with self.metrics.span('pivot') as span:
+                result = accumulator.to_csr()
+                span.rows = result[0].nnz
+            matrix = result[0]
+            if matrix.nnz > 0:
+                density = matrix.nnz / (matrix.shape[0] * matrix.shape[1])
+                logger.info(f"稀疏评分矩阵维度: {matrix.shape[0]} 用户 × {matrix.shape[1]} 资源, "
+                            f"非零元素: {matrix.nnz} (密度 {density:.4%})")
+            return result
+        
+        return self.build_sparse_matrix(self.aggregate_ratings())
+    
+    def build_sparse_matrix(self, rating_df: pd.DataFrame) -> Tuple[csr_matrix, IdEncoder, IdEncoder]:
+        """
+        把聚合后的评分表转换为稀疏评分矩阵（ID 升序）
+        
+        Args:
+            rating_df: 评分数据 (user_id, resource_id, rating)
+        
+        Returns:
+            (matrix, users, resources)
+        """
+        if rating_df.empty:
+            return csr_matrix((0, 0), dtype=np.float64), IdEncoder(), IdEncoder()
+        
+        with self.metrics.span('pivot') as span:
+            # 将字符串 ID 编码为连续整数（排序后编码，保证行列顺序稳定）
+            users, user_codes = IdEncoder.fit(rating_df['user_id'])
+            resources, resource_codes = IdEncoder.fit(rating_df['resource_id'])
+            
+            matrix = csr_matrix(
+                (rating_df['rating'].to_numpy(dtype=np.float64), (user_codes, resource_codes)),
+                shape=(len(users), len(resources))
+            )
+            matrix.sum_duplicates()
+            matrix.eliminate_zeros()
+            span.rows = matrix.nnz
+        
+        density = matrix.nnz / (matrix.shape[0] * matrix.shape[1])
+        logger.info(f"稀疏评分矩阵维度: {matrix.shape[0]} 用户 × {matrix.shape[1]} 资源, "
+                    f"非零元素: {matrix.nnz} (密度 {density:.4%})")
+        
+        return matrix, users, resources
+
+
+class SparseRatingAccumulator:
+    """
+    稀疏评分累加器
+    
+    逐块接收 (user_id, resource_id, rating)，把字符串 ID 编码为递增整数，
+    以 COO 三元组缓存；待合并的三元组超过阈值时压缩一次（相同位置求和），
+    因此内存上限约为 非零评分数 + 阈值，而不是原始行数
+    """
+    
+    def __init__(self, compact_threshold: int = 1_000_000):
+        """
+        Args:
+            compact_threshold: 待合并三元组达到该数量时压缩
+        """
+        self.compact_threshold = compact_threshold
+        self.users = IdEncoder()  # 用户ID 编码（按首次出现顺序）
+        self.resources = IdEncoder()  # 资源ID 编码（按首次出现顺序）
+        
+        self._rows = np.zeros(0, dtype=np.int32)
+        self._cols = np.zeros(0, dtype=np.int32)
+        self._data = np.zeros(0, dtype=np.float64)
+        self._pending = []
+        self._pending_count = 0
+    
+    def add(self, user_ids: pd.Series, resource_ids: pd.Series, ratings: np.ndarray):
+        """折叠一块评分"""
+        if len(ratings) == 0:
+            return
+        
+        rows = self.users.encode_or_add(user_ids)
+        cols = self.resources.encode_or_add(resource_ids)
+        self._pending.append((rows, cols, np.asarray(ratings, dtype=np.float64)))
+        self._pending_count += len(ratings)
+        
+        if self._pending_count >= self.compact_threshold:
+            self._compact()
+    
+    def _compact(self):
+        """合并待处理三元组，相同 (用户, 资源) 的评分求和"""
+        if not self._pending:
+            return
+        
+        rows = np.concatenate([self._rows] + [p[0] for p in self._pending])
+        cols = np.concatenate([self._cols] + [p[1] for p in self._pending])
+        data = np.concatenate([self._data] + [p[2] for p in self._pending])
+        self._pending = []
+        self._pending_count = 0
+        
+        shape = (len(self.users), len(self.resources))
+        merged = coo_matrix((data, (rows, cols)), shape=shape).tocsr().tocoo()
+        self._rows = merged.row.astype(np.int32)
+        self._cols = merged.col.astype(np.int32)
+        self._data = merged.data
+    
+    @property
+    def nnz(self) -> int:
+        """非零评分数"""
+        self._compact()
+        return len(self._data)
+    
+    def to_csr(self) -> Tuple[csr_matrix, IdEncoder, IdEncoder]:
+        """
+        输出 CSR 评分矩阵，行列按 ID 升序重新编号（与非流式结果一致）
+        
+        Returns:
+            (matrix, users, resources)
+        """
+        self._compact()
+        
+        if len(self._data) == 0:
+            return csr_matrix((0, 0), dtype=np.float64), IdEncoder(), IdEncoder()
+        
+        users, user_remap = self.users.sorted()
+        resources, resource_remap = self.resources.sorted()
+        
+        matrix = csr_matrix(
+            (self._data, (user_remap[self._rows], resource_remap[self._cols])),
+            shape=(len(users), len(resources))
+        )
+        matrix.eliminate_zeros()
+        
+        return matrix, users, resources
@@ -6,7 +6,10 @@
 """
 import argparse
 import logging
+from config import RecommendConfig
 from item_cf import ItemCFRecommender
+from recommend_cache import RecommendationStore
+from ann_index import ann_report
 
 logging.basicConfig(
     level=logging.INFO,
@@ -17,21 +20,43 @@ logger = logging.getLogger(__name__)
 
 def main():
     parser = argparse.ArgumentParser(description='Smart Library 协同过滤推荐系统')
-    parser.add_argument('action', choices=['generate', 'incremental', 'stats', 'test'],
-                       help='操作类型: generate-全量生成 / incremental-增量更新 / stats-统计信息 / test-测试推荐')
-    parser.add_argument('--user-id', type=str, help='测试推荐时指定用户ID')
+    parser.add_argument('action', choices=['generate', 'incremental', 'stats', 'test', 'build-model', 'show', 'serve', 'ann-report'],
+                       help='操作类型: generate-全量生成 / incremental-增量更新 / stats-统计信息 / test-测试推荐 / '
+                            'build-model-构建并保存模型 / show-查看已生成的推荐（优先读 Redis 缓存） / '
+                            'serve-启动在线推荐服务 / ann-report-对比 LSH 近似近邻与精确近邻的召回率和耗时')
+    parser.add_argument('--user-id', type=str, help='测试推荐或查看推荐时指定用户ID')
     parser.add_argument('--top-n', type=int, default=10, help='推荐数量')
     parser.add_argument('--hours', type=int, default=1, help='增量更新时查询最近N小时的活跃用户')
+    parser.add_argument('--model', type=str, default=None,
+                       help='模型目录: build-model 时为输出目录（默认 MODEL_PATH），'
+                            'generate/stats/test 时加载该模型，不再从数据库重新计算')
+    parser.add_argument('--workers', type=int, default=1, help='全量生成时的并行进程数（默认 1，单进程）')
+    parser.add_argument('--no-swap', action='store_true',
+                       help='全量生成时直接写入 recommend_result，不使用影子表原子替换')
+    parser.add_argument('--host', type=str, default=None, help='在线服务监听地址（默认 SERVICE_HOST）')
+    parser.add_argument('--port', type=int, default=None, help='在线服务监听端口（默认 SERVICE_PORT）')
+    parser.add_argument('--metrics-output', type=str, default=None,
+                       help='generate/incremental/build-model 结束后写入分阶段指标 JSON（默认 METRICS_REPORT_PATH）')
+    parser.add_argument('--prometheus-textfile', type=str, default=None,
+                       help='同时写入 Prometheus textfile collector 格式（.prom，默认 METRICS_TEXTFILE_PATH）')
     
     args = parser.parse_args()
     
+    if args.action == 'serve':
+        # 服务自行加载模型，不需要下面的推荐器
+        from server import run_server
+        run_server(args.model, args.host, args.port)
+        return
+    
     recommender = ItemCFRecommender()
     
     if args.action == 'generate':
         logger.info("=" * 60)
         logger.info("开始全量生成推荐...")
         logger.info("=" * 60)
-        recommender.generate_recommendations_for_all_users()
+        recommender.generate_recommendations_for_all_users(
+            args.model, args.workers, swap=False if args.no_swap else None
+        )
         logger.info("=" * 60)
         logger.info("推荐生成完成！")
         logger.info("=" * 60)
@@ -45,10 +70,22 @@ def main():
         logger.info("增量更新完成！")
         logger.info("=" * 60)
     
+    elif args.action == 'build-model':
+        model_path = args.model or RecommendConfig.MODEL_PATH
+        logger.info("=" * 60)
+        logger.info(f"构建推荐模型 -> {model_path}")
+        logger.info("=" * 60)
+        if recommender.prepare():
+            recommender.save_model(model_path)
+        logger.info("=" * 60)
+    
     elif args.action == 'stats':
         logger.info("=" * 60)
-        logger.info("构建评分矩阵...")
-        recommender.build_rating_matrix()
+        if args.model:
+            recommender.load_model(args.model)
+        else:
+            logger.info("构建评分矩阵...")
+            recommender.build_rating_matrix()
         
         stats = recommender.get_statistics()
         logger.info("=" * 60)
@@ -68,8 +105,8 @@ def main():
         logger.info(f"为用户 {args.user_id} 生成测试推荐...")
         logger.info("=" * 60)
         
-        recommender.build_rating_matrix()
-        recommender.calculate_similarity()
+        if not recommender.prepare(args.model):
+            return
         
         recommendations = recommender.recommend_for_user(args.user_id, args.top_n)
         
@@ -79,8 +116,63 @@ def main():
                 logger.info(f"  {i}. 资源ID: {resource_id}, 预测评分: {score:.4f}")
         else:
             logger.warning("没有生成推荐结果")
+            recommender._log_failure_reason(args.user_id)
         
         logger.info("=" * 60)
+    
+    elif args.action == 'ann-report':
+        logger.info("=" * 60)
+        if not recommender.build_rating_matrix():
+            return
+        
+        report = ann_report(
+            recommender.rating_matrix.T.tocsr(),
+            top_k=RecommendConfig.TOP_N_SIMILAR,
+            threshold=RecommendConfig.SIMILARITY_THRESHOLD,
+            block_size=RecommendConfig.SIMILARITY_BLOCK_SIZE
+        )
+        logger.info("=" * 60)
+        logger.info("LSH 近似近邻 vs 精确近邻:")
+        logger.info(f"  资源数: {report['n_items']}")
+        logger.info(f"  近邻边数: 精确 {report['exact_edges']} / LSH {report['approx_edges']}")
+        logger.info(f"  召回率: {report['recall']:.2%}（按资源平均 {report['mean_item_recall']:.2%}）")
+        logger.info(f"  耗时: 精确 {report['exact_seconds']:.2f} 秒 / LSH {report['lsh_seconds']:.2f} 秒")
+        logger.info("=" * 60)
+    
+    elif args.action == 'show':
+        if not args.user_id:
+            logger.error("查看推荐需要指定 --user-id 参数")
+            return
+        
+        store = RecommendationStore(recommender.engine, recommender.cache)
+        recommendations = store.get_recommendations(args.user_id, args.top_n)
+        
+        logger.info("=" * 60)
+        if recommendations:
+            logger.info(f"用户 {args.user_id} 的推荐 (Top {len(recommendations)}):")
+            for i, (resource_id, score) in enumerate(recommendations, 1):
+                logger.info(f"  {i}. 资源ID: {resource_id}, 推荐分数: {score:.4f}")
+        else:
+            logger.warning(f"用户 {args.user_id} 没有推荐结果")
+        logger.info("=" * 60)
+    
+    if args.action in ('generate', 'incremental', 'build-model'):
+        write_metrics(recommender, args)
+
+
+def write_metrics(recommender: ItemCFRecommender, args):
+    """输出本次运行的分阶段指标"""
+    recommender.metrics.log_summary()
+    
+    report_path = args.metrics_output or RecommendConfig.METRICS_REPORT_PATH
+    textfile_path = args.prometheus_textfile or RecommendConfig.METRICS_TEXTFILE_PATH
+    try:
+        if report_path:
+            recommender.metrics.write_json(report_path, args.action)
+        if textfile_path:
+            recommender.metrics.write_prometheus(textfile_path, args.action)
+    except OSError as e:
+        logger.error(f"写入运行指标失败: {e}")
 
 
 if __name__ == '__main__':
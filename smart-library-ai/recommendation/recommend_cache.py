@@ -0,0 +1,251 @@
+"""
+推荐结果缓存 - 每个用户的 Top-N 存为 Redis 有序集合
+
+key: {CACHE_KEY_PREFIX}{user_id}（默认 recommend:user:<user_id>），member 为资源ID，score 为推荐分数，
+过期时间 CACHE_EXPIRE_SECONDS。生成推荐时随 recommend_result 一起按批流水线写入，
+读取时优先查缓存，未命中回退到 recommend_result 并回填缓存
+
+Redis 为可选依赖：未安装、未启用或连接失败时只记录警告，推荐生成和读取照常走数据库。
+写入失败的用户记入待失效列表（同时追加到 CACHE_STALE_FILE，跨进程、跨运行保留），
+这些用户的 key 里可能还是旧推荐；之后每次写入前（间隔 CACHE_RETRY_SECONDS）先尝试删除这些 key，
+删除成功后恢复正常写入，读取方回退到数据库拿到新结果
+
+@author JacoryCyJin
+@date 2025/04/11
+"""
+import logging
+import os
+import time
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from config import RecommendConfig
+
+try:
+    import redis
+except ImportError:  # 未安装 redis 时不使用缓存
+    redis = None
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class RecommendCache:
+    """推荐结果 Redis 缓存"""
+
+    INVALIDATE_BATCH_SIZE = 1000  # 恢复时每条 DEL 命令删除的 key 数
+
+    def __init__(self, client, expire_seconds: Optional[int] = None, key_prefix: Optional[str] = None,
+                 stale_file: Optional[str] = None, retry_seconds: Optional[float] = None):
+        """
+        Args:
+            client: redis.Redis 兼容的客户端（需 decode_responses=True，测试时可传入 fakeredis）
+            expire_seconds: 过期时间（默认使用配置 CACHE_EXPIRE_SECONDS）
+            key_prefix: key 前缀（默认使用配置 CACHE_KEY_PREFIX）
+            stale_file: 待失效用户文件（默认使用配置 CACHE_STALE_FILE，空字符串表示只保存在内存）
+            retry_seconds: 写入失败后再次尝试的间隔（默认使用配置 CACHE_RETRY_SECONDS）
+        """
+        self.client = client
+        self.expire_seconds = expire_seconds or RecommendConfig.CACHE_EXPIRE_SECONDS
+        self.key_prefix = key_prefix or RecommendConfig.CACHE_KEY_PREFIX
+        self.stale_file = RecommendConfig.CACHE_STALE_FILE if stale_file is None else stale_file
+        self.retry_seconds = RecommendConfig.CACHE_RETRY_SECONDS if retry_seconds is None else retry_seconds
+
+        # 缓存可能落后于数据库的用户（写入或删除失败），恢复前不再写入新值
+        self.stale_users: Set[str] = set(self._load_stale_users())
+        self.retry_at = 0.0
+
+    @classmethod
+    def from_config(cls) -> Optional['RecommendCache']:
+        """按配置创建缓存，未启用或未安装 redis 时返回 None"""
+        if not RecommendConfig.CACHE_ENABLED:
+            return None
+
+        if redis is None:
+            logger.warning("未安装 redis，跳过推荐结果缓存")
+            return None
+
+        client = redis.Redis(
+            host=RecommendConfig.REDIS_HOST,
+            port=RecommendConfig.REDIS_PORT,
+            db=RecommendConfig.REDIS_DB,
+            password=RecommendConfig.REDIS_PASSWORD or None,
+            socket_timeout=RecommendConfig.CACHE_SOCKET_TIMEOUT,
+            socket_connect_timeout=RecommendConfig.CACHE_SOCKET_TIMEOUT,
+            decode_responses=True
+        )
+        return cls(client)
+
+    def key(self, user_id: str) -> str:
+        """用户推荐列表的 key"""
+        return f"{self.key_prefix}{user_id}"
+
+    def write_many(self, recommendations: Dict[str, List[Tuple[str, float]]]) -> bool:
+        """
+        流水线批量写入多个用户的推荐（覆盖旧值并重置过期时间）
+
+        有待失效的用户时先尝试删除它们的 key；Redis 仍不可用时这批用户也记入待失效列表
+
+        Args:
+            recommendations: {user_id: [(resource_id, score), ...]}
+
+        Returns:
+            是否写入成功
+        """
+        if not recommendations:
+            return False
+
+        if self.stale_users and not self.recover():
+            self._mark_stale(recommendations.keys())
+            return False
+
+        try:
+            pipe = self.client.pipeline(transaction=False)
+            for user_id, items in recommendations.items():
+                key = self.key(user_id)
+                pipe.delete(key)
+                if items:
+                    pipe.zadd(key, {resource_id: float(score) for resource_id, score in items})
+                    pipe.expire(key, self.expire_seconds)
+            pipe.execute()
+            return True
+        except Exception as e:
+            self._mark_stale(recommendations.keys())
+            logger.warning(f"写入推荐缓存失败，{len(self.stale_users)} 个用户的缓存待 Redis 恢复后删除: {e}")
+            return False
+
+    def recover(self, force: bool = False) -> bool:
+        """
+        删除待失效用户的 key（Redis 恢复后调用）
+
+        Args:
+            force: 忽略重试间隔立即尝试
+
+        Returns:
+            是否已没有待失效的用户
+        """
+        if not self.stale_users:
+            return True
+        if not force and time.monotonic() < self.retry_at:
+            return False
+
+        # 其他进程（并行生成的工作进程）可能也追加了待失效用户
+        self.stale_users.update(self._load_stale_users())
+        stale_users = list(self.stale_users)
+        try:
+            pipe = self.client.pipeline(transaction=False)
+            for start in range(0, len(stale_users), self.INVALIDATE_BATCH_SIZE):
+                pipe.delete(*[self.key(user_id) for user_id in stale_users[start:start + self.INVALIDATE_BATCH_SIZE]])
+            pipe.execute()
+        except Exception as e:
+            self.retry_at = time.monotonic() + self.retry_seconds
+            logger.warning(f"删除待失效的推荐缓存失败，{self.retry_seconds:g} 秒后重试: {e}")
+            return False
+
+        self.stale_users.clear()
+        if self.stale_file and os.path.exists(self.stale_file):
+            os.remove(self.stale_file)
+        logger.info(f"Redis 已恢复，删除了 {len(stale_users)} 个用户的过期推荐缓存")
+        return True
+
+    def _mark_stale(self, user_ids: Iterable[str]):
+        """记录缓存可能落后于数据库的用户，并推迟下一次尝试"""
+        new_users = [user_id for user_id in user_ids if user_id not in self.stale_users]
+        self.stale_users.update(new_users)
+        self.retry_at = time.monotonic() + self.retry_seconds
+
+        if not self.stale_file or not new_users:
+            return
+        try:
+            with open(self.stale_file, 'a', encoding='utf-8') as f:
+                f.writelines(f"{user_id}\n" for user_id in new_users)
+        except OSError as e:
+            logger.warning(f"记录待失效用户失败 ({self.stale_file}): {e}")
+
+    def _load_stale_users(self) -> List[str]:
+        """读取之前运行（或其他进程）记录的待失效用户"""
+        if not self.stale_file or not os.path.exists(self.stale_file):
+            return []
+        with open(self.stale_file, encoding='utf-8') as f:
+            return [line.strip() for line in f if line.strip()]
+
+    def read(self, user_id: str, top_n: int) -> Optional[List[Tuple[str, float]]]:
+        """
+        读取用户推荐（按分数降序）
+
+        Returns:
+            推荐列表；未命中、缓存待失效或 Redis 不可用时返回 None
+        """
+        if user_id in self.stale_users:
+            return None
+
+        try:
+            items = self.client.zrevrange(self.key(user_id), 0, top_n - 1, withscores=True)
+        except Exception as e:
+            logger.warning(f"读取推荐缓存失败: {e}")
+            return None
+
+        return [(resource_id, float(score)) for resource_id, score in items] or None
+
+    def invalidate(self, user_ids: Iterable[str]):
+        """删除用户的缓存（失败时记入待失效列表）"""
+        user_ids = list(user_ids)
+        if not user_ids:
+            return
+
+        try:
+            self.client.delete(*[self.key(user_id) for user_id in user_ids])
+        except Exception as e:
+            self._mark_stale(user_ids)
+            logger.warning(f"删除推荐缓存失败，待 Redis 恢复后重试: {e}")
+
+
+class RecommendationStore:
+    """推荐结果读取接口：优先读 Redis 缓存，未命中回退到 recommend_result"""
+
+    def __init__(self, engine: Engine, cache: Optional[RecommendCache] = None):
+        """
+        Args:
+            engine: 数据库引擎
+            cache: 推荐缓存（None 表示只读数据库）
+        """
+        self.engine = engine
+        self.cache = cache
+
+    def get_recommendations(self, user_id: str, top_n: Optional[int] = None) -> List[Tuple[str, float]]:
+        """
+        获取用户推荐
+
+        Args:
+            user_id: 用户ID
+            top_n: 返回数量（默认使用配置 TOP_N_RECOMMEND）
+
+        Returns:
+            推荐列表 [(resource_id, score), ...]
+        """
+        top_n = top_n or RecommendConfig.TOP_N_RECOMMEND
+
+        if self.cache is not None:
+            cached = self.cache.read(user_id, top_n)
+            if cached is not None:
+                return cached
+
+        recommendations = self._read_from_db(user_id)
+
+        # 回填用户的全部推荐（而不是本次的 top_n 条），之后更大 top_n 的读取命中缓存时不会被截断
+        if recommendations and self.cache is not None:
+            self.cache.write_many({user_id: recommendations})
+
+        return recommendations[:top_n]
+
+    def _read_from_db(self, user_id: str) -> List[Tuple[str, float]]:
+        """从 recommend_result 读取用户的全部推荐（生成时每个用户只写入 Top-N）"""
+        query = text("""
+            SELECT resource_id, score
+            FROM recommend_result
+            WHERE user_id = :user_id
+            ORDER BY score DESC
+        """)
+        with self.engine.connect() as conn:
+            rows = conn.execute(query, {"user_id": user_id})
+            return [(row[0], float(row[1])) for row in rows]
@@ -0,0 +1,196 @@
+"""
+推荐结果批量写入器 - 跨用户缓冲，批量写入 recommend_result
+
+两种模式：
+1. 直接写入：每次刷新时在一个事务内先删除这批用户的旧推荐，再批量插入
+2. 影子表写入：全部写入 recommend_result_staging，完成后用 RENAME TABLE
+   原子替换正式表，读取方不会看到写了一半的结果
+
+传入 RecommendCache 时，直接写入模式每批写库成功后同时流水线写入 Redis 缓存；
+影子表模式写入期间不动缓存，RENAME 成功后再按新表重写缓存、删除不在新表中的用户缓存，
+替换失败时缓存不会领先于 recommend_result
+
+@author JacoryCyJin
+@date 2025/04/11
+"""
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import bindparam, text
+from sqlalchemy.engine import Engine
+from config import RecommendConfig
+from recommend_cache import RecommendCache
+from metrics import StageMetrics
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class RecommendResultWriter:
+    """推荐结果批量写入器"""
+
+    RESULT_TABLE = 'recommend_result'
+    STAGING_TABLE = 'recommend_result_staging'
+    OLD_TABLE = 'recommend_result_old'
+
+    DEFAULT_REASON = '基于协同过滤'
+
+    def __init__(self, engine: Engine, batch_size: Optional[int] = None, staging: bool = False,
+                 cache: Optional[RecommendCache] = None, metrics: Optional[StageMetrics] = None):
+        """
+        Args:
+            engine: 数据库引擎
+            batch_size: 缓冲多少行后写入一次（默认使用配置 WRITE_BATCH_SIZE）
+            staging: 是否写入影子表（需先调用 prepare_staging，完成后调用 swap_staging）
+            cache: 推荐缓存（None 表示只写数据库）
+            metrics: 阶段指标（每次刷新计入 write 阶段）
+        """
+        self.engine = engine
+        self.batch_size = batch_size or RecommendConfig.WRITE_BATCH_SIZE
+        self.staging = staging
+        self.table = self.STAGING_TABLE if staging else self.RESULT_TABLE
+        self.cache = cache
+        self.metrics = metrics or StageMetrics()
+
+        self._user_ids = []
+        self._rows = []
+        self._cached: Dict[str, List[Tuple[str, float]]] = {}
+        self.written_users = 0
+        self.written_rows = 0
+
+    def prepare_staging(self):
+        """重建影子表（结构与 recommend_result 相同）"""
+        with self.engine.begin() as conn:
+            conn.execute(text(f"DROP TABLE IF EXISTS {self.STAGING_TABLE}"))
+            conn.execute(text(f"CREATE TABLE {self.STAGING_TABLE} LIKE {self.RESULT_TABLE}"))
+        logger.info(f"已创建影子表 {self.STAGING_TABLE}")
+
+    def add(self, user_id: str, recommendations: List[Tuple[str, float]], reason: str = DEFAULT_REASON):
+        """
+        缓冲一个用户的推荐结果，缓冲行数达到 batch_size 时自动写入
+
+        Args:
+            user_id: 用户ID
+            recommendations: 推荐列表 [(resource_id, score), ...]
+            reason: 推荐理由
+        """
+        if not recommendations:
+            return
+
+        self._user_ids.append(user_id)
+        # 影子表模式在 swap_staging 成功后统一刷新缓存
+        if self.cache is not None and not self.staging:
+            self._cached[user_id] = recommendations
+        for resource_id, score in recommendations:
+            self._rows.append({
+                "user_id": user_id,
+                "resource_id": resource_id,
+                "score": float(score),
+                "reason": reason
+            })
+
+        if len(self._rows) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """把缓冲区写入数据库（一个事务）"""
+        if not self._rows:
+            return
+
+        ctime = datetime.now().replace(microsecond=0)
+        for row in self._rows:
+            row["ctime"] = ctime
+
+        insert_sql = text(f"""
+            INSERT INTO {self.table} (user_id, resource_id, score, reason, ctime)
+            VALUES (:user_id, :resource_id, :score, :reason, :ctime)
+        """)
+
+        with self.metrics.span('write', rows=len(self._rows)):
+            with self.engine.begin() as conn:
+                # 直接写入正式表时，先清空这批用户的旧推荐
+                if not self.staging:
+                    delete_sql = text(f"DELETE FROM {self.table} WHERE user_id IN :user_ids") \
+                        .bindparams(bindparam("user_ids", expanding=True))
+                    for start in range(0, len(self._user_ids), self.batch_size):
+                        conn.execute(delete_sql, {"user_ids": self._user_ids[start:start + self.batch_size]})
+
+                # executemany：PyMySQL 会改写为多行 INSERT
+                for start in range(0, len(self._rows), self.batch_size):
+                    conn.execute(insert_sql, self._rows[start:start + self.batch_size])
+
+            if self._cached:
+                self.cache.write_many(self._cached)
+
+        self.written_users += len(self._user_ids)
+        self.written_rows += len(self._rows)
+        logger.debug(f"已写入 {len(self._user_ids)} 个用户的 {len(self._rows)} 条推荐到 {self.table}")
+
+        self._user_ids = []
+        self._rows = []
+        self._cached = {}
+
+    def swap_staging(self):
+        """用 RENAME TABLE 把影子表原子替换为正式表，同步缓存后删除旧表"""
+        with self.engine.begin() as conn:
+            conn.execute(text(f"DROP TABLE IF EXISTS {self.OLD_TABLE}"))
+            conn.execute(text(
+                f"RENAME TABLE {self.RESULT_TABLE} TO {self.OLD_TABLE}, "
+                f"{self.STAGING_TABLE} TO {self.RESULT_TABLE}"
+            ))
+        logger.info(f"已将 {self.STAGING_TABLE} 替换为 {self.RESULT_TABLE}")
+
+        if self.cache is not None:
+            self._refresh_cache_after_swap()
+
+        with self.engine.begin() as conn:
+            conn.execute(text(f"DROP TABLE {self.OLD_TABLE}"))
+
+    def _refresh_cache_after_swap(self):
+        """
+        替换后同步缓存：按新的 recommend_result 重写缓存，
+        并删除只在旧表中出现的用户的缓存（否则这些用户会一直读到旧推荐直到过期）
+        """
+        refresh_sql = text(f"""
+            SELECT user_id, resource_id, score
+            FROM {self.RESULT_TABLE}
+            ORDER BY user_id, score DESC
+        """)
+        stale_sql = text(f"""
+            SELECT DISTINCT o.user_id
+            FROM {self.OLD_TABLE} o
+            WHERE NOT EXISTS (SELECT 1 FROM {self.RESULT_TABLE} r WHERE r.user_id = o.user_id)
+        """)
+
+        refreshed_users = 0
+        with self.engine.connect().execution_options(stream_results=True) as conn:
+            # 结果按用户排序，逐个用户累积，每 batch_size 行流水线写一次
+            pending: Dict[str, List[Tuple[str, float]]] = {}
+            pending_rows = 0
+            for user_id, resource_id, score in conn.execute(refresh_sql):
+                if user_id not in pending and pending_rows >= self.batch_size:
+                    self.cache.write_many(pending)
+                    refreshed_users += len(pending)
+                    pending = {}
+                    pending_rows = 0
+                pending.setdefault(user_id, []).append((resource_id, float(score)))
+                pending_rows += 1
+            if pending:
+                self.cache.write_many(pending)
+                refreshed_users += len(pending)
+
+        with self.engine.connect() as conn:
+            stale_users = [row[0] for row in conn.execute(stale_sql)]
+        for start in range(0, len(stale_users), self.batch_size):
+            self.cache.invalidate(stale_users[start:start + self.batch_size])
+
+        logger.info(f"已刷新 {refreshed_users} 个用户的推荐缓存，删除 {len(stale_users)} 个不再有推荐的用户缓存")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        # 出现异常时不再写入残留缓冲
+        if exc_type is None:
+            self.flush()
+        return False
@@ -0,0 +1,195 @@
+"""
+在线推荐服务 - 常驻进程，启动时加载一次模型（只读内存映射），提供低延迟 HTTP 接口
+
+GET /recommend/{user_id}?top_n=10    用户推荐（模型构建之后才出现的用户，实时读取其行为打分）
+GET /similar/{resource_id}?top_n=10  相似资源
+GET /session?resource_ids=r1,r2&top_n=10  会话推荐（按最近浏览的资源实时推荐，从近到远排列）
+GET /health                          服务状态和模型信息
+
+模型目录被 build-model / incremental 整体替换后，服务会在 MODEL_RELOAD_INTERVAL 秒内自动重新加载
+
+@author JacoryCyJin
+@date 2025/04/11
+"""
+import asyncio
+import logging
+import os
+import time
+from typing import Optional
+from aiohttp import web
+from config import RecommendConfig
+from item_cf import ItemCFRecommender
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class RecommendService:
+    """在线推荐服务"""
+
+    MAX_TOP_N = 100
+
+    def __init__(self, model_path: Optional[str] = None, reload_interval: Optional[int] = None):
+        """
+        Args:
+            model_path: 模型目录（默认使用配置 MODEL_PATH）
+            reload_interval: 检查模型更新的间隔秒数（默认使用配置 MODEL_RELOAD_INTERVAL，0 表示不检查）
+        """
+        self.config = RecommendConfig()
+        self.model_path = model_path or self.config.MODEL_PATH
+        self.reload_interval = self.config.MODEL_RELOAD_INTERVAL if reload_interval is None else reload_interval
+
+        self.recommender = None
+        self._model_version = None  # meta.json 的修改时间，用于判断模型是否被替换
+
+    def load(self) -> bool:
+        """加载（或重新加载）模型，加载成功后再替换正在使用的推荐器"""
+        version = self._read_model_version()
+        recommender = ItemCFRecommender()
+        if not recommender.load_model(self.model_path):
+            recommender.engine.dispose()
+            return False
+
+        previous, self.recommender = self.recommender, recommender
+        self._model_version = version
+        if previous is not None:
+            previous.engine.dispose()
+        return True
+
+    def create_app(self) -> web.Application:
+        """创建 aiohttp 应用"""
+        app = web.Application()
+        app.router.add_get('/recommend/{user_id}', self.handle_recommend)
+        app.router.add_get('/similar/{resource_id}', self.handle_similar)
+        app.router.add_get('/session', self.handle_session)
+        app.router.add_get('/health', self.handle_health)
+        if self.reload_interval > 0:
+            app.cleanup_ctx.append(self._reload_context)
+        return app
+
+    async def handle_recommend(self, request: web.Request) -> web.Response:
+        """用户推荐"""
+        user_id = request.match_info['user_id']
+        top_n = self._parse_top_n(request, self.config.TOP_N_RECOMMEND)
+        recommender = self.recommender
+
+        if user_id in recommender.users:
+            items = recommender.recommend_for_user(user_id, top_n)
+            source = 'model'
+        else:
+            # 模型中没有该用户：读取其行为（阻塞的数据库查询放到线程池）后实时打分
+            ratings = await asyncio.get_running_loop().run_in_executor(
+                None, recommender.aggregator.aggregate_ratings_for_users, [user_id]
+            )
+            items = recommender.recommend_from_ratings(
+                dict(zip(ratings['resource_id'], ratings['rating'])), top_n
+            )
+            source = 'realtime'
+
+        return web.json_response({
+            'user_id': user_id,
+            'source': source,
+            'items': [{'resource_id': resource_id, 'score': score} for resource_id, score in items]
+        })
+
+    async def handle_similar(self, request: web.Request) -> web.Response:
+        """相似资源"""
+        resource_id = request.match_info['resource_id']
+        top_n = self._parse_top_n(request, self.config.TOP_N_SIMILAR)
+
+        if resource_id not in self.recommender.resources:
+            raise web.HTTPNotFound(text=f"资源 {resource_id} 不在模型中")
+
+        items = self.recommender.get_similar_items(resource_id, top_n)
+        return web.json_response({
+            'resource_id': resource_id,
+            'items': [{'resource_id': similar_id, 'score': score} for similar_id, score in items]
+        })
+
+    async def handle_session(self, request: web.Request) -> web.Response:
+        """会话推荐（匿名用户、新用户）"""
+        resource_ids = [resource_id for resource_id in request.query.get('resource_ids', '').split(',') if resource_id]
+        if not resource_ids:
+            raise web.HTTPBadRequest(text="缺少 resource_ids 参数")
+
+        top_n = self._parse_top_n(request, self.config.TOP_N_RECOMMEND)
+        items = self.recommender.recommend_for_session(resource_ids, top_n)
+        return web.json_response({
+            'resource_ids': resource_ids,
+            'items': [{'resource_id': resource_id, 'score': score} for resource_id, score in items]
+        })
+
+    async def handle_health(self, request: web.Request) -> web.Response:
+        """服务状态和模型信息"""
+        meta = self.recommender.model_meta
+        return web.json_response({
+            'status': 'ok',
+            'model_path': self.model_path,
+            'built_at': meta.get('built_at'),
+            'watermark': meta.get('watermark'),
+            'n_users': len(self.recommender.users),
+            'n_resources': len(self.recommender.resources)
+        })
+
+    def _parse_top_n(self, request: web.Request, default: int) -> int:
+        """解析 top_n 参数"""
+        value = request.query.get('top_n')
+        if value is None:
+            return default
+
+        try:
+            top_n = int(value)
+        except ValueError:
+            raise web.HTTPBadRequest(text=f"top_n 必须是整数: {value}")
+
+        if not 1 <= top_n <= self.MAX_TOP_N:
+            raise web.HTTPBadRequest(text=f"top_n 需在 1-{self.MAX_TOP_N} 之间")
+        return top_n
+
+    async def _reload_context(self, app: web.Application):
+        """应用生命周期内在后台检查模型更新"""
+        task = asyncio.create_task(self._watch_model())
+        yield
+        task.cancel()
+
+    async def _watch_model(self):
+        """模型目录被替换（meta.json 修改时间变化）时在线程池中重新加载"""
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.reload_interval)
+            version = self._read_model_version()
+            if version is None or version == self._model_version:
+                continue
+
+            logger.info("检测到模型更新，重新加载...")
+            started = time.time()
+            if await loop.run_in_executor(None, self.load):
+                logger.info(f"模型重新加载完成，耗时 {time.time() - started:.2f} 秒")
+
+    def _read_model_version(self) -> Optional[int]:
+        """meta.json 的修改时间（纳秒），模型不存在时返回 None"""
+        try:
+            return os.stat(os.path.join(self.model_path, 'meta.json')).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+
+def run_server(model_path: Optional[str] = None, host: Optional[str] = None, port: Optional[int] = None):
+    """
+    启动在线推荐服务
+
+    Args:
+        model_path: 模型目录（默认使用配置 MODEL_PATH）
+        host: 监听地址（默认使用配置 SERVICE_HOST）
+        port: 监听端口（默认使用配置 SERVICE_PORT）
+    """
+    service = RecommendService(model_path)
+    if not service.load():
+        logger.error(f"无法加载模型 {service.model_path}，请先运行 python recommend.py build-model")
+        return
+
+    web.run_app(
+        service.create_app(),
+        host=host or RecommendConfig.SERVICE_HOST,
+        port=port or RecommendConfig.SERVICE_PORT
+    )
@@ -0,0 +1,162 @@
+"""
+稀疏矩阵通用运算 - 推荐打分与近邻索引共用的向量化工具
+
+@author JacoryCyJin
+@date 2025/04/11
+"""
+from typing import Optional, Tuple
+import numpy as np
+from scipy.sparse import csr_matrix
+
+
+def csr_row_ids(matrix: csr_matrix) -> np.ndarray:
+    """返回 CSR 矩阵每个非零元素所在的行号（与 matrix.indices / matrix.data 对齐）"""
+    return np.repeat(np.arange(matrix.shape[0], dtype=np.int64), np.diff(matrix.indptr))
+
+
+def top_n_per_row(rows: np.ndarray, cols: np.ndarray, scores: np.ndarray,
+                  n_rows: int, top_n: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    对 (行, 列, 分数) 三元组按行取 Top-N，整块一次完成，不逐行循环
+
+    同分时按列号升序，与逐个资源遍历后稳定排序的结果一致
+
+    Args:
+        rows: 行号数组
+        cols: 列号数组
+        scores: 分数数组
+        n_rows: 总行数
+        top_n: 每行保留的数量
+
+    Returns:
+        (indptr, cols, scores)，CSR 风格：第 r 行的结果为 cols[indptr[r]:indptr[r+1]]，按分数降序
+    """
+    if len(rows) == 0 or top_n <= 0:
+        return np.zeros(n_rows + 1, dtype=np.int64), cols[:0], scores[:0]
+
+    # 行号升序 -> 分数降序 -> 列号升序
+    order = np.lexsort((cols, -scores, rows))
+    rows, cols, scores = rows[order], cols[order], scores[order]
+
+    # 每个元素在所在行内的名次
+    row_start = np.searchsorted(rows, rows, side='left')
+    rank = np.arange(len(rows)) - row_start
+    keep = rank < top_n
+
+    rows, cols, scores = rows[keep], cols[keep], scores[keep]
+    indptr = np.zeros(n_rows + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=n_rows), out=indptr[1:])
+
+    return indptr, cols, scores
+
+
+def replace_csr_rows(indptr: np.ndarray, arrays: Tuple[np.ndarray, ...], rows: np.ndarray,
+                     row_indptr: np.ndarray, row_arrays: Tuple[np.ndarray, ...],
+                     n_rows: Optional[int] = None) -> Tuple[np.ndarray, Tuple[np.ndarray, ...]]:
+    """
+    替换 CSR 风格数据中的部分行，其余行原样保留
+
+    保留的行按连续区间整段复制（区间数不超过 len(rows) + 1），不做稀疏矩阵运算和重新排序，
+    开销为一次数组拷贝加上与替换行数成正比的循环
+
+    Args:
+        indptr: 行指针
+        arrays: 与行指针对齐的并列数组（如 (indices, data)）
+        rows: 被替换的行号（不重复，任意顺序）
+        row_indptr: 新行的行指针（与 rows 顺序对齐）
+        row_arrays: 新行的并列数组（与 arrays 一一对应）
+        n_rows: 新的总行数（大于原行数时追加空行）
+
+    Returns:
+        (新行指针, 新并列数组)
+    """
+    old_rows = len(indptr) - 1
+    n_rows = n_rows or old_rows
+    rows = np.asarray(rows, dtype=np.int64)
+
+    counts = np.zeros(n_rows, dtype=np.int64)
+    counts[:old_rows] = np.diff(indptr)
+    counts[rows] = np.diff(row_indptr)
+
+    new_indptr = np.zeros(n_rows + 1, dtype=np.int64)
+    np.cumsum(counts, out=new_indptr[1:])
+    new_arrays = tuple(np.empty(new_indptr[-1], dtype=array.dtype) for array in arrays)
+
+    order = np.argsort(rows, kind='stable')
+    start = 0  # 下一个待复制的原始行
+    for k, row in zip(order, rows[order]):
+        # 复制 [start, row) 之间保留的原始行
+        end = min(row, old_rows)
+        if end > start:
+            src_start, src_end = indptr[start], indptr[end]
+            dst_start = new_indptr[start]
+            for new_array, array in zip(new_arrays, arrays):
+                new_array[dst_start:dst_start + src_end - src_start] = array[src_start:src_end]
+
+        # 写入替换行
+        dst_start, dst_end = new_indptr[row], new_indptr[row + 1]
+        for new_array, row_array in zip(new_arrays, row_arrays):
+            new_array[dst_start:dst_end] = row_array[row_indptr[k]:row_indptr[k + 1]]
+        start = row + 1
+
+    if old_rows > start:
+        src_start, src_end = indptr[start], indptr[old_rows]
+        dst_start = new_indptr[start]
+        for new_array, array in zip(new_arrays, arrays):
+            new_array[dst_start:dst_start + src_end - src_start] = array[src_start:src_end]
+
+    return new_indptr, new_arrays
+
+
+def top_n_candidates(indptr: np.ndarray, scores: np.ndarray, top_n: int,
+                     max_cells: int = 1 << 24) -> np.ndarray:
+    """
+    用 argpartition 按行筛出可能进入 Top-N 的元素（分数不低于该行第 N 大的分数）
+
+    候选很多时先筛选再交给 top_n_per_row 排序，排序量从全部候选降到约 行数 × N；
+    同分的元素全部保留，最终结果与直接 top_n_per_row 完全一致
+
+    超过 N 个候选的行按长度分组（组内行长相差不到一倍，填充浪费有限），
+    填充为二维数组在每行内 argpartition，每组的 行数 × 最大行长 不超过 max_cells
+
+    Args:
+        indptr: CSR 风格的行指针（第 r 行为 scores[indptr[r]:indptr[r+1]]）
+        scores: 分数数组
+        top_n: 每行保留的数量
+        max_cells: 每组填充数组的最大元素数（控制内存）
+
+    Returns:
+        与 scores 对齐的布尔掩码
+    """
+    keep = np.ones(len(scores), dtype=bool)
+    if top_n <= 0:
+        keep[:] = False
+        return keep
+
+    lengths = np.diff(indptr)
+    long_rows = np.flatnonzero(lengths > top_n)
+    long_rows = long_rows[np.argsort(lengths[long_rows], kind='stable')]
+
+    # 按行长的二进制位数分段，段内再按 max_cells 切分
+    bits = np.ceil(np.log2(lengths[long_rows])).astype(np.int64)
+    bounds = np.flatnonzero(np.diff(bits)) + 1
+    groups = []
+    for segment in np.split(long_rows, bounds):
+        if len(segment) == 0:
+            continue
+        rows_per_group = max(1, max_cells // int(lengths[segment[-1]]))
+        groups += [segment[i:i + rows_per_group] for i in range(0, len(segment), rows_per_group)]
+
+    for group in groups:
+        width = int(lengths[group[-1]])
+        valid = np.arange(width) < lengths[group][:, None]
+        positions = (indptr[group][:, None] + np.arange(width))[valid]
+
+        # 填充值 -inf 排在最前，每行升序第 width - N 位即第 N 大的分数
+        padded = np.full((len(group), width), -np.inf, dtype=scores.dtype)
+        padded[valid] = scores[positions]
+        kth = np.argpartition(padded, width - top_n, axis=1)[:, width - top_n]
+        threshold = padded[np.arange(len(group)), kth]
+        keep[positions] = (padded >= threshold[:, None])[valid]
+
+    return keep
@@ -0,0 +1,147 @@
+"""
+测试推荐结果缓存（fakeredis + SQLite，不需要 Redis 和 MySQL）
+
+运行：
+    python -m pytest test/test_recommend_cache.py -q
+    python test/test_recommend_cache.py
+
+@author JacoryCyJin
+@date 2025/04/11
+"""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import tempfile
+import fakeredis
+from sqlalchemy import create_engine, text
+from recommend_cache import RecommendCache, RecommendationStore
+
+
+def make_cache(server, stale_file='', retry_seconds=0):
+    """创建使用 fakeredis 的缓存（默认不落盘待失效用户、失败后立即可重试）"""
+    client = fakeredis.FakeRedis(server=server, decode_responses=True)
+    return RecommendCache(client, expire_seconds=60, key_prefix='test:recommend:',
+                          stale_file=stale_file, retry_seconds=retry_seconds)
+
+
+def make_engine(rows):
+    """内存 SQLite，recommend_result 写入 rows: [(user_id, resource_id, score), ...]"""
+    engine = create_engine('sqlite://')
+    with engine.begin() as conn:
+        conn.execute(text("""
+            CREATE TABLE recommend_result (
+                id INTEGER PRIMARY KEY, user_id TEXT, resource_id TEXT, score REAL, reason TEXT, ctime DATETIME)
+        """))
+        conn.execute(
+            text("INSERT INTO recommend_result (user_id, resource_id, score) VALUES (:user_id, :resource_id, :score)"),
+            [{'user_id': u, 'resource_id': r, 'score': s} for u, r, s in rows]
+        )
+    return engine
+
+
+def test_write_read_round_trip():
+    """写入后按分数降序读回，覆盖旧值并设置过期时间"""
+    server = fakeredis.FakeServer()
+    cache = make_cache(server)
+
+    assert cache.write_many({'u1': [('r1', 0.5), ('r2', 0.9), ('r3', 0.1)]})
+    assert cache.read('u1', 2) == [('r2', 0.9), ('r1', 0.5)]
+    assert 0 < cache.client.ttl(cache.key('u1')) <= 60
+
+    # 再次写入覆盖旧值（不残留旧成员）
+    assert cache.write_many({'u1': [('r4', 0.3)]})
+    assert cache.read('u1', 10) == [('r4', 0.3)]
+
+    # 未命中返回 None
+    assert cache.read('missing', 10) is None
+
+
+def test_store_backfills_full_list():
+    """未命中时回退数据库并回填全部推荐：先小 top_n 再大 top_n 不会被截断"""
+    server = fakeredis.FakeServer()
+    cache = make_cache(server)
+    engine = make_engine([('u1', f'r{i}', float(i)) for i in range(10)])
+    store = RecommendationStore(engine, cache)
+
+    first = store.get_recommendations('u1', top_n=3)
+    assert first == [('r9', 9.0), ('r8', 8.0), ('r7', 7.0)]
+
+    # 回填的是全部 10 条，之后更大的 top_n 直接命中缓存
+    assert len(cache.read('u1', 100)) == 10
+    with engine.begin() as conn:
+        conn.execute(text("DELETE FROM recommend_result"))
+    second = store.get_recommendations('u1', top_n=20)
+    assert second == [(f'r{i}', float(i)) for i in range(9, -1, -1)]
+
+
+def test_store_without_redis_reads_database():
+    """Redis 不可用时读取照常走数据库"""
+    server = fakeredis.FakeServer()
+    server.connected = False
+    store = RecommendationStore(make_engine([('u1', 'r1', 1.0), ('u1', 'r2', 2.0)]), make_cache(server))
+
+    assert store.get_recommendations('u1', top_n=1) == [('r2', 2.0)]
+
+
+def test_failed_write_invalidates_after_recovery():
+    """写入失败的用户记为待失效，Redis 恢复后先删除其旧缓存，再恢复正常写入"""
+    server = fakeredis.FakeServer()
+    cache = make_cache(server)
+    cache.write_many({'u1': [('old', 1.0)], 'u2': [('old', 1.0)]})
+
+    # Redis 断开：写入失败，u1 的旧推荐仍在 Redis 中
+    server.connected = False
+    assert not cache.write_many({'u1': [('new', 2.0)]})
+    assert cache.stale_users == {'u1'}
+
+    # 仍不可用时后续写入也记为待失效（不会静默丢弃）
+    assert not cache.write_many({'u3': [('new', 2.0)]})
+    assert cache.stale_users == {'u1', 'u3'}
+
+    # 恢复后：待失效用户的缓存不再返回，下一次写入先删除旧值
+    server.connected = True
+    assert cache.read('u1', 10) is None
+    assert cache.write_many({'u4': [('new', 2.0)]})
+    assert cache.stale_users == set()
+    assert not cache.client.exists(cache.key('u1'))
+    assert cache.read('u2', 10) == [('old', 1.0)]
+    assert cache.read('u4', 10) == [('new', 2.0)]
+
+
+def test_stale_users_survive_restart():
+    """待失效用户写入文件，下一次运行（新的缓存实例）恢复后删除"""
+    server = fakeredis.FakeServer()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        stale_file = os.path.join(tmp_dir, 'cache_stale_users.txt')
+
+        cache = make_cache(server, stale_file=stale_file)
+        cache.write_many({'u1': [('old', 1.0)]})
+        server.connected = False
+        cache.write_many({'u1': [('new', 2.0)]})
+        assert os.path.exists(stale_file)
+
+        server.connected = True
+        restarted = make_cache(server, stale_file=stale_file)
+        assert restarted.stale_users == {'u1'}
+        assert restarted.recover()
+        assert not restarted.client.exists(restarted.key('u1'))
+        assert not os.path.exists(stale_file)
+
+
+def test_retry_interval():
+    """重试间隔内不再尝试连接 Redis"""
+    server = fakeredis.FakeServer()
+    cache = make_cache(server, retry_seconds=3600)
+
+    server.connected = False
+    cache.write_many({'u1': [('new', 2.0)]})
+    server.connected = True
+
+    assert not cache.recover()
+    assert cache.recover(force=True)
+
+
+if __name__ == '__main__':
+    import pytest
+    sys.exit(pytest.main([__file__, '-q']))
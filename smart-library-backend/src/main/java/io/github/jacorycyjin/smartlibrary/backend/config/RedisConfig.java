@@ -5,10 +5,16 @@ import com.fasterxml.jackson.annotation.PropertyAccessor;
 import com.fasterxml.jackson.databind.ObjectMapper;
 import com.fasterxml.jackson.databind.jsontype.impl.LaissezFaireSubTypeValidator;
 import com.fasterxml.jackson.datatype.jsr310.JavaTimeModule;
+import org.springframework.beans.factory.annotation.Value;
+import org.springframework.boot.autoconfigure.data.redis.RedisProperties;
 import org.springframework.context.annotation.Bean;
 import org.springframework.context.annotation.Configuration;
 import org.springframework.data.redis.connection.RedisConnectionFactory;
+import org.springframework.data.redis.connection.RedisPassword;
+import org.springframework.data.redis.connection.RedisStandaloneConfiguration;
+import org.springframework.data.redis.connection.jedis.JedisConnectionFactory;
 import org.springframework.data.redis.core.RedisTemplate;
+import org.springframework.data.redis.core.StringRedisTemplate;
 import org.springframework.data.redis.serializer.Jackson2JsonRedisSerializer;
 import org.springframework.data.redis.serializer.StringRedisSerializer;
 
@@ -50,4 +56,22 @@ public class RedisConfig {
         template.afterPropertiesSet();
         return template;
     }
+
+    /**
+     * 推荐结果缓存（由 smart-library-ai/recommendation 写入的有序集合，位于独立的 Redis 库）
+     * 连接工厂不注册为 Bean，避免影响默认 RedisConnectionFactory 的自动配置
+     */
+    @Bean
+    public StringRedisTemplate recommendRedisTemplate(RedisProperties properties,
+                                                      @Value("${recommend.cache.database:1}") int database) {
+        RedisStandaloneConfiguration configuration = new RedisStandaloneConfiguration(
+                properties.getHost(), properties.getPort());
+        configuration.setDatabase(database);
+        configuration.setPassword(RedisPassword.of(properties.getPassword()));
+
+        JedisConnectionFactory connectionFactory = new JedisConnectionFactory(configuration);
+        connectionFactory.afterPropertiesSet();
+
+        return new StringRedisTemplate(connectionFactory);
+    }
 }
@@ -23,6 +23,14 @@ public interface RecommendResultMapper {
      */
     List<RecommendResult> selectByUserId(@Param("userId") String userId, @Param("limit") Integer limit);
 
+    /**
+     * 查询用户的全部推荐列表（按分数降序，用于回填缓存）
+     * 
+     * @param userId 用户ID
+     * @return 推荐结果列表
+     */
+    List<RecommendResult> selectAllByUserId(@Param("userId") String userId);
+
     /**
      * 查询推荐覆盖的用户数
      * 
@@ -7,10 +7,17 @@ import io.github.jacorycyjin.smartlibrary.backend.mapper.ResourceMapper;
 import io.github.jacorycyjin.smartlibrary.backend.service.RecommendService;
 import lombok.extern.slf4j.Slf4j;
 import org.springframework.beans.factory.annotation.Autowired;
+import org.springframework.beans.factory.annotation.Qualifier;
+import org.springframework.beans.factory.annotation.Value;
+import org.springframework.data.redis.core.StringRedisTemplate;
+import org.springframework.data.redis.core.ZSetOperations;
 import org.springframework.stereotype.Service;
 
 import java.util.ArrayList;
+import java.util.HashSet;
 import java.util.List;
+import java.util.Set;
+import java.util.concurrent.TimeUnit;
 import java.util.stream.Collectors;
 
 /**
@@ -29,22 +36,43 @@ public class RecommendServiceImpl implements RecommendService {
     @Autowired
     private ResourceMapper resourceMapper;
 
+    /**
+     * 推荐结果缓存（Python 推荐系统生成推荐时写入）
+     */
+    @Autowired
+    @Qualifier("recommendRedisTemplate")
+    private StringRedisTemplate recommendRedisTemplate;
+
+    @Value("${recommend.cache.key-prefix:recommend:user:}")
+    private String cacheKeyPrefix;
+
+    @Value("${recommend.cache.expire-seconds:86400}")
+    private long cacheExpireSeconds;
+
     @Override
     public List<ResourceDTO> getRecommendations(String userId, Integer limit) {
         log.info("获取用户推荐列表: userId={}, limit={}", userId, limit);
 
-        // 1. 从推荐结果表查询
-        List<RecommendResult> results = recommendResultMapper.selectByUserId(userId, limit);
+        // 1. 优先从 Redis 缓存读取，未命中再查推荐结果表并回填缓存
+        List<String> resourceIds = getCachedResourceIds(userId, limit);
 
-        if (results == null || results.isEmpty()) {
-            log.warn("用户 {} 没有推荐结果", userId);
-            return new ArrayList<>();
-        }
+        if (resourceIds == null) {
+            // 回填用户的全部推荐（而不是本次的 limit 条），之后更大 limit 的请求命中缓存时不会被截断
+            List<RecommendResult> results = recommendResultMapper.selectAllByUserId(userId);
 
-        // 2. 提取资源ID列表
-        List<String> resourceIds = results.stream()
-                .map(RecommendResult::getResourceId)
-                .collect(Collectors.toList());
+            if (results == null || results.isEmpty()) {
+                log.warn("用户 {} 没有推荐结果", userId);
+                return new ArrayList<>();
+            }
+
+            cacheRecommendations(userId, results);
+
+            // 2. 提取资源ID列表（按分数降序取前 limit 条）
+            resourceIds = results.stream()
+                    .limit(limit)
+                    .map(RecommendResult::getResourceId)
+                    .collect(Collectors.toList());
+        }
 
         // 3. 批量查询资源详情（返回 Resource 实体）
         List<io.github.jacorycyjin.smartlibrary.backend.entity.Resource> resources = 
@@ -59,6 +87,48 @@ public class RecommendServiceImpl implements RecommendService {
         return resourceDTOs;
     }
 
+    /**
+     * 从缓存读取用户的推荐资源ID（按分数降序）
+     *
+     * @param userId 用户ID
+     * @param limit 推荐数量
+     * @return 资源ID列表，未命中或 Redis 不可用时返回 null
+     */
+    private List<String> getCachedResourceIds(String userId, Integer limit) {
+        try {
+            Set<String> cached = recommendRedisTemplate.opsForZSet()
+                    .reverseRange(cacheKeyPrefix + userId, 0, limit - 1);
+            if (cached == null || cached.isEmpty()) {
+                return null;
+            }
+            return new ArrayList<>(cached);
+        } catch (Exception e) {
+            log.warn("读取推荐缓存失败: userId={}, error={}", userId, e.getMessage());
+            return null;
+        }
+    }
+
+    /**
+     * 回填推荐缓存
+     *
+     * @param userId 用户ID
+     * @param results 推荐结果
+     */
+    private void cacheRecommendations(String userId, List<RecommendResult> results) {
+        String cacheKey = cacheKeyPrefix + userId;
+        Set<ZSetOperations.TypedTuple<String>> tuples = new HashSet<>();
+        for (RecommendResult result : results) {
+            tuples.add(ZSetOperations.TypedTuple.of(result.getResourceId(), result.getScore()));
+        }
+
+        try {
+            recommendRedisTemplate.opsForZSet().add(cacheKey, tuples);
+            recommendRedisTemplate.expire(cacheKey, cacheExpireSeconds, TimeUnit.SECONDS);
+        } catch (Exception e) {
+            log.warn("写入推荐缓存失败: userId={}, error={}", userId, e.getMessage());
+        }
+    }
+
     @Override
     public Integer getRecommendationCoverage() {
         Integer count = recommendResultMapper.countUsersWithRecommendations();